@@ -0,0 +1,39 @@
+"""add needs_rescore to daily_entries
+
+Revision ID: 35d266d86c5a
+Revises: de435a66eba2
+Create Date: 2026-10-18 04:44:18.525433
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '35d266d86c5a'
+down_revision: Union[str, None] = 'de435a66eba2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "daily_entries",
+        sa.Column("needs_rescore", sa.Boolean(), server_default=sa.false(), nullable=False)
+    )
+    # Partial index: only the few entries awaiting a model re-score are indexed
+    op.create_index(
+        "idx_daily_entries_needs_rescore",
+        "daily_entries",
+        ["id"],
+        postgresql_where=sa.text("needs_rescore")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_daily_entries_needs_rescore", "daily_entries")
+    op.drop_column("daily_entries", "needs_rescore")
@@ -0,0 +1,57 @@
+"""add rescoring_runs and rescoring_results tables
+
+Revision ID: 362d79c93b14
+Revises: 35d266d86c5a
+Create Date: 2026-10-18 04:45:06.063237
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '362d79c93b14'
+down_revision: Union[str, None] = '35d266d86c5a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "rescoring_runs",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("model_version", sa.String(), nullable=False),
+        sa.Column("status", sa.String(), nullable=False),
+        sa.Column("pending_only", sa.Boolean(), nullable=False),
+        sa.Column("rows_scored", sa.Integer(), nullable=False),
+        sa.Column("rows_flagged", sa.Integer(), nullable=False),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("started_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_table(
+        "rescoring_results",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("run_id", sa.String(), nullable=False),
+        sa.Column("entry_id", sa.Integer(), nullable=False),
+        sa.Column("net_sales", sa.Float(), nullable=False),
+        sa.Column("predicted_net_sales", sa.Float(), nullable=False),
+        sa.Column("difference", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["run_id"], ["rescoring_runs.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["entry_id"], ["daily_entries.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id")
+    )
+    op.create_index(op.f("ix_rescoring_results_id"), "rescoring_results", ["id"], unique=False)
+    op.create_index(op.f("ix_rescoring_results_run_id"), "rescoring_results", ["run_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_rescoring_results_run_id"), table_name="rescoring_results")
+    op.drop_index(op.f("ix_rescoring_results_id"), table_name="rescoring_results")
+    op.drop_table("rescoring_results")
+    op.drop_table("rescoring_runs")
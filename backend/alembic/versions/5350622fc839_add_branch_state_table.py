@@ -0,0 +1,60 @@
+"""add branch_state table
+
+Revision ID: 5350622fc839
+Revises: f2fb98206469
+Create Date: 2026-10-18 04:58:58.489664
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5350622fc839'
+down_revision: Union[str, None] = 'f2fb98206469'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "branch_state",
+        sa.Column("branch", sa.String(), nullable=False),
+        sa.Column("entry_id", sa.Integer(), nullable=True),
+        sa.Column("entry_created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("closing_meter_reading_ago", sa.Float(), nullable=False),
+        sa.Column("closing_meter_reading_pms", sa.Float(), nullable=False),
+        sa.Column("closing_tank_reading_ago", sa.Float(), nullable=False),
+        sa.Column("closing_tank_reading_pms", sa.Float(), nullable=False),
+        sa.Column("unit_price_ago", sa.Float(), nullable=False),
+        sa.Column("unit_price_pms", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.ForeignKeyConstraint(["entry_id"], ["daily_entries.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("branch"),
+    )
+    # Seed it with the newest entry of every branch
+    op.execute(
+        """
+        INSERT INTO branch_state (
+            branch, entry_id, entry_created_at,
+            closing_meter_reading_ago, closing_meter_reading_pms,
+            closing_tank_reading_ago, closing_tank_reading_pms,
+            unit_price_ago, unit_price_pms
+        )
+        SELECT DISTINCT ON (branch)
+            branch, id, created_at,
+            closing_meter_reading_ago, closing_meter_reading_pms,
+            closing_tank_reading_ago, closing_tank_reading_pms,
+            unit_price_ago, unit_price_pms
+        FROM daily_entries
+        ORDER BY branch, created_at DESC NULLS LAST, id DESC
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("branch_state")
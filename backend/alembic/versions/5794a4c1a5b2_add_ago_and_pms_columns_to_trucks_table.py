@@ -18,8 +18,109 @@ branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
 
+def _create_base_tables() -> None:
+    # Before this migration the app created its tables with create_all()
+    # on import, so databases set up that way already have them. A fresh
+    # database gets them here, as they were before this migration.
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    if "workers" not in existing:
+        op.create_table(
+            "workers",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("fullname", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.Column("role", sa.String(), nullable=False),
+            sa.Column("branch", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(op.f("ix_workers_id"), "workers", ["id"], unique=False)
+        op.create_index(op.f("ix_workers_email"), "workers", ["email"], unique=True)
+
+    # ago and pms are added below
+    if "trucks" not in existing:
+        op.create_table(
+            "trucks",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("branch", sa.String(), nullable=False),
+            sa.Column("date", sa.DateTime(), nullable=False),
+            sa.Column("driver", sa.String(), nullable=False),
+            sa.Column("destination", sa.String(), nullable=False),
+            sa.Column("truck_number", sa.String(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+            sa.ForeignKeyConstraint(["user_id"], ["workers.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(op.f("ix_trucks_id"), "trucks", ["id"], unique=False)
+
+    # needs_rescore is added by 35d266d86c5a
+    if "daily_entries" not in existing:
+        op.create_table(
+            "daily_entries",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("branch", sa.String(), nullable=False),
+            sa.Column("date", sa.DateTime(), nullable=False),
+            sa.Column("opening_meter_reading_ago", sa.Float(), nullable=False),
+            sa.Column("closing_meter_reading_ago", sa.Float(), nullable=False),
+            sa.Column("opening_meter_reading_pms", sa.Float(), nullable=False),
+            sa.Column("closing_meter_reading_pms", sa.Float(), nullable=False),
+            sa.Column("opening_tank_reading_ago", sa.Float(), nullable=False),
+            sa.Column("closing_tank_reading_ago", sa.Float(), nullable=False),
+            sa.Column("opening_tank_reading_pms", sa.Float(), nullable=False),
+            sa.Column("closing_tank_reading_pms", sa.Float(), nullable=False),
+            sa.Column("pump_test_ago", sa.Float(), nullable=False),
+            sa.Column("pump_test_pms", sa.Float(), nullable=False),
+            sa.Column("total_pump_test", sa.Float(), nullable=False),
+            sa.Column("received_ago", sa.Float(), nullable=False),
+            sa.Column("received_pms", sa.Float(), nullable=False),
+            sa.Column("total_received", sa.Float(), nullable=False),
+            sa.Column("actuals_ago", sa.Float(), nullable=False),
+            sa.Column("actuals_pms", sa.Float(), nullable=False),
+            sa.Column("total_actuals", sa.Float(), nullable=False),
+            sa.Column("sales_ago", sa.Float(), nullable=False),
+            sa.Column("sales_pms", sa.Float(), nullable=False),
+            sa.Column("total_sales", sa.Float(), nullable=False),
+            sa.Column("variation_ago", sa.Float(), nullable=False),
+            sa.Column("variation_pms", sa.Float(), nullable=False),
+            sa.Column("total_variation", sa.Float(), nullable=False),
+            sa.Column("unit_price_ago", sa.Float(), nullable=False),
+            sa.Column("unit_price_pms", sa.Float(), nullable=False),
+            sa.Column("sales_in_cedis_ago", sa.Float(), nullable=False),
+            sa.Column("sales_in_cedis_pms", sa.Float(), nullable=False),
+            sa.Column("total_sales_in_cedis", sa.Float(), nullable=False),
+            sa.Column("actuals_in_cedis_ago", sa.Float(), nullable=False),
+            sa.Column("actuals_in_cedis_pms", sa.Float(), nullable=False),
+            sa.Column("total_actuals_in_cedis", sa.Float(), nullable=False),
+            sa.Column("variation_in_cedis_ago", sa.Float(), nullable=False),
+            sa.Column("variation_in_cedis_pms", sa.Float(), nullable=False),
+            sa.Column("total_variation_in_cedis", sa.Float(), nullable=False),
+            sa.Column("credit_ago", sa.Float(), nullable=False),
+            sa.Column("credit_pms", sa.Float(), nullable=False),
+            sa.Column("total_credit", sa.Float(), nullable=False),
+            sa.Column("collections_cash", sa.Float(), nullable=False),
+            sa.Column("collections_cheque", sa.Float(), nullable=False),
+            sa.Column("total_collections", sa.Float(), nullable=False),
+            sa.Column("expenditure", sa.Float(), nullable=False),
+            sa.Column("comment", sa.String(), nullable=True),
+            sa.Column("net_sales", sa.Float(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+            sa.ForeignKeyConstraint(["user_id"], ["workers.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(op.f("ix_daily_entries_id"), "daily_entries", ["id"], unique=False)
+
+
 def upgrade() -> None:
     """Upgrade schema."""
+    _create_base_tables()
+
     # ### commands auto generated by Alembic - please adjust! ###
     op.add_column('trucks', sa.Column('ago', sa.Float(), nullable=False))
     op.add_column('trucks', sa.Column('pms', sa.Float(), nullable=False))
@@ -28,6 +129,7 @@ def upgrade() -> None:
 
 def downgrade() -> None:
     """Downgrade schema."""
+    # The base tables are left in place: most databases had them before
     # ### commands auto generated by Alembic - please adjust! ###
     op.drop_column('trucks', 'pms')
     op.drop_column('trucks', 'ago')
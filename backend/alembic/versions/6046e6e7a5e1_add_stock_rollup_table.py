@@ -0,0 +1,87 @@
+"""add stock_rollup table
+
+Revision ID: 6046e6e7a5e1
+Revises: 5350622fc839
+Create Date: 2026-10-18 05:06:37.016236
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6046e6e7a5e1'
+down_revision: Union[str, None] = '5350622fc839'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "stock_rollup",
+        sa.Column("branch", sa.String(), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("month", sa.Integer(), nullable=False),
+        sa.Column("entries", sa.Integer(), nullable=False),
+        sa.Column("received_ago", sa.Numeric(), nullable=False),
+        sa.Column("received_pms", sa.Numeric(), nullable=False),
+        sa.Column("total_received", sa.Numeric(), nullable=False),
+        sa.Column("sales_ago", sa.Numeric(), nullable=False),
+        sa.Column("sales_pms", sa.Numeric(), nullable=False),
+        sa.Column("total_sales", sa.Numeric(), nullable=False),
+        sa.Column("variation_ago", sa.Numeric(), nullable=False),
+        sa.Column("variation_pms", sa.Numeric(), nullable=False),
+        sa.Column("total_variation", sa.Numeric(), nullable=False),
+        sa.Column("sales_in_cedis_ago", sa.Numeric(), nullable=False),
+        sa.Column("sales_in_cedis_pms", sa.Numeric(), nullable=False),
+        sa.Column("total_sales_in_cedis", sa.Numeric(), nullable=False),
+        sa.Column("variation_in_cedis_ago", sa.Numeric(), nullable=False),
+        sa.Column("variation_in_cedis_pms", sa.Numeric(), nullable=False),
+        sa.Column("total_variation_in_cedis", sa.Numeric(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("branch", "year", "month"),
+    )
+    # Backfill from the existing entries; float8 goes through text so each
+    # amount is the shortest exact value, as the mapper events add it
+    op.execute(
+        """
+        INSERT INTO stock_rollup (
+            branch, year, month, entries,
+            received_ago, received_pms, total_received,
+            sales_ago, sales_pms, total_sales,
+            variation_ago, variation_pms, total_variation,
+            sales_in_cedis_ago, sales_in_cedis_pms, total_sales_in_cedis,
+            variation_in_cedis_ago, variation_in_cedis_pms, total_variation_in_cedis
+        )
+        SELECT
+            branch,
+            EXTRACT(YEAR FROM date)::int,
+            EXTRACT(MONTH FROM date)::int,
+            COUNT(*),
+            SUM(received_ago::text::numeric),
+            SUM(received_pms::text::numeric),
+            SUM(total_received::text::numeric),
+            SUM(sales_ago::text::numeric),
+            SUM(sales_pms::text::numeric),
+            SUM(total_sales::text::numeric),
+            SUM(variation_ago::text::numeric),
+            SUM(variation_pms::text::numeric),
+            SUM(total_variation::text::numeric),
+            SUM(sales_in_cedis_ago::text::numeric),
+            SUM(sales_in_cedis_pms::text::numeric),
+            SUM(total_sales_in_cedis::text::numeric),
+            SUM(variation_in_cedis_ago::text::numeric),
+            SUM(variation_in_cedis_pms::text::numeric),
+            SUM(total_variation_in_cedis::text::numeric)
+        FROM daily_entries
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("stock_rollup")
@@ -0,0 +1,34 @@
+"""add (branch, date) and (user_id, date) indexes to daily_entries
+
+Revision ID: f2fb98206469
+Revises: f781701a5d0f
+Create Date: 2026-10-18 04:57:13.852933
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2fb98206469'
+down_revision: Union[str, None] = 'f781701a5d0f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Dashboard filters: equality on branch or user, range on date, keyset order on (date, id)
+    op.create_index("idx_daily_entries_branch_date", "daily_entries", ["branch", "date", "id"])
+    op.create_index("idx_daily_entries_user_date", "daily_entries", ["user_id", "date", "id"])
+    # Covered by the leading column of idx_daily_entries_branch_date
+    op.drop_index("idx_daily_entries_branch", "daily_entries")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("idx_daily_entries_branch", "daily_entries", ["branch"])
+    op.drop_index("idx_daily_entries_user_date", "daily_entries")
+    op.drop_index("idx_daily_entries_branch_date", "daily_entries")
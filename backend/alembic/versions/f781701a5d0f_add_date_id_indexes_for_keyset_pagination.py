@@ -0,0 +1,31 @@
+"""add (date, id) indexes for keyset pagination
+
+Revision ID: f781701a5d0f
+Revises: 362d79c93b14
+Create Date: 2026-10-18 04:55:45.584044
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f781701a5d0f'
+down_revision: Union[str, None] = '362d79c93b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keyset pagination orders and seeks on (date, id)
+    op.create_index("idx_daily_entries_date_id", "daily_entries", ["date", "id"])
+    op.create_index("idx_trucks_date_id", "trucks", ["date", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("idx_trucks_date_id", "trucks")
+    op.drop_index("idx_daily_entries_date_id", "daily_entries")
@@ -3,9 +3,12 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from app.models.models import User as UserModel
-from app.database.database import get_db
+from app.database.database import get_db, AsyncSessionLocal
+from app.database.replica import replica_router, attribute_writes
+from app.monitoring.tracing import span, traced
 from app.schema.schemas import Token, RefreshRequest
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
 
@@ -39,13 +42,16 @@ def create_refresh_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_user_by_email(db: Session, email: str):
+@traced("auth.get_user_by_email")
+async def get_user_by_email(db: AsyncSession, email: str):
     """Get user by email from database"""
-    return db.query(UserModel).filter(UserModel.email == email).first()
+    return await db.scalar(select(UserModel).where(UserModel.email == email))
 
-def verify_token(token: str, credentials_exception: HTTPException, db: Session, token_type: str = "access"):
+@traced("auth.verify_token")
+async def verify_token(token: str, credentials_exception: HTTPException, db: AsyncSession, token_type: str = "access"):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with span("auth.decode_jwt"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("sub")
         if not email:
             logger.error("Email not found in token payload")
@@ -60,7 +66,7 @@ def verify_token(token: str, credentials_exception: HTTPException, db: Session,
         logger.error(f"JWT Error: {str(e)}")
         raise credentials_exception
     
-    user = get_user_by_email(db, email=email)
+    user = await get_user_by_email(db, email=email)
     
     if not user:
         logger.error(f"User not found for email: {email}")
@@ -70,13 +76,49 @@ def verify_token(token: str, credentials_exception: HTTPException, db: Session,
 
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    return verify_token(token, credentials_exception, db)
+    user = await verify_token(token, credentials_exception, db)
+    # Whatever the request commits through this session is the user's write
+    attribute_writes(db, user.id)
+    # Return the connection to the pool until the request queries again; a
+    # request waiting for a pool thread or a coalesced read must not hold
+    # one. close() detaches the user with its loaded attributes intact and
+    # leaves the session usable.
+    await db.close()
+    return user
 
 
+async def get_read_db(current_user: UserModel = Depends(get_current_user)):
+    """
+    Session for read-only endpoints: on the read replica unless it lags or
+    the user has just written (see ReplicaRouter)
+    """
+    async with await replica_router.read_session(current_user.id) as db:
+        yield db
+
+
+async def get_current_admin(current_user: UserModel = Depends(get_current_user)):
+    """Require the authenticated user to be an admin"""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
+
+async def is_admin_token(token: str) -> bool:
+    """Whether an access token belongs to an admin; for checks outside a route's dependencies"""
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    async with AsyncSessionLocal() as db:
+        try:
+            user = await verify_token(token, credentials_exception, db)
+        except HTTPException:
+            return False
+        return user.role == "admin"
@@ -1,16 +1,17 @@
 from fastapi import status, Depends, HTTPException
 from app.schema.schemas import Login
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import database
 from app.models import models
 from app.crud.hashing import pwd_ctx
 from app.authentication import auth
+from app.core.executor import run_blocking
 
 
 
-async def login(credentials: Login, db: Session = Depends(database.get_db)):
+async def login(credentials: Login, db: AsyncSession = Depends(database.get_db)):
     #if "@" in credentials.user_identifier:
-    user = db.query(models.User).filter(models.User.email == credentials.email).first()
+    user = await auth.get_user_by_email(db, credentials.email)
     
     #else:
     #    user = db.query(models.Client).filter(models.Client.name == credentials.user_identifier).first()
@@ -23,7 +24,8 @@ async def login(credentials: Login, db: Session = Depends(database.get_db)):
 
     #verify password
         
-    if not pwd_ctx.verify(credentials.password, user.hashed_password):
+    # bcrypt is deliberately slow, so verify on the blocking pool
+    if not await run_blocking(pwd_ctx.verify, credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Incorrect password"
@@ -44,7 +46,7 @@ async def login(credentials: Login, db: Session = Depends(database.get_db)):
     )
     
     # For backward compatibility
-    verification_token = auth.verify_token(access_token, credentials_exception, db)
+    verification_token = await auth.verify_token(access_token, credentials_exception, db)
 
     return {
         "access_token": access_token, 
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, status, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
 from app.schema.schemas import Login
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.database import get_db
 from app.authentication import crud_auth, auth
 
@@ -18,14 +18,14 @@ router = APIRouter(
 
 
 @router.post("/login", status_code=status.HTTP_200_OK)
-async def login(credentials: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(credentials: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     # Convert OAuth2PasswordRequestForm to your Login schema if needed
     login_data = Login(email=credentials.username, password=credentials.password)
     results = await crud_auth.login(login_data, db)
     return results
 
 @router.post("/refresh", response_model=auth.Token)
-async def refresh_token(refresh_request: auth.RefreshRequest, db: Session = Depends(get_db)):
+async def refresh_token(refresh_request: auth.RefreshRequest, db: AsyncSession = Depends(get_db)):
     """
     Get a new access token using a refresh token
     """
@@ -38,7 +38,9 @@ async def refresh_token(refresh_request: auth.RefreshRequest, db: Session = Depe
     # Verify the refresh token
     try:
         # Check that it's a valid refresh token
-        user = auth.verify_token(refresh_request.refresh_token, credentials_exception, db, token_type="refresh")
+        user = await auth.verify_token(
+            refresh_request.refresh_token, credentials_exception, db, token_type="refresh"
+        )
         
         # Generate new tokens
         access_token = auth.create_access_token(data={"sub": user.email})
@@ -0,0 +1,105 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.monitoring.metrics import RESULT_CACHE_EVICTIONS
+
+
+class LocalBackend:
+    """
+    In-process LRU store with per-entry expiry.
+
+    Holds at most `max_entries` values; the least recently used one is
+    evicted to make room. Each worker process has its own store and its own
+    tag versions, so a write handled by another worker only becomes visible
+    here once the entry expires.
+    """
+
+    name = "local"
+    # Calls only take a lock, so they are made on the event loop
+    blocking = False
+
+    def __init__(self, max_entries: int = 1024):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if time.monotonic() >= expires:
+                del self._data[key]
+                RESULT_CACHE_EVICTIONS.labels(backend=self.name, reason="expired").inc()
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                RESULT_CACHE_EVICTIONS.labels(backend=self.name, reason="capacity").inc()
+
+    def versions(self, tags: List[str]) -> List[int]:
+        with self._lock:
+            return [self._versions.get(tag, 0) for tag in tags]
+
+    def bump(self, tags: List[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+
+
+class RedisBackend:
+    """
+    Store shared by all workers in Redis (or a Redis-compatible server).
+
+    Values expire through Redis TTLs; eviction under memory pressure is left
+    to the server's maxmemory policy. Requires the optional `redis` package.
+    """
+
+    name = "redis"
+    # Calls wait on the network, so async callers make them on the blocking pool
+    blocking = True
+
+    def __init__(self, url: str, prefix: str = "resultcache:", timeout: float = 0.5):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._client.set(self.prefix + key, value, px=max(int(ttl * 1000), 1))
+
+    def versions(self, tags: List[str]) -> List[int]:
+        if not tags:
+            return []
+        values = self._client.mget([f"{self.prefix}tag:{tag}" for tag in tags])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def bump(self, tags: List[str]) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        for tag in tags:
+            pipe.incr(f"{self.prefix}tag:{tag}")
+        pipe.execute()
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(match=f"{self.prefix}*"):
+            self._client.delete(key)
@@ -0,0 +1,204 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Iterable, List
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.cache.backends import LocalBackend, RedisBackend
+from app.core.executor import run_blocking
+from app.models import models
+from app.monitoring.metrics import RESULT_CACHE_REQUESTS, RESULT_CACHE_INVALIDATIONS, RESULT_CACHE_ERRORS
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# "local" (one cache per worker process), "redis" (shared by all workers) or "none"
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "local")
+# Seconds a result is served for; with the local backend this also bounds
+# how long a write handled by another worker can go unnoticed
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "30"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+RESULT_CACHE_REDIS_URL = os.getenv("RESULT_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Invalidated by every entry write, for results no narrower tag covers
+ALL_ENTRIES_TAG = "all"
+# Invalidated by every truck write
+TRUCKS_TAG = "trucks"
+
+
+def branch_tag(branch: str) -> str:
+    # Entries written from a request carry the Branch enum rather than its value
+    return f"branch:{getattr(branch, 'value', branch)}"
+
+
+def year_tag(year: int) -> str:
+    return f"year:{year}"
+
+
+def entry_tags(branch: str, entry_date: datetime) -> List[str]:
+    """Tags of every cached result an entry of this branch and date can appear in"""
+    return [branch_tag(branch), year_tag(entry_date.year), ALL_ENTRIES_TAG]
+
+
+class ResultCache:
+    """
+    Read-through cache of JSON-serializable endpoint results.
+
+    A result is stored under a key built from the endpoint, its parameters,
+    the caller's scope and the current version of each of its tags.
+    Invalidating a tag bumps its version: results computed under the old
+    version are never looked up again and age out of the backend. Versions
+    are read before the result is computed, so a result that raced with a
+    write is filed under the pre-write version and cannot outlive the write.
+
+    Backend failures are logged and served from the database.
+    """
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        # Bumped on every invalidation made by this process
+        self.generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None and self.ttl > 0
+
+    def _error(self, operation: str, e: Exception) -> None:
+        RESULT_CACHE_ERRORS.labels(backend=self.backend.name, operation=operation).inc()
+        logger.warning(f"Result cache {operation} failed: {str(e)}")
+
+    async def _call(self, fn: Callable, *args) -> Any:
+        if self.backend.blocking:
+            return await run_blocking(fn, *args)
+        return fn(*args)
+
+    def _lookup(self, namespace: str, params: dict, scope: str, tags: List[str]):
+        versions = self.backend.versions(tags)
+        payload = json.dumps([params, scope, dict(zip(tags, versions))], sort_keys=True, default=str)
+        key = f"{namespace}:{hashlib.sha256(payload.encode()).hexdigest()}"
+        return key, self.backend.get(key)
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        params: dict,
+        scope: str,
+        tags: List[str],
+        compute: Callable[[], Awaitable[Any]],
+        store: bool = True,
+    ) -> Any:
+        """
+        Return the cached result, or compute and cache it.
+
+        Args:
+            namespace: Name of the endpoint, also used as the metrics label
+            params: Parameters the result depends on
+            scope: Which callers may share the result
+            tags: Tags whose invalidation must drop the result
+            compute: Awaited on a miss; must return a JSON-serializable value
+            store: Whether a computed result may be cached
+
+        Returns:
+            The result, as compute() returned it or decoded from the cache
+        """
+        if not self.enabled:
+            return await compute()
+
+        try:
+            key, cached = await self._call(self._lookup, namespace, params, scope, tags)
+        except Exception as e:
+            self._error("read", e)
+            return await compute()
+
+        if cached is not None:
+            RESULT_CACHE_REQUESTS.labels(namespace=namespace, outcome="hit").inc()
+            return json.loads(cached)
+
+        RESULT_CACHE_REQUESTS.labels(namespace=namespace, outcome="miss").inc()
+        result = await compute()
+        if not store:
+            return result
+        try:
+            await self._call(self.backend.set, key, json.dumps(result, separators=(",", ":")).encode(), self.ttl)
+        except Exception as e:
+            self._error("write", e)
+        return result
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        tags = sorted(set(tags))
+        if not tags:
+            return
+        self.generation += 1
+        if self.backend is None:
+            return
+        try:
+            self.backend.bump(tags)
+        except Exception as e:
+            self._error("invalidate", e)
+            return
+        for tag in tags:
+            RESULT_CACHE_INVALIDATIONS.labels(tag=tag.split(":")[0]).inc()
+
+    def clear(self) -> None:
+        if self.backend is not None:
+            self.backend.clear()
+
+
+def build_backend(name: str):
+    if name == "none":
+        return None
+    if name == "redis":
+        try:
+            return RedisBackend(RESULT_CACHE_REDIS_URL)
+        except ImportError:
+            logger.warning("RESULT_CACHE_BACKEND=redis needs the redis package; using the local result cache")
+    elif name != "local":
+        logger.warning(f"Unknown RESULT_CACHE_BACKEND {name!r}; using the local result cache")
+    return LocalBackend(RESULT_CACHE_MAX_ENTRIES)
+
+
+result_cache = ResultCache(build_backend(RESULT_CACHE_BACKEND), RESULT_CACHE_TTL)
+
+
+def mark_stale(session: Session, tags: Iterable[str]) -> None:
+    """Invalidate `tags` once the session's current transaction commits"""
+    session.info.setdefault("result_cache_tags", set()).update(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_after_commit(session):
+    tags = session.info.pop("result_cache_tags", None)
+    if tags:
+        result_cache.invalidate(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_after_rollback(session):
+    session.info.pop("result_cache_tags", None)
+
+
+@event.listens_for(models.SalesEntry, "after_insert")
+@event.listens_for(models.SalesEntry, "after_update")
+@event.listens_for(models.SalesEntry, "after_delete")
+def mark_entry_results_stale(mapper, connection, target):
+    # An update can move the entry out of its previous branch and year
+    state = inspect(target)
+    branches = {target.branch, *state.attrs.branch.history.deleted} - {None}
+    dates = {target.date, *state.attrs.date.history.deleted} - {None}
+    mark_stale(
+        object_session(target),
+        {tag for branch in branches for entry_date in dates for tag in entry_tags(branch, entry_date)},
+    )
+
+
+@event.listens_for(models.Trucks, "after_insert")
+@event.listens_for(models.Trucks, "after_update")
+@event.listens_for(models.Trucks, "after_delete")
+def mark_truck_results_stale(mapper, connection, target):
+    mark_stale(object_session(target), [TRUCKS_TAG])
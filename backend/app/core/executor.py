@@ -0,0 +1,104 @@
+import os
+import asyncio
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from app.database.database import DB_POOL_SIZE, DB_MAX_OVERFLOW
+from app.monitoring.metrics import (
+    BLOCKING_POOL_WORKERS,
+    BLOCKING_POOL_QUEUE_DEPTH,
+    BLOCKING_POOL_ACTIVE,
+    BLOCKING_POOL_WAIT_SECONDS,
+    BLOCKING_POOL_CALLS,
+)
+from app.monitoring.profiling import current_profile
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Threads available for blocking DB/ML work. Defaults to the size of the
+# SQLAlchemy connection pool so threads never queue on a DB connection.
+BLOCKING_POOL_WORKERS_COUNT = int(
+    os.getenv("BLOCKING_POOL_WORKERS", str(DB_POOL_SIZE + DB_MAX_OVERFLOW))
+)
+
+
+class BlockingExecutor:
+    """
+    A bounded thread pool for synchronous work called from async routes.
+
+    Routes await `run(fn, *args)` instead of calling blocking CRUD functions
+    directly, so psycopg2 round trips and sklearn inference happen on a pool
+    thread while the event loop keeps serving other requests. The caller's
+    contextvars are carried over to the pool thread.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{name}-pool"
+        )
+
+        BLOCKING_POOL_WORKERS.labels(pool=name).set(max_workers)
+        self._queued = BLOCKING_POOL_QUEUE_DEPTH.labels(pool=name)
+        self._active = BLOCKING_POOL_ACTIVE.labels(pool=name)
+        self._wait = BLOCKING_POOL_WAIT_SECONDS.labels(pool=name)
+
+    def _call(self, submitted_at: float, ctx: contextvars.Context, fn: Callable, *args, **kwargs):
+        self._queued.dec()
+        self._wait.observe(time.perf_counter() - submitted_at)
+        self._active.inc()
+        try:
+            result = ctx.run(fn, *args, **kwargs)
+            BLOCKING_POOL_CALLS.labels(pool=self.name, outcome="ok").inc()
+            return result
+        except Exception:
+            BLOCKING_POOL_CALLS.labels(pool=self.name, outcome="error").inc()
+            raise
+        finally:
+            self._active.dec()
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking callable on the pool and await its result.
+
+        Args:
+            fn: The synchronous function to call
+            *args, **kwargs: Arguments passed through to `fn`
+
+        Returns:
+            Whatever `fn` returns; exceptions raised by `fn` propagate
+        """
+        ctx = contextvars.copy_context()
+        profile = current_profile.get()
+        if profile is not None:
+            fn = partial(profile.call, fn)
+        self._queued.inc()
+        future = self._executor.submit(self._call, time.perf_counter(), ctx, fn, *args, **kwargs)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A call cancelled before a thread picked it up never reaches _call
+            if future.cancelled():
+                self._queued.dec()
+            raise
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+blocking_executor = BlockingExecutor("blocking", BLOCKING_POOL_WORKERS_COUNT)
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Run a synchronous DB/ML call on the shared blocking pool"""
+    return await blocking_executor.run(fn, *args, **kwargs)
@@ -0,0 +1,54 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app.monitoring.metrics import SINGLEFLIGHT_REQUESTS, SINGLEFLIGHT_IN_FLIGHT
+from app.monitoring.profiling import profiled
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent async calls into one.
+
+    The first caller for a key starts `fn()` as a task; callers arriving
+    with the same key while it runs await that task instead of starting
+    their own, and all of them get its result (or exception). The result
+    object is shared, so callers must not mutate it. The task is shielded:
+    a caller that goes away does not cancel the call for the others.
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._in_flight = SINGLEFLIGHT_IN_FLIGHT.labels(group=name)
+
+    def _done(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            self._in_flight.dec()
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await `fn()`, or the call already running for `key`.
+
+        Args:
+            key: Identifies calls that return the same result
+            fn: Starts the call; only invoked when no call for `key` is running
+
+        Returns:
+            The result of the (shared) call
+        """
+        task = self._calls.get(key)
+        if task is None:
+            # A profiled leader's call is part of its profile
+            task = asyncio.ensure_future(profiled(fn()))
+            self._calls[key] = task
+            self._in_flight.inc()
+            task.add_done_callback(lambda t: self._done(key, t))
+            SINGLEFLIGHT_REQUESTS.labels(group=self.name, role="leader").inc()
+        else:
+            SINGLEFLIGHT_REQUESTS.labels(group=self.name, role="follower").inc()
+        return await asyncio.shield(task)
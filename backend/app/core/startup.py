@@ -0,0 +1,54 @@
+import os
+import time
+import asyncio
+import logging
+
+import numpy as np
+from sqlalchemy import text
+
+from app.core.executor import run_blocking
+from app.database.database import async_engine
+from app.models.models import FEATURE_NAMES, ml_batcher
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds /ready waits for the database before reporting it unreachable
+READINESS_DB_TIMEOUT = float(os.getenv("READINESS_DB_TIMEOUT", "2"))
+
+
+async def database_ready(timeout: float = READINESS_DB_TIMEOUT) -> bool:
+    """Whether the primary answers a trivial query within `timeout` seconds"""
+    async def ping():
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    try:
+        await asyncio.wait_for(ping(), timeout)
+        return True
+    except Exception as e:
+        logger.warning(f"Database not ready: {str(e)}")
+        return False
+
+
+def _warm_model() -> None:
+    # One prediction through the batcher loads the model (and joblib,
+    # sklearn), builds the fast path and starts the batching thread
+    ml_batcher.predict(np.zeros(len(FEATURE_NAMES)))
+
+
+async def warm_up() -> None:
+    """
+    Do the first-request work before the first request: open a database
+    connection (asyncpg introspects types on connect) and load and exercise
+    the model. Failures are logged, not raised; the work is then done
+    lazily as before, and /ready reports what is missing.
+    """
+    started = time.perf_counter()
+    await database_ready()
+    try:
+        await run_blocking(_warm_model)
+    except Exception as e:
+        logger.error(f"Model warm-up failed: {str(e)}")
+    logger.info(f"Warm-up finished in {(time.perf_counter() - started) * 1000:.1f} ms")
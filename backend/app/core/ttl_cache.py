@@ -0,0 +1,49 @@
+import time
+import threading
+from typing import Any, Hashable
+
+
+# Returned by TTLCache.get when a key is absent or expired, so that None can be cached
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache whose entries expire after `ttl` seconds.
+
+    Each worker process has its own copy; writes made by this process
+    invalidate keys directly, writes made by other workers become visible
+    once the TTL runs out. A TTL of 0 disables caching.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        if self.ttl <= 0:
+            return MISSING
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISSING
+            value, expires = item
+            if time.monotonic() >= expires:
+                del self._data[key]
+                return MISSING
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,345 @@
+import io
+import os
+import csv
+import json
+import codecs
+import types
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException, status
+from pydantic import ValidationError as SchemaValidationError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models import models
+from app.cache.result_cache import mark_stale, entry_tags
+from app.database.replica import mark_written
+from app.schema.schemas import SalesEntryCreate
+
+
+# Largest number of records accepted in one import
+BULK_IMPORT_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS", "50000"))
+
+# Opening values taken from the previous entry of the branch when left at zero,
+# mapped to the field of the previous entry they come from
+CHAINED_FIELDS = {
+    "opening_meter_reading_ago": "closing_meter_reading_ago",
+    "opening_meter_reading_pms": "closing_meter_reading_pms",
+    "opening_tank_reading_ago": "closing_tank_reading_ago",
+    "opening_tank_reading_pms": "closing_tank_reading_pms",
+    "unit_price_ago": "unit_price_ago",
+    "unit_price_pms": "unit_price_pms",
+}
+
+# daily_entries columns written by COPY, in order
+COPY_COLUMNS = [column.name for column in models.SalesEntry.__table__.columns]
+
+
+class ImportRow:
+    """One uploaded record on its way through validation"""
+
+    def __init__(self, row: int, entry: types.SimpleNamespace):
+        self.row = row
+        self.entry = entry
+        # Fields that were left at zero and are filled from the previous entry
+        self.chained = [field for field in CHAINED_FIELDS if getattr(entry, field) == 0.0]
+
+
+def iter_upload_lines(chunks: Iterable[bytes], max_bytes: int) -> Iterator[str]:
+    """
+    Decode a UTF-8 upload as it arrives and yield it line by line.
+
+    Args:
+        chunks: The upload's body, chunk by chunk
+        max_bytes: Largest upload accepted
+
+    Raises:
+        HTTPException: 413 past `max_bytes`, 400 if the upload is not UTF-8
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    received = 0
+    pending = ""
+    try:
+        for chunk in chunks:
+            received += len(chunk)
+            if received > max_bytes:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Uploads are limited to {max_bytes} bytes"
+                )
+            # Split on \n only; str.splitlines also breaks at U+2028 and
+            # other separators that may appear inside values
+            lines = (pending + decoder.decode(chunk)).split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line + "\n"
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload must be UTF-8 encoded"
+        )
+    if pending:
+        yield pending
+
+
+def parse_records(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Split an NDJSON or CSV upload into raw records, as its lines are read.
+
+    Args:
+        lines: The upload, line by line
+        fmt: "ndjson" or "csv"
+
+    Yields:
+        (row number, record, None), or (row number, None, parse error)
+    """
+    if fmt == "csv":
+        for row, record in enumerate(csv.DictReader(lines), start=1):
+            # Empty cells fall back to the schema defaults
+            yield row, {k: v for k, v in record.items() if k and v not in (None, "")}, None
+        return
+
+    row = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row, None, f"Invalid JSON: {str(e)}"
+            continue
+        if not isinstance(record, dict):
+            yield row, None, "Each line must be a JSON object"
+            continue
+        yield row, record, None
+
+
+def _schema_errors(e: SchemaValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()]
+
+
+def _latest_readings(db: Session, branches: List[str]) -> dict:
+    # Carried-forward readings of every branch in one primary-key lookup,
+    # locked until the import commits so no other insert chains from them
+    states = (
+        db.query(models.BranchState)
+        .filter(models.BranchState.branch.in_(branches))
+        .order_by(models.BranchState.branch)
+        .with_for_update()
+        .all()
+    )
+    return {state.branch: state for state in states}
+
+
+def _chain(row: ImportRow, previous) -> None:
+    for field in row.chained:
+        setattr(row.entry, field, getattr(previous, CHAINED_FIELDS[field]) if previous is not None else 0.0)
+
+
+def _allocate_ids(db: Session, count: int) -> List[int]:
+    result = db.execute(
+        text("SELECT nextval(pg_get_serial_sequence('daily_entries', 'id')) FROM generate_series(1, :count)"),
+        {"count": count},
+    )
+    return [value for (value,) in result]
+
+
+class _CopySource:
+    """The entries as CSV for COPY, written as COPY reads them rather than all at once"""
+
+    def __init__(self, entries: Iterable[types.SimpleNamespace]):
+        self._entries = iter(entries)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def read(self, size: int = -1) -> str:
+        for entry in self._entries:
+            self._writer.writerow([
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in (getattr(entry, column) for column in COPY_COLUMNS)
+            ])
+            if 0 <= size <= self._buffer.tell():
+                break
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+def _copy_entries(db: Session, entries: List[types.SimpleNamespace]) -> None:
+    cursor = db.connection().connection.cursor()
+    try:
+        # An omitted comment is written as an empty unquoted field, which
+        # COPY stores as NULL like the ORM does
+        cursor.copy_expert(
+            f"COPY {models.SalesEntry.__tablename__} ({', '.join(COPY_COLUMNS)}) "
+            f"FROM STDIN WITH (FORMAT csv)",
+            _CopySource(entries),
+        )
+    finally:
+        cursor.close()
+
+
+def validate_rows(rows: List[ImportRow], latest: dict) -> Tuple[List[ImportRow], List[dict]]:
+    """
+    Chain, score and check records sorted by branch and date.
+
+    Records are chained optimistically through the whole upload and scored
+    in one batch. Each record is then re-chained from the last accepted
+    record of its branch (or `latest`, the newest stored state), and scored
+    again on its own if that changed its values, so no record is checked
+    against values it got from a rejected one.
+
+    Args:
+        rows: Records sorted by branch and date
+        latest: Carried-forward state of each branch, by branch
+
+    Returns:
+        Tuple of the accepted records and the errors of rejected ones
+    """
+    for branch, branch_rows in groupby(rows, key=lambda r: r.entry.branch):
+        previous = latest.get(branch)
+        for r in branch_rows:
+            _chain(r, previous)
+            models.calculate_totals(r.entry)
+            previous = r.entry
+
+    predictions = models.predict_batch(np.vstack([models.extract_features(r.entry) for r in rows])) if rows else None
+
+    accepted: List[ImportRow] = []
+    errors: List[dict] = []
+    index = 0
+    for branch, branch_rows in groupby(rows, key=lambda r: r.entry.branch):
+        last_accepted = latest.get(branch)
+        for r in branch_rows:
+            predicted: Optional[float] = float(predictions[index]) if predictions is not None else None
+            index += 1
+
+            if r.chained:
+                chained = [getattr(r.entry, field) for field in r.chained]
+                _chain(r, last_accepted)
+                if [getattr(r.entry, field) for field in r.chained] != chained:
+                    # A record before it was rejected, or took other values
+                    # from one that was: the batch prediction is stale
+                    models.calculate_totals(r.entry)
+                    rescored = models.predict_batch(models.extract_features(r.entry))
+                    predicted = float(rescored[0]) if rescored is not None else None
+
+            try:
+                models.check_tank_readings(r.entry)
+                models.check_net_sales(r.entry, predicted)
+            except models.ValidationError as e:
+                errors.append({"row": r.row, "errors": [str(e)]})
+                continue
+
+            accepted.append(r)
+            last_accepted = r.entry
+
+    return accepted, errors
+
+
+def import_sales_entries(
+    lines: Iterable[str],
+    fmt: str,
+    db: Session,
+    current_user: models.User,
+    all_or_nothing: bool = False,
+) -> dict:
+    """
+    Validate and load many sales entries in one transaction.
+
+    Opening readings and unit prices left at zero are chained from the
+    previous entry of the same branch: the newest stored entry for the first
+    record of a branch, then the previous accepted record of the upload
+    (ordered by date). All records are scored by the model in one batch and
+    checked exactly like single entries; accepted ones are written with COPY.
+
+    Args:
+        lines: NDJSON or CSV upload, line by line
+        fmt: "ndjson" or "csv"
+        db: Database session
+        current_user: User the entries are recorded for
+        all_or_nothing: Import nothing if any record is rejected
+
+    Returns:
+        dict: Counts, the ids of created entries and the errors of rejected rows
+    """
+    now = datetime.now()
+    received = 0
+    errors: List[dict] = []
+    rows: List[ImportRow] = []
+    for row, record, error in parse_records(lines, fmt):
+        received += 1
+        if received > BULK_IMPORT_MAX_ROWS:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"At most {BULK_IMPORT_MAX_ROWS} records can be imported at once"
+            )
+        if error is not None:
+            errors.append({"row": row, "errors": [error]})
+            continue
+        # As with POST /new, entries always belong to the uploader
+        record["user_id"] = current_user.id
+        try:
+            data = SalesEntryCreate.model_validate(record)
+        except SchemaValidationError as e:
+            errors.append({"row": row, "errors": _schema_errors(e)})
+            continue
+
+        values = {column: getattr(data, column, None) for column in COPY_COLUMNS}
+        values.update(branch=data.branch.value, user_id=current_user.id, needs_rescore=False, updated_at=now)
+        rows.append(ImportRow(row, types.SimpleNamespace(**values)))
+
+    rows.sort(key=lambda r: (r.entry.branch, r.entry.date, r.row))
+    branches = [branch for branch, _ in groupby(rows, key=lambda r: r.entry.branch)]
+    latest = _latest_readings(db, branches) if branches else {}
+
+    accepted, rejected = validate_rows(rows, latest)
+    errors.extend(rejected)
+
+    errors.sort(key=lambda error: error["row"])
+    created = []
+    if accepted and not (all_or_nothing and errors):
+        ids = _allocate_ids(db, len(accepted))
+        for offset, (r, entry_id) in enumerate(zip(accepted, ids)):
+            r.entry.id = entry_id
+            # Strictly increasing so the newest entry of each branch stays the one chained from next
+            r.entry.created_at = now + timedelta(microseconds=offset)
+            created.append({"row": r.row, "id": entry_id, "needs_rescore": r.entry.needs_rescore})
+
+        try:
+            _copy_entries(db, [r.entry for r in accepted])
+            # COPY bypasses the mapper events that maintain branch_state,
+            # stock_rollup and the result cache, and the flush that tells
+            # the replica router this user wrote
+            newest, rollup, stale = {}, {}, set()
+            for r in accepted:
+                newest[r.entry.branch] = r.entry
+                models.add_stock_rollup_delta(rollup, r.entry.branch, r.entry.date, vars(r.entry))
+                stale.update(entry_tags(r.entry.branch, r.entry.date))
+            mark_stale(db, stale)
+            mark_written(db, current_user.id)
+            for branch, entry in newest.items():
+                models.record_branch_state(db.connection(), branch, entry.id, entry.created_at, vars(entry))
+            models.apply_stock_rollup(db.connection(), rollup)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Database error: {str(e)}"
+            )
+        created.sort(key=lambda entry: entry["row"])
+
+    return {
+        "received": received,
+        "imported": len(created),
+        "failed": len(errors),
+        "created": created,
+        "errors": errors,
+    }
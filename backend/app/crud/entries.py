@@ -1,14 +1,27 @@
+import os
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, extract, func, union_all, literal, Numeric
-from datetime import datetime
-from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import func, union_all, select
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, List, Optional
 from sqlalchemy.exc import SQLAlchemyError
-from app.schema.schemas import SalesEntryCreate, TrucksCreate
+from app.schema.schemas import SalesEntryCreate, SalesEntryResponse, TrucksCreate
 from app.models import models
-from app.database.database import get_db
+from app.database.database import get_db, AsyncSessionLocal
+from app.crud.pagination import keyset_page
+from app.core.executor import run_blocking
+from app.monitoring.tracing import span, traced
 
 
+# Rows fetched per round trip when streaming a branch's entries
+ENTRIES_STREAM_CHUNK_SIZE = int(os.getenv("ENTRIES_STREAM_CHUNK_SIZE", "500"))
+
+# Fields a `fields=` selection may name: the SalesEntry columns SalesEntryResponse exposes
+ENTRY_FIELDS = [
+    column.name for column in models.SalesEntry.__table__.columns
+    if column.name in SalesEntryResponse.model_fields
+]
+
 # Custom exception class
 class ValidationError(Exception):
     def __init__(self, detail: str, status_code: int):
@@ -16,12 +29,52 @@ class ValidationError(Exception):
         self.status_code = status_code
 
         
-def get_latest_reading(db: Session, branch: str):
-    return db.query(models.SalesEntry).filter(
-        models.SalesEntry.branch == branch
-    ).order_by(desc(models.SalesEntry.created_at)).first()   
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Validate a comma-separated `fields=` selection.
 
-def create_sales_entry(entry_data: SalesEntryCreate, db: Session, current_user: models.User):
+    Returns:
+        The selected field names in request order, or None to select whole entries
+
+    Raises:
+        ValueError: If no field or an unknown field is named
+    """
+    if fields is None:
+        return None
+    selected = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if not selected:
+        raise ValueError("fields must name at least one field")
+    unknown = [name for name in selected if name not in ENTRY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {unknown}. Must be among: {ENTRY_FIELDS}")
+    return selected
+
+def _entry_columns(fields: Optional[List[str]]) -> list:
+    if not fields:
+        return [models.SalesEntry]
+    # date and id are always read: pagination cursors and ordering use them
+    names = fields + [name for name in ("date", "id") if name not in fields]
+    return [getattr(models.SalesEntry, name) for name in names]
+
+@traced()
+async def get_latest_reading(db: AsyncSession, branch: str):
+    """
+    Closing readings and unit prices of the branch's newest entry, or None.
+
+    A primary-key lookup of branch_state (see models.record_branch_state)
+    in the caller's transaction on the primary. The row stays locked until
+    that transaction ends, so a concurrent insert for the branch waits and
+    then chains from this entry instead of from the same predecessor.
+    """
+    result = await db.execute(
+        select(models.BranchState)
+        .where(models.BranchState.branch == branch)
+        .with_for_update()
+    )
+    return result.scalar_one_or_none()
+
+@traced()
+async def create_sales_entry(entry_data: SalesEntryCreate, db: AsyncSession, current_user: models.User):
     try:
         # Create the SQLAlchemy model from entry data
         new_entry = models.SalesEntry(
@@ -84,7 +137,7 @@ def create_sales_entry(entry_data: SalesEntryCreate, db: Session, current_user:
             new_entry.unit_price_pms == 0.0):
             
             # Get the latest reading
-            latest_reading = get_latest_reading(db, new_entry.branch)
+            latest_reading = await get_latest_reading(db, new_entry.branch)
             
             if latest_reading:
                 # Update the opening readings
@@ -115,17 +168,21 @@ def create_sales_entry(entry_data: SalesEntryCreate, db: Session, current_user:
         
         # Try to commit
         try:
-            db.commit()
-            db.refresh(new_entry)
+            # The model is waited on off the event loop; the flush reuses the outcome
+            await run_blocking(models.prevalidate_sales_entry, new_entry)
+            with span("db.commit"):
+                await db.commit()
+            with span("db.refresh"):
+                await db.refresh(new_entry)
             return new_entry
         except ValidationError as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=str(e)
             )
         except SQLAlchemyError as e:
-            db.rollback()
+            await db.rollback()
             if isinstance(e.__cause__, ValidationError):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -138,13 +195,14 @@ def create_sales_entry(entry_data: SalesEntryCreate, db: Session, current_user:
                 )
     except Exception as e:
         if 'db' in locals() and db.is_active:
-            db.rollback()
+            await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating sales entry: {str(e)}"
         )    
     
-def create_trucks_entry(entry_data: TrucksCreate, db: Session, current_user: models.User):
+@traced()
+async def create_trucks_entry(entry_data: TrucksCreate, db: AsyncSession, current_user: models.User):
     try:
         # Create the SQLAlchemy model from entry data
         new_entry = models.Trucks(
@@ -166,17 +224,17 @@ def create_trucks_entry(entry_data: TrucksCreate, db: Session, current_user: mod
         
         # Try to commit
         try:
-            db.commit()
-            db.refresh(new_entry)
+            await db.commit()
+            await db.refresh(new_entry)
             return new_entry
         except ValidationError as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=str(e)
             )
         except SQLAlchemyError as e:
-            db.rollback()
+            await db.rollback()
             if isinstance(e.__cause__, ValidationError):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -189,80 +247,161 @@ def create_trucks_entry(entry_data: TrucksCreate, db: Session, current_user: mod
                 )
     except Exception as e:
         if 'db' in locals() and db.is_active:
-            db.rollback()
+            await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating sales entry: {str(e)}"
         )    
     
 
-def get_sales_entry_by_branch(branch: str, db: Session = Depends(get_db)):
-    entries = db.query(models.SalesEntry).filter(models.SalesEntry.branch == branch).all()
+@traced()
+async def get_sales_entry_by_branch(branch: str, db: AsyncSession = Depends(get_db), fields: Optional[List[str]] = None):
+    result = await db.execute(select(*_entry_columns(fields)).where(models.SalesEntry.branch == branch))
+    entries = result.all() if fields else result.scalars().all()
 
     return entries
 
-def get_stock_summary(db: Session, year: Optional[int] = None):
+async def iter_sales_entries_by_branch(
+    branch: str,
+    chunk_size: int = ENTRIES_STREAM_CHUNK_SIZE,
+    fields: Optional[List[str]] = None,
+    sessions: async_sessionmaker = AsyncSessionLocal,
+) -> AsyncIterator[list]:
+    """
+    Yield a branch's entries in (date, id) order, `chunk_size` rows at a time.
+    With `fields`, rows only carry those columns (plus date and id).
+
+    Rows are read through a server-side cursor, so only one chunk is held in
+    memory however much history the branch has. The generator owns its
+    session, which outlives the request's get_db session while a response
+    streams; closing the generator closes the cursor and the session.
+    `sessions` picks the database, e.g. the read replica.
+    """
+    async with sessions() as db:
+        result = await db.stream(
+            select(*_entry_columns(fields))
+            .where(models.SalesEntry.branch == branch)
+            .order_by(models.SalesEntry.date, models.SalesEntry.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        if not fields:
+            result = result.scalars()
+        async for partition in result.partitions():
+            yield partition
+
+@traced()
+async def get_stock_summary(db: AsyncSession, year: Optional[int] = None):
+    """
+    Sales totals per branch for one year (the current one by default), plus a "Total" row.
+
+    Read from the stock_rollup table, so the cost depends on the number of
+    branches and months rather than on the number of entries.
+    """
     # Create a strict year filter condition - must match exactly
     if year is not None:
         # Convert year to integer to ensure proper comparison
         try:
             year_as_int = int(year)
-            # Create a filter for the exact year
-            year_filter = (extract('year', models.SalesEntry.date) == year_as_int)
         except (ValueError, TypeError):
             # If year conversion fails, return empty results
             return []
     else:
         # If no year specified, get current year
         year_as_int = datetime.now().year
-        year_filter = (extract('year', models.SalesEntry.date) == year_as_int)
-    
-    # Aggregate data by branch with proper filtering
-    branch_totals = db.query(
-        models.SalesEntry.branch.label("branch"),
-        func.round(func.cast(func.sum(models.SalesEntry.sales_ago), Numeric), 2).label("total_ago"),
-        func.round(func.cast(func.sum(models.SalesEntry.sales_pms), Numeric), 2).label("total_pms"),
-        literal(year_as_int).label("year")
-    ).filter(
-        year_filter  # Apply the strict year filter
+
+    # At most twelve rollup rows per branch
+    branch_totals = (await db.execute(select(
+        models.StockRollup.branch.label("branch"),
+        func.sum(models.StockRollup.sales_ago).label("total_ago"),
+        func.sum(models.StockRollup.sales_pms).label("total_pms"),
+    ).where(
+        models.StockRollup.year == year_as_int
     ).group_by(
-        models.SalesEntry.branch  # Group only by branch to aggregate all entries for the year
-    ).order_by(models.SalesEntry.branch).all()
-    
-    # Calculate the overall total for all branches in the specified year
-    overall_totals = db.query(
-        literal("Total").label("branch"),
-        func.round(func.cast(func.sum(models.SalesEntry.sales_ago), Numeric), 2).label("total_ago"),
-        func.round(func.cast(func.sum(models.SalesEntry.sales_pms), Numeric), 2).label("total_pms"),
-        literal(year_as_int).label("year")
-    ).filter(
-        year_filter  # Apply the same year filter
-    ).first()
-    
+        models.StockRollup.branch
+    ).having(
+        # Months whose entries were all deleted keep an empty row
+        func.sum(models.StockRollup.entries) > 0
+    ).order_by(models.StockRollup.branch))).all()
+
     # Format the branch totals
     formatted_entries = [
         {
             "branch": entry.branch,
-            "total_ago": entry.total_ago,
-            "total_pms": entry.total_pms,
-            "year": entry.year
+            "total_ago": round(entry.total_ago, 2),
+            "total_pms": round(entry.total_pms, 2),
+            "year": year_as_int
         }
         for entry in branch_totals
     ]
-    
-    # Add the overall total row
-    if overall_totals:
-        formatted_entries.append({
-            "branch": overall_totals.branch,
-            "total_ago": overall_totals.total_ago,
-            "total_pms": overall_totals.total_pms,
-            "year": overall_totals.year
-        })
-    
+
+    # Add the overall total row, summed from the unrounded branch totals
+    formatted_entries.append({
+        "branch": "Total",
+        "total_ago": round(sum(entry.total_ago for entry in branch_totals), 2) if branch_totals else None,
+        "total_pms": round(sum(entry.total_pms for entry in branch_totals), 2) if branch_totals else None,
+        "year": year_as_int
+    })
+
     return formatted_entries
 
 
-def get_sales_entries(db: Session = Depends(get_db), skip: int = 0, limit: int = 100):
+def date_filters(
+    column,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    """
+    Turn calendar filters into half-open range predicates on a datetime column.
+
+    Comparing the column itself against bounds (rather than extracting the
+    year from it) keeps the predicates sargable, so (x, date) indexes apply.
+
+    Raises:
+        ValueError: If month is given without year, day without month, or the date does not exist
+    """
+    filters = []
+    if month is not None and year is None:
+        raise ValueError("month requires year")
+    if day is not None and month is None:
+        raise ValueError("day requires month")
+
+    if year is not None:
+        if day is not None:
+            lower = datetime(year, month, day)
+            upper = lower + timedelta(days=1)
+        elif month is not None:
+            lower = datetime(year, month, 1)
+            upper = datetime(year + month // 12, month % 12 + 1, 1)
+        else:
+            lower, upper = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+        filters += [column >= lower, column < upper]
+
+    if start_date is not None:
+        filters.append(column >= datetime.combine(start_date, datetime.min.time()))
+    if end_date is not None:
+        # end_date is inclusive: everything before the following midnight
+        filters.append(column < datetime.combine(end_date, datetime.min.time()) + timedelta(days=1))
+    return filters
+
+
+@traced()
+async def get_sales_entries(
+    db: AsyncSession = Depends(get_db),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+    branch: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    user_id: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+):
 
     """
     Retrieve sales entries with optional filtering and pagination
@@ -271,21 +410,39 @@ def get_sales_entries(db: Session = Depends(get_db), skip: int = 0, limit: int =
         db: Database session
         skip: Number of items to skip
         limit: Maximum number of items to return
+        cursor: Continue after the last entry of a previous page
+        year: Filter entries in this year (month and day narrow it further)
         branch: Filter by branch name
-        start_date: Filter entries after this date
-        end_date: Filter entries before this date
+        start_date: Filter entries on or after this date
+        end_date: Filter entries on or before this date
+        user_id: Filter entries recorded by this user
+        fields: Read only these columns (see parse_fields)
     
     Returns:
-        List of SalesEntry objects
+        Tuple of SalesEntry objects (rows of the selected columns with `fields`)
+        ordered by (date, id) and the next page cursor
     """
-    entries = db.query(models.SalesEntry).offset(skip).limit(limit).all()
-    return entries
+    query = select(*_entry_columns(fields)).where(
+        *date_filters(models.SalesEntry.date, year, month, day, start_date, end_date)
+    )
+    if branch is not None:
+        query = query.where(models.SalesEntry.branch == branch)
+    if user_id is not None:
+        query = query.where(models.SalesEntry.user_id == user_id)
+    return await keyset_page(db, query, models.SalesEntry, limit, cursor, skip, entities=not fields)
 
 # This function has been moved and improved above
 # The improved version filters by year and aggregates by branch
 
 
-def get_trucks_entries(db: Session = Depends(get_db), skip: int = 0, limit: int = 100):
+@traced()
+async def get_trucks_entries(
+    db: AsyncSession = Depends(get_db),
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    year: Optional[int] = None,
+):
 
     """
     Retrieve trucks entries with optional filtering and pagination
@@ -294,18 +451,18 @@ def get_trucks_entries(db: Session = Depends(get_db), skip: int = 0, limit: int
         db: Database session
         skip: Number of items to skip
         limit: Maximum number of items to return
-        branch: Filter by branch name
-        start_date: Filter entries after this date
-        end_date: Filter entries before this date
+        cursor: Continue after the last entry of a previous page
+        year: Filter entries in this year
     
     Returns:
-        List of Trucks objects
+        Tuple of Trucks objects ordered by (date, id) and the next page cursor
     """
-    entries = db.query(models.Trucks).offset(skip).limit(limit).all()
-    return entries
+    query = select(models.Trucks).where(*date_filters(models.Trucks.date, year))
+    return await keyset_page(db, query, models.Trucks, limit, cursor, skip)
 
-def update_sales_entry(entry_id: int, entry: SalesEntryCreate, db: Session, current_user: models.User):
-    db_entry = db.query(models.SalesEntry).filter(models.SalesEntry.id == entry_id).first()
+@traced()
+async def update_sales_entry(entry_id: int, entry: SalesEntryCreate, db: AsyncSession, current_user: models.User):
+    db_entry = await db.scalar(select(models.SalesEntry).where(models.SalesEntry.id == entry_id))
     
     if not db_entry:
         raise HTTPException(
@@ -324,13 +481,17 @@ def update_sales_entry(entry_id: int, entry: SalesEntryCreate, db: Session, curr
         setattr(db_entry, key, value)
     
     db_entry.updated_at = datetime.now()
-    db.commit()
-    db.refresh(db_entry)
+    await run_blocking(models.prevalidate_sales_entry, db_entry)
+    with span("db.commit"):
+        await db.commit()
+    with span("db.refresh"):
+        await db.refresh(db_entry)
     
     return db_entry
 
-def update_trucks_entry(entry_id: int, entry: TrucksCreate, db: Session, current_user: models.User):
-    db_entry = db.query(models.Trucks).filter(models.Trucks.id == entry_id).first()
+@traced()
+async def update_trucks_entry(entry_id: int, entry: TrucksCreate, db: AsyncSession, current_user: models.User):
+    db_entry = await db.scalar(select(models.Trucks).where(models.Trucks.id == entry_id))
     
     if not db_entry:
         raise HTTPException(
@@ -349,13 +510,14 @@ def update_trucks_entry(entry_id: int, entry: TrucksCreate, db: Session, current
         setattr(db_entry, key, value)
     
     db_entry.updated_at = datetime.now()
-    db.commit()
-    db.refresh(db_entry)
+    await db.commit()
+    await db.refresh(db_entry)
     
     return db_entry
 
-def delete_sales_entry(entry_id: int, db: Session, current_user: models.User):
-    db_entry = db.query(models.SalesEntry).filter(models.SalesEntry.id == entry_id).first()
+@traced()
+async def delete_sales_entry(entry_id: int, db: AsyncSession, current_user: models.User):
+    db_entry = await db.scalar(select(models.SalesEntry).where(models.SalesEntry.id == entry_id))
     
     if not db_entry:
         raise HTTPException(
@@ -369,12 +531,13 @@ def delete_sales_entry(entry_id: int, db: Session, current_user: models.User):
             detail="Not authorized to delete this entry"
         )
     
-    db.delete(db_entry)
-    db.commit()
+    await db.delete(db_entry)
+    await db.commit()
     return None
 
-def delete_trucks_entry(entry_id: int, db: Session, current_user: models.User):
-    db_entry = db.query(models.Trucks).filter(models.Trucks.id == entry_id).first()
+@traced()
+async def delete_trucks_entry(entry_id: int, db: AsyncSession, current_user: models.User):
+    db_entry = await db.scalar(select(models.Trucks).where(models.Trucks.id == entry_id))
     
     if not db_entry:
         raise HTTPException(
@@ -388,6 +551,6 @@ def delete_trucks_entry(entry_id: int, db: Session, current_user: models.User):
             detail="Not authorized to delete this entry"
         )
     
-    db.delete(db_entry)
-    db.commit()
+    await db.delete(db_entry)
+    await db.commit()
     return None
\ No newline at end of file
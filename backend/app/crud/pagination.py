@@ -0,0 +1,68 @@
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(date: datetime, entry_id: int) -> str:
+    """Opaque cursor pointing just past the row with this (date, id)"""
+    payload = json.dumps([date.isoformat(), entry_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, entry_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(date), int(entry_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Invalid pagination cursor")
+
+
+async def keyset_page(
+    db: AsyncSession,
+    query: Select,
+    model,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    entities: bool = True,
+) -> Tuple[List, Optional[str]]:
+    """
+    Fetch one page of `query` ordered by (date, id).
+
+    The cursor becomes a `(date, id) > (:date, :id)` row comparison, which
+    PostgreSQL answers with a seek on the (date, id) index, so every page
+    costs the same however deep it is. `skip` is only for the first pages
+    of clients that do not use cursors: an offset is still read and thrown
+    away row by row. With `entities`, the query selects `model` and its
+    objects are returned rather than one-element rows.
+
+    Returns:
+        Tuple of the rows and the cursor for the next page (None on the last page)
+
+    Raises:
+        ValueError: If the cursor is invalid or combined with `skip`
+    """
+    if cursor:
+        if skip:
+            raise ValueError("skip cannot be combined with cursor")
+        query = query.where(tuple_(model.date, model.id) > decode_cursor(cursor))
+    elif skip:
+        query = query.offset(skip)
+
+    # One extra row tells whether another page follows
+    result = await db.execute(query.order_by(model.date, model.id).limit(limit + 1))
+    rows = result.scalars().all() if entities else result.all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].date, rows[-1].id)
@@ -0,0 +1,89 @@
+"""
+Rebuild the stock_rollup table from daily_entries.
+
+Usage:
+    python -m app.crud.stock_rollup                 # every branch and month
+    python -m app.crud.stock_rollup --year 2024     # only the months of 2024
+
+stock_rollup holds per (branch, year, month) totals of the entries and is
+kept current by the SalesEntry mapper events and by bulk imports (see
+models.apply_stock_rollup). A rebuild is only needed to backfill it, or
+after daily_entries was changed with plain SQL.
+"""
+import sys
+import logging
+import argparse
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Integer, Numeric, Text, cast, delete, extract, func, insert, select, text
+
+from app.database.database import engine
+from app.models import models
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def rebuild_stock_rollup(connection, year: Optional[int] = None) -> int:
+    """
+    Recompute stock_rollup rows from daily_entries in the caller's transaction.
+
+    Entry writes are blocked until the transaction ends, so none is counted
+    twice or lost between the delete and the re-aggregation.
+
+    Args:
+        connection: Connection with an open transaction
+        year: Only rebuild the months of this year
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    entries = models.SalesEntry.__table__
+    rollup = models.StockRollup.__table__
+
+    connection.execute(text(f"LOCK TABLE {entries.name} IN SHARE MODE"))
+    # float8 is summed through its shortest text form, as apply_stock_rollup adds it
+    connection.execute(text("SET LOCAL extra_float_digits = 1"))
+
+    clear = delete(rollup)
+    aggregate = select(
+        entries.c.branch,
+        cast(extract("year", entries.c.date), Integer),
+        cast(extract("month", entries.c.date), Integer),
+        func.count(),
+        *[func.sum(cast(cast(entries.c[field], Text), Numeric)) for field in models.STOCK_ROLLUP_FIELDS],
+    )
+    if year is not None:
+        clear = clear.where(rollup.c.year == year)
+        aggregate = aggregate.where(
+            entries.c.date >= datetime(year, 1, 1),
+            entries.c.date < datetime(year + 1, 1, 1),
+        )
+    aggregate = aggregate.group_by(entries.c.branch, extract("year", entries.c.date), extract("month", entries.c.date))
+
+    connection.execute(clear)
+    result = connection.execute(
+        insert(rollup).from_select(
+            ["branch", "year", "month", "entries", *models.STOCK_ROLLUP_FIELDS],
+            aggregate,
+        )
+    )
+    return result.rowcount
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--year", type=int, help="Only rebuild the months of this year")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    with engine.begin() as connection:
+        rows = rebuild_stock_rollup(connection, args.year)
+    logger.info(f"Rebuilt {rows} stock_rollup rows" + (f" for {args.year}" if args.year else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,25 @@
 from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import exc, select
+from sqlalchemy.orm import selectinload
 import logging
 from datetime import datetime
 
 from app.schema.schemas import UserCreate, UserResponse, ShowUser, UserRole, Branch
 from app.models.models import User as UserModel
 from app.crud import hashing
+from app.core.executor import run_blocking
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def create_user(user_data: UserCreate, db: Session) -> UserResponse:
+async def create_user(user_data: UserCreate, db: AsyncSession) -> UserResponse:
     """
     Create a new user with proper error handling and validation.
     
     Args:
         user_data (UserCreate): User creation data
-        db (Session): SQLAlchemy database session
+        db (AsyncSession): SQLAlchemy database session
     
     Returns:
         UserResponse: Created user data
@@ -36,7 +38,7 @@ def create_user(user_data: UserCreate, db: Session) -> UserResponse:
             raise ValueError(f"Invalid branch. Must be one of: {[branch.value for branch in Branch]}")
         
         # Check if email already exists
-        existing_user = db.query(UserModel).filter(UserModel.email == user_data.email).first()
+        existing_user = await db.scalar(select(UserModel).where(UserModel.email == user_data.email))
         if existing_user:
             raise ValueError("User with this email already exists")
         
@@ -44,7 +46,7 @@ def create_user(user_data: UserCreate, db: Session) -> UserResponse:
         new_user = UserModel(
             fullname=user_data.fullname,
             email=user_data.email,
-            hashed_password=hashing.Hash.bcrypt(user_data.password),
+            hashed_password=await run_blocking(hashing.Hash.bcrypt, user_data.password),
             role=user_data.role,
             branch=user_data.branch,
             created_at=datetime.now(),
@@ -52,28 +54,28 @@ def create_user(user_data: UserCreate, db: Session) -> UserResponse:
         )
         
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
+        await db.refresh(new_user)
         
         logger.info(f"Created new user: {new_user.email}")
         return new_user
     
     except exc.IntegrityError as e:
         logger.error(f"Database error creating user: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise ValueError("Error creating user. Please check your input data.")
     
     except Exception as e:
         logger.error(f"Unexpected error creating user: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise
 
-def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[ShowUser]:
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[ShowUser]:
     """
     Get a list of users with pagination.
     
     Args:
-        db (Session): SQLAlchemy database session
+        db (AsyncSession): SQLAlchemy database session
         skip (int): Number of records to skip
         limit (int): Maximum number of records to return
     
@@ -81,7 +83,10 @@ def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[ShowUser]:
         List[ShowUser]: List of user data
     """
     try:
-        users = db.query(UserModel).offset(skip).limit(limit).all()
+        # ShowUser lists the entries, which cannot be lazy-loaded under asyncio
+        users = (await db.scalars(
+            select(UserModel).options(selectinload(UserModel.entries)).offset(skip).limit(limit)
+        )).all()
         logger.info(f"Retrieved {len(users)} users with skip={skip} and limit={limit}")
         return users
     
@@ -89,19 +94,21 @@ def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[ShowUser]:
         logger.error(f"Error retrieving users: {str(e)}")
         raise
 
-def get_user(fullname: str, db: Session) -> Optional[ShowUser]:
+async def get_user(fullname: str, db: AsyncSession) -> Optional[ShowUser]:
     """
     Get a specific user by fullname.
     
     Args:
         fullname (str): The fullname of the user to update
-        db (Session): SQLAlchemy database session
+        db (AsyncSession): SQLAlchemy database session
     
     Returns:
         Optional[ShowUser]: User data if found, None otherwise
     """
     try:
-        user = db.query(UserModel).filter(UserModel.fullname == fullname).first()
+        user = await db.scalar(
+            select(UserModel).options(selectinload(UserModel.entries)).where(UserModel.fullname == fullname)
+        )
         if user:
             logger.info(f"Retrieved user ID: {fullname}")
         return user
@@ -110,13 +117,13 @@ def get_user(fullname: str, db: Session) -> Optional[ShowUser]:
         logger.error(f"Error retrieving user {fullname}: {str(e)}")
         raise
 
-def get_current_active_user(fullname: str, db: Session) -> UserResponse:
+async def get_current_active_user(fullname: str, db: AsyncSession) -> UserResponse:
     """
     Get the current active user's information.
     
     Args:
         fullname (str): The fullname of the user to update
-        db (Session): SQLAlchemy database session
+        db (AsyncSession): SQLAlchemy database session
     
     Returns:
         UserResponse: User data if found
@@ -125,7 +132,7 @@ def get_current_active_user(fullname: str, db: Session) -> UserResponse:
         ValueError: If user not found
     """
     try:
-        user = db.query(UserModel).filter(UserModel.fullname == fullname).first()
+        user = await db.scalar(select(UserModel).where(UserModel.fullname == fullname))
         if not user:
             raise ValueError(f"User with ID {fullname} not found")
         
@@ -136,14 +143,14 @@ def get_current_active_user(fullname: str, db: Session) -> UserResponse:
         logger.error(f"Error retrieving current user {fullname}: {str(e)}")
         raise
 
-def update_user(fullname: str, user_data: UserCreate, db: Session) -> ShowUser:
+async def update_user(fullname: str, user_data: UserCreate, db: AsyncSession) -> ShowUser:
     """
     Update an existing user's data.
     
     Args:
         fullname (str): The fullname of the user to update
         user_data (UserCreate): Updated user data
-        db (Session): SQLAlchemy database session
+        db (AsyncSession): SQLAlchemy database session
     
     Returns:
         ShowUser: Updated user data
@@ -153,8 +160,14 @@ def update_user(fullname: str, user_data: UserCreate, db: Session) -> ShowUser:
         ValueError: If invalid role or branch
     """
     try:
-        # Get existing user
-        user = db.query(UserModel).filter(UserModel.fullname == fullname).first()
+        # Get existing user. It may already be in the session without its
+        # entries; reloading it makes refresh() below load them again too.
+        user = await db.scalar(
+            select(UserModel)
+            .options(selectinload(UserModel.entries))
+            .where(UserModel.fullname == fullname)
+            .execution_options(populate_existing=True)
+        )
         if not user:
             raise ValueError(f"User with ID {fullname} not found")
         
@@ -169,56 +182,56 @@ def update_user(fullname: str, user_data: UserCreate, db: Session) -> ShowUser:
         # Update user data
         user.fullname = user_data.fullname
         user.email = user_data.email
-        user.hashed_password = hashing.Hash.bcrypt(user_data.password)
+        user.hashed_password = await run_blocking(hashing.Hash.bcrypt, user_data.password)
         user.role = user_data.role
         user.branch = user_data.branch
         user.updated_at = datetime.now()
         
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
         
         logger.info(f"Updated user: {fullname}")
         return user
     
     except exc.IntegrityError as e:
         logger.error(f"Database error updating user: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise ValueError("Error updating user. Please check your input data.")
     
     except Exception as e:
         logger.error(f"Unexpected error updating user: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise
 
-def delete_user(fullname: str, db: Session) -> None:
+async def delete_user(fullname: str, db: AsyncSession) -> None:
     """
     Delete a user by fullname.
     
     Args:
         fullname (str): The fullname of the user to delete
-        db (Session): SQLAlchemy database session
+        db (AsyncSession): SQLAlchemy database session
     
     Raises:
         ValueError: If user not found
     """
     try:
         # Get user to delete
-        user = db.query(UserModel).filter(UserModel.fullname == fullname).first()
+        user = await db.scalar(select(UserModel).where(UserModel.fullname == fullname))
         if not user:
             raise ValueError(f"User with ID {fullname} not found")
         
         # Delete user
-        db.delete(user)
-        db.commit()
+        await db.delete(user)
+        await db.commit()
         
         logger.info(f"Deleted user ID: {fullname}")
     
     except exc.IntegrityError as e:
         logger.error(f"Database error deleting user: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise ValueError("Error deleting user. Please check if the user exists.")
     
     except Exception as e:
         logger.error(f"Unexpected error deleting user: {str(e)}")
-        db.rollback()
+        await db.rollback()
         raise ValueError("Error deleting user. Please check if the user exists.")
\ No newline at end of file
@@ -0,0 +1,298 @@
+import os
+import time
+import logging
+from contextvars import ContextVar
+from typing import Optional, Set
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.core.singleflight import SingleFlight
+from app.core.ttl_cache import TTLCache, MISSING
+from app.database.database import AsyncSessionLocal, ReplicaSessionLocal
+from app.monitoring.metrics import REPLICA_READS, REPLICA_LAG_SECONDS
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds a writer's reads are checked against the position of their last
+# write; past it the lag check alone applies
+REPLICA_READ_YOUR_WRITES_SECONDS = float(os.getenv("REPLICA_READ_YOUR_WRITES_SECONDS", "5"))
+# Replay lag beyond which reads go to the primary
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+# How long a lag measurement is trusted before the replica is asked again
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "1"))
+
+# Request header and cookie carrying the primary's WAL position after the
+# client's last write, so any worker can tell whether a replica has it
+READ_AFTER_HEADER = "X-Read-After"
+READ_AFTER_COOKIE = "read_after"
+
+# Where the primary's WAL is now
+PRIMARY_LSN_QUERY = text("SELECT pg_current_wal_lsn()::text")
+
+# How far the replica has replayed, and seconds it is behind the primary
+# position measured just before: zero when it has replayed up to it,
+# otherwise the age of the last transaction it replayed. Whatever it has
+# received but not replayed (or not received at all) counts as behind.
+REPLICA_LAG_QUERY = text(
+    """
+    SELECT
+        CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END::text,
+        CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_replay_lsn() >= CAST(CAST(:primary_lsn AS text) AS pg_lsn) THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END
+    """
+)
+
+
+def parse_lsn(value: Optional[str]) -> Optional[int]:
+    """A WAL position such as 16/B374D848 as an integer, or None if malformed"""
+    try:
+        high, low = value.split("/")
+        return (int(high, 16) << 32) | int(low, 16)
+    except (AttributeError, ValueError):
+        return None
+
+
+def format_lsn(lsn: int) -> str:
+    return f"{lsn >> 32:X}/{lsn & 0xFFFFFFFF:X}"
+
+
+class RequestWrites:
+    """Users whose writes committed while handling one request"""
+
+    def __init__(self):
+        self.wrote = False
+        self.writer_ids: Set[int] = set()
+
+    def record(self, writer_id: Optional[int]) -> None:
+        self.wrote = True
+        if writer_id is not None:
+            self.writer_ids.add(writer_id)
+
+
+# Writes of the request being handled; set by ReadYourWritesMiddleware and
+# shared with the pool threads its commits may run on
+current_writes: ContextVar[Optional[RequestWrites]] = ContextVar("current_writes", default=None)
+
+# WAL position the client sent back from its last write, if any
+client_read_after: ContextVar[Optional[int]] = ContextVar("client_read_after", default=None)
+
+
+class ReplicaRouter:
+    """
+    Chooses the database a read-only request is served from.
+
+    Reads go to the replica unless its replay lag exceeds `max_lag` (or
+    cannot be measured), or the replica has not yet replayed the requesting
+    user's last write: that user then reads from the primary and sees the
+    write. The position of a write is the primary's WAL position after it
+    committed. ReadYourWritesMiddleware hands it to the client, which sends
+    it back on its next requests whichever worker serves them; this worker
+    also remembers it per user for clients that do not send it back. The
+    window is never shorter than a write can take to reach a replica that
+    passed the lag check.
+    """
+
+    def __init__(self, replica_sessions: Optional[async_sessionmaker], window: float, max_lag: float, lag_check_interval: float):
+        self.replica_sessions = replica_sessions
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.window = max(window, max_lag + lag_check_interval)
+        self._writers = TTLCache(self.window)
+        self._last_write = float("-inf")
+        self._lag = None
+        self._replayed = None
+        self._lag_checked = float("-inf")
+        self._lag_flight = SingleFlight("replica_lag")
+
+    @property
+    def enabled(self) -> bool:
+        return self.replica_sessions is not None
+
+    def note_write(self, user_id: Optional[int] = None, lsn: Optional[int] = None) -> None:
+        self._last_write = time.monotonic()
+        if user_id is not None and lsn is not None:
+            previous = self._writers.get(user_id)
+            self._writers.set(user_id, lsn if previous is MISSING else max(lsn, previous))
+
+    def wrote_recently(self) -> bool:
+        """Whether anyone wrote through this worker within the window"""
+        return time.monotonic() - self._last_write < self.window
+
+    def read_after(self, user_id: Optional[int]) -> Optional[int]:
+        """WAL position the replica must have replayed to serve `user_id`"""
+        positions = [client_read_after.get()]
+        if user_id is not None:
+            positions.append(self._writers.get(user_id))
+        positions = [lsn for lsn in positions if lsn is not None and lsn is not MISSING]
+        return max(positions) if positions else None
+
+    async def _measure_lag(self) -> Optional[float]:
+        try:
+            async with AsyncSessionLocal() as db:
+                primary_lsn = await db.scalar(PRIMARY_LSN_QUERY)
+            async with self.replica_sessions() as db:
+                replayed, lag = (await db.execute(REPLICA_LAG_QUERY, {"primary_lsn": primary_lsn})).one()
+            # No transaction replayed since the replica started: age unknown
+            lag = float(lag) if lag is not None else None
+            replayed = parse_lsn(replayed)
+        except Exception as e:
+            logger.warning(f"Could not measure replica lag: {str(e)}")
+            lag, replayed = None, None
+        self._lag, self._replayed, self._lag_checked = lag, replayed, time.monotonic()
+        if lag is not None:
+            REPLICA_LAG_SECONDS.set(lag)
+        return lag
+
+    async def lag(self) -> Optional[float]:
+        """Replay lag of the replica in seconds, or None if it cannot be reached"""
+        if time.monotonic() - self._lag_checked < self.lag_check_interval:
+            return self._lag
+        return await self._lag_flight.do("lag", self._measure_lag)
+
+    async def has_replayed(self, lsn: int) -> bool:
+        """Whether the replica has replayed the WAL up to `lsn`"""
+        if self._replayed is not None and self._replayed >= lsn:
+            return True
+        # The last measurement may predate the write; ask again (shared
+        # with concurrent callers) before giving up on the replica
+        await self._lag_flight.do("lag", self._measure_lag)
+        return self._replayed is not None and self._replayed >= lsn
+
+    async def use_replica(self, user_id: Optional[int]) -> bool:
+        if not self.enabled:
+            return False
+        lag = await self.lag()
+        if lag is None or lag > self.max_lag:
+            REPLICA_READS.labels(target="primary", reason="unavailable" if lag is None else "lagging").inc()
+            return False
+        read_after = self.read_after(user_id)
+        if read_after is not None and not await self.has_replayed(read_after):
+            REPLICA_READS.labels(target="primary", reason="recent_write").inc()
+            return False
+        REPLICA_READS.labels(target="replica", reason="ok").inc()
+        return True
+
+    def sessions(self, replica: bool) -> async_sessionmaker:
+        return self.replica_sessions if replica else AsyncSessionLocal
+
+    async def read_session(self, user_id: Optional[int]) -> AsyncSession:
+        """A session for a read-only request made by `user_id`"""
+        return self.sessions(await self.use_replica(user_id))()
+
+
+replica_router = ReplicaRouter(
+    ReplicaSessionLocal,
+    REPLICA_READ_YOUR_WRITES_SECONDS,
+    REPLICA_MAX_LAG_SECONDS,
+    REPLICA_LAG_CHECK_INTERVAL,
+)
+
+
+def attribute_writes(session, user_id: int) -> None:
+    """Credit the writes `session` commits to this user"""
+    session.info["writer_id"] = user_id
+
+
+def mark_written(session, user_id: Optional[int] = None) -> None:
+    """Record a write made without a flush (e.g. by COPY) in the session's transaction"""
+    session.info["wrote"] = True
+    if user_id is not None:
+        attribute_writes(session, user_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _note_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _note_commit(session):
+    if session.info.pop("wrote", False):
+        replica_router.note_write()
+        writes = current_writes.get()
+        if writes is not None:
+            writes.record(session.info.get("writer_id"))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_writes(session):
+    session.info.pop("wrote", None)
+
+
+async def primary_lsn() -> int:
+    """The primary's current WAL position"""
+    async with AsyncSessionLocal() as db:
+        return parse_lsn(await db.scalar(PRIMARY_LSN_QUERY))
+
+
+def _read_after_from(scope) -> Optional[int]:
+    header = READ_AFTER_HEADER.lower().encode()
+    cookie_prefix = READ_AFTER_COOKIE + "="
+    for name, value in scope["headers"]:
+        if name == header:
+            return parse_lsn(value.decode("latin-1"))
+        if name == b"cookie":
+            for cookie in value.decode("latin-1").split(";"):
+                cookie = cookie.strip()
+                if cookie.startswith(cookie_prefix):
+                    return parse_lsn(cookie[len(cookie_prefix):])
+    return None
+
+
+class ReadYourWritesMiddleware:
+    """
+    Hands the client the WAL position of the writes its request committed,
+    in an X-Read-After header and a read_after cookie, and takes it back
+    from the next requests so the ReplicaRouter of whichever worker serves
+    them keeps the client on the primary until the replica has replayed it.
+    Does nothing when no replica is configured.
+    """
+
+    def __init__(self, app, router: ReplicaRouter = replica_router):
+        self.app = app
+        self.router = router
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.router.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        writes = RequestWrites()
+        writes_token = current_writes.set(writes)
+        read_after_token = client_read_after.set(_read_after_from(scope))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and writes.wrote:
+                # The write committed before the response starts, so this
+                # position includes it
+                try:
+                    lsn = await primary_lsn()
+                except Exception as e:
+                    logger.warning(f"Could not read the primary WAL position: {str(e)}")
+                    lsn = None
+                if lsn is not None:
+                    for writer_id in writes.writer_ids:
+                        self.router.note_write(writer_id, lsn)
+                    position = format_lsn(lsn)
+                    message = {**message, "headers": [
+                        *message.get("headers", []),
+                        (READ_AFTER_HEADER.lower().encode(), position.encode()),
+                        (b"set-cookie", (
+                            f"{READ_AFTER_COOKIE}={position}; Max-Age={int(self.router.window) + 1}; "
+                            "Path=/api; HttpOnly; SameSite=Lax"
+                        ).encode()),
+                    ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            client_read_after.reset(read_after_token)
+            current_writes.reset(writes_token)
@@ -1,22 +1,63 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import entries, user
+from app.routers import entries, user, metrics, ml, health, profiling, memory
 from app.authentication import router_auth
-from app.database.database import engine
-from app.models import models  
+from app.authentication.auth import is_admin_token
+from app.core.startup import warm_up
+from app.monitoring.memory import memory_sampler
+from app.monitoring.middleware import PrometheusMiddleware
+from app.monitoring.profiling import ProfilingMiddleware
+from app.monitoring.sql import SQLStatementsMiddleware
+from app.monitoring.tracing import TracingMiddleware
+from app.database.database import async_engine, replica_async_engine
+from app.database.replica import ReadYourWritesMiddleware
 
-models.Base.metadata.create_all(bind=engine)
+# The schema is owned by the Alembic migrations, run before the app starts
+# (see docker-compose.yml); importing the app does not touch the database
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the worker accepts connections (and
+    # answers /health) at once; /ready turns green when warm-up is done
+    warming = asyncio.create_task(warm_up())
+    # Per worker, so each one exports its own memory gauges
+    memory_sampler.start()
+    yield
+    warming.cancel()
+    memory_sampler.stop()
+    await async_engine.dispose()
+    if replica_async_engine is not None:
+        await replica_async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Innermost, so the profile covers the request and not the middleware
+app.add_middleware(ProfilingMiddleware, authorize=is_admin_token)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the dashboards read the keyset pagination cursor, profile ids
+    # and the read-your-writes position
+    expose_headers=["X-Next-Cursor", "X-Profile-Id", "X-Read-After"],
 )
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(SQLStatementsMiddleware)
+# Outermost, so their timings include the other middleware
+app.add_middleware(PrometheusMiddleware)
+app.add_middleware(TracingMiddleware)
 
 app.include_router(router_auth.router)
 app.include_router(entries.router)
 app.include_router(user.router)
+app.include_router(ml.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
+app.include_router(profiling.router)
+app.include_router(memory.router)
@@ -0,0 +1,144 @@
+import os
+import queue
+import asyncio
+import threading
+import time
+import logging
+from concurrent.futures import Future
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Maximum number of rows scored by a single predict() call
+ML_BATCH_MAX_SIZE = int(os.getenv("ML_BATCH_MAX_SIZE", "64"))
+
+# How long the first request of a batch waits for others to join it (milliseconds)
+ML_BATCH_MAX_WAIT_MS = float(os.getenv("ML_BATCH_MAX_WAIT_MS", "5"))
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class MicroBatcher:
+    """
+    Collects concurrent prediction requests and scores them together.
+
+    Each caller submits a single feature row and blocks until its result is
+    ready. A background thread takes the first pending row, keeps collecting
+    rows for up to `max_wait_ms` (or until `max_batch_size` rows are queued),
+    stacks them into one matrix and makes a single vectorized `predict_fn`
+    call. Results are handed back to each waiting caller through a Future.
+
+    Callers block for up to `max_wait_ms` plus the model call, so they must
+    not run on an event loop thread; async code scores on a worker thread.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = ML_BATCH_MAX_SIZE,
+        max_wait_ms: float = ML_BATCH_MAX_WAIT_MS,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0.0) / 1000.0
+
+        self._queue: "queue.Queue[Tuple[np.ndarray, Future]]" = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # Start the worker lazily so forked processes get their own thread
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="ml-micro-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def submit(self, features: np.ndarray) -> Future:
+        """
+        Queue one feature row for scoring.
+
+        Args:
+            features: A 1-D row or a 1xN array of features
+
+        Returns:
+            Future: Resolves to the prediction for this row
+
+        Raises:
+            RuntimeError: If called from a running event loop
+        """
+        if _on_event_loop():
+            raise RuntimeError(
+                "MicroBatcher.submit() would block the event loop; call it from a worker thread"
+            )
+        row = np.asarray(features, dtype=float).reshape(-1)
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((row, future))
+        return future
+
+    def predict(self, features: np.ndarray, timeout: float = None) -> float:
+        """Submit one row and wait for its prediction"""
+        return self.submit(features).result(timeout=timeout)
+
+    def _collect(self) -> List[Tuple[np.ndarray, Future]]:
+        # Block until at least one request is waiting
+        batch = [self._queue.get()]
+
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Still drain anything already queued without waiting further
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            # Skip rows whose caller has already given up
+            batch = [(row, future) for row, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                matrix = np.vstack([row for row, _ in batch])
+                predictions = np.asarray(self.predict_fn(matrix)).reshape(-1)
+                if predictions.shape[0] != len(batch):
+                    raise ValueError(
+                        f"Model returned {predictions.shape[0]} predictions for {len(batch)} rows"
+                    )
+            except Exception as e:
+                logger.error(f"Batched prediction failed for {len(batch)} rows: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result(float(prediction))
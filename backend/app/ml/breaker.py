@@ -0,0 +1,94 @@
+import os
+import time
+import logging
+import threading
+
+from app.monitoring.metrics import ML_BREAKER_STATE, ML_BREAKER_TRANSITIONS
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Consecutive timeouts/errors that open the breaker
+ML_BREAKER_FAILURE_THRESHOLD = int(os.getenv("ML_BREAKER_FAILURE_THRESHOLD", "5"))
+
+# Seconds the breaker stays open before letting a trial prediction through
+ML_BREAKER_RESET_TIMEOUT = float(os.getenv("ML_BREAKER_RESET_TIMEOUT", "30"))
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency until it has had time to recover.
+
+    Closed: every call goes through; consecutive failures are counted.
+    Open: calls are refused until `reset_timeout` seconds have passed.
+    Half-open: a single trial call is let through; success closes the
+    breaker, failure opens it again for another `reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = ML_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = ML_BREAKER_RESET_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        ML_BREAKER_STATE.labels(breaker=name).set(_STATE_VALUES[CLOSED])
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _transition(self, state: str) -> None:
+        # Called with the lock held
+        if state == self._state:
+            return
+        logger.warning(f"Circuit breaker {self.name}: {self._state} -> {state}")
+        self._state = state
+        ML_BREAKER_STATE.labels(breaker=self.name).set(_STATE_VALUES[state])
+        ML_BREAKER_TRANSITIONS.labels(breaker=self.name, state=state).inc()
+
+    def allow_request(self) -> bool:
+        """Whether the caller may use the protected dependency right now"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._transition(HALF_OPEN)
+
+            # Half-open: only one trial call at a time
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            self._transition(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
@@ -0,0 +1,109 @@
+"""
+Compile the_model.joblib into a NumPy predictor artifact.
+
+Usage:
+    python -m app.ml.export --model the_model.joblib      # writes the_model.fast.joblib
+    python -m app.ml.export --vectors recorded.npy        # check against recorded features
+    python -m app.ml.export --from-db 1000                # check against stored entries
+
+The command refuses to write the artifact unless the compiled predictor
+reproduces the sklearn model exactly on the check vectors, and prints a
+latency comparison between the two.
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+
+import joblib
+import numpy as np
+
+from app.ml.predictor import (
+    compile_predictor,
+    check_equivalence,
+    benchmark,
+    synthetic_vectors,
+    fast_artifact_path,
+    UnsupportedModelError,
+)
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = os.path.join(os.getcwd(), "the_model.joblib")
+
+
+def load_vectors(path: str) -> np.ndarray:
+    """Load recorded feature vectors from a .npy or .csv file"""
+    if path.endswith(".npy"):
+        return np.load(path)
+    return np.loadtxt(path, delimiter=",", ndmin=2)
+
+
+def vectors_from_db(limit: int) -> np.ndarray:
+    """Build feature vectors from the most recent stored sales entries"""
+    from app.database.database import SessionLocal
+    from app.models.models import SalesEntry, extract_features
+
+    db = SessionLocal()
+    try:
+        entries = db.query(SalesEntry).order_by(SalesEntry.id.desc()).limit(limit).all()
+        return np.vstack([extract_features(entry) for entry in entries]) if entries else np.empty((0, 27))
+    finally:
+        db.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to the sklearn joblib model")
+    parser.add_argument("--output", help="Where to write the compiled predictor (default: <model>.fast.joblib)")
+    parser.add_argument("--vectors", help="Recorded feature vectors (.npy or .csv) to check against")
+    parser.add_argument("--from-db", type=int, metavar="N", help="Check against the N most recent entries")
+    parser.add_argument("--check-only", action="store_true", help="Verify and benchmark without writing")
+    args = parser.parse_args(argv)
+
+    model = joblib.load(args.model)
+    try:
+        predictor = compile_predictor(model)
+    except UnsupportedModelError as e:
+        print(f"Cannot compile {args.model}: {e}", file=sys.stderr)
+        return 1
+
+    if args.vectors:
+        X = load_vectors(args.vectors)
+    elif args.from_db:
+        X = vectors_from_db(args.from_db)
+    else:
+        X = synthetic_vectors(predictor.n_features)
+
+    if X.shape[0] == 0:
+        print("No feature vectors available to check against", file=sys.stderr)
+        return 1
+
+    max_diff = check_equivalence(model, predictor, X)
+    report = {
+        "model": args.model,
+        "kind": predictor.kind,
+        "vectors": int(X.shape[0]),
+        "max_abs_difference": max_diff,
+        "sklearn": benchmark(model.predict, X),
+        "numpy": benchmark(predictor.predict, X),
+    }
+    print(json.dumps(report, indent=2))
+
+    if max_diff != 0.0:
+        print("Compiled predictor does not match the sklearn model; not exporting", file=sys.stderr)
+        return 1
+
+    if not args.check_only:
+        # Stored uncompressed so the arrays can be memory-mapped on load
+        output = args.output or fast_artifact_path(args.model)
+        joblib.dump(predictor, output)
+        print(f"Wrote {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
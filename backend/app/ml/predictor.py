@@ -0,0 +1,318 @@
+import os
+import time
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedModelError(Exception):
+    """Raised when a model cannot be compiled into a NumPy predictor"""
+    pass
+
+
+class LinearPredictor:
+    """
+    Array-backed replacement for a fitted sklearn linear regressor.
+
+    Computes `X @ coef + intercept`, the same expression sklearn's
+    `LinearModel._decision_function` evaluates, without input validation,
+    feature-name checks or estimator dispatch.
+    """
+
+    kind = "linear"
+
+    def __init__(self, coef: np.ndarray, intercept: float, feature_names: Optional[List[str]] = None):
+        self.coef = np.ascontiguousarray(coef, dtype=np.float64).reshape(-1)
+        self.intercept = float(intercept)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.n_features = self.coef.shape[0]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected an (n, {self.n_features}) feature matrix, got {X.shape}")
+        return X @ self.coef + self.intercept
+
+
+class TreeEnsemblePredictor:
+    """
+    Array-backed replacement for sklearn regression trees and tree ensembles.
+
+    All trees are flattened into shared node arrays (children, split feature,
+    threshold, leaf value) and traversed level by level for every sample and
+    every tree at once. Leaf values are then combined in estimator order,
+    either averaged (random forests) or scaled and added to a constant
+    baseline (gradient boosting), matching sklearn's accumulation order.
+    """
+
+    kind = "tree_ensemble"
+
+    def __init__(
+        self,
+        children_left: np.ndarray,
+        children_right: np.ndarray,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        missing_go_to_left: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        n_features: int,
+        average: bool = False,
+        scale: float = 1.0,
+        baseline: float = 0.0,
+        feature_names: Optional[List[str]] = None,
+    ):
+        self.children_left = np.ascontiguousarray(children_left, dtype=np.int64)
+        self.children_right = np.ascontiguousarray(children_right, dtype=np.int64)
+        self.feature = np.ascontiguousarray(feature, dtype=np.int64)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.missing_go_to_left = np.ascontiguousarray(missing_go_to_left, dtype=bool)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int64)
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.average = bool(average)
+        self.scale = float(scale)
+        self.baseline = float(baseline)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Return the leaf node reached in every tree, shape (n_samples, n_trees)"""
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected an (n, {self.n_features}) feature matrix, got {X.shape}")
+
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.roots.shape[0])).copy()
+        rows = np.arange(X.shape[0])[:, None]
+        for _ in range(self.max_depth):
+            left = self.children_left[nodes]
+            internal = left != -1
+            if not internal.any():
+                break
+            x = X[rows, self.feature[nodes]]
+            go_left = x <= self.threshold[nodes]
+            go_left |= np.isnan(x) & self.missing_go_to_left[nodes]
+            nodes = np.where(internal, np.where(go_left, left, self.children_right[nodes]), nodes)
+        return nodes
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        leaf_values = self.value[self.apply(X)]
+
+        if self.average:
+            result = np.zeros(leaf_values.shape[0], dtype=np.float64)
+            for t in range(leaf_values.shape[1]):
+                result += leaf_values[:, t]
+            result /= leaf_values.shape[1]
+            return result
+
+        result = np.full(leaf_values.shape[0], self.baseline, dtype=np.float64)
+        for t in range(leaf_values.shape[1]):
+            result += self.scale * leaf_values[:, t]
+        return result
+
+
+def _flatten_trees(trees) -> dict:
+    """Concatenate sklearn `Tree` objects into one set of node arrays"""
+    left, right, feature, threshold, missing, value, roots = [], [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for tree in trees:
+        if tree.n_outputs != 1 or tree.value.shape[2] != 1:
+            raise UnsupportedModelError("Only single-output regression trees are supported")
+
+        n = tree.node_count
+        tree_left = tree.children_left.astype(np.int64)
+        tree_right = tree.children_right.astype(np.int64)
+        leaf = tree_left == -1
+
+        left.append(np.where(leaf, -1, tree_left + offset))
+        right.append(np.where(leaf, -1, tree_right + offset))
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        if hasattr(tree, "missing_go_to_left"):
+            missing.append(np.asarray(tree.missing_go_to_left, dtype=bool))
+        else:
+            missing.append(np.zeros(n, dtype=bool))
+        value.append(tree.value[:, 0, 0])
+        roots.append(offset)
+
+        max_depth = max(max_depth, tree.max_depth)
+        offset += n
+
+    return {
+        "children_left": np.concatenate(left),
+        "children_right": np.concatenate(right),
+        "feature": np.concatenate(feature),
+        "threshold": np.concatenate(threshold),
+        "missing_go_to_left": np.concatenate(missing),
+        "value": np.concatenate(value),
+        "roots": np.asarray(roots, dtype=np.int64),
+        "max_depth": max_depth,
+    }
+
+
+def compile_predictor(model):
+    """
+    Convert a fitted sklearn regressor into an array-backed NumPy predictor.
+
+    Supports LinearRegression-style models (anything exposing `coef_` and
+    `intercept_`), DecisionTreeRegressor, RandomForestRegressor,
+    ExtraTreesRegressor and GradientBoostingRegressor.
+
+    Raises:
+        UnsupportedModelError: If the model type cannot be compiled
+    """
+    from sklearn.tree import DecisionTreeRegressor
+    from sklearn.ensemble import (
+        RandomForestRegressor,
+        ExtraTreesRegressor,
+        GradientBoostingRegressor,
+    )
+
+    feature_names = getattr(model, "feature_names_in_", None)
+    n_features = getattr(model, "n_features_in_", None)
+
+    if isinstance(model, DecisionTreeRegressor):
+        return TreeEnsemblePredictor(
+            **_flatten_trees([model.tree_]),
+            n_features=n_features,
+            feature_names=feature_names,
+        )
+
+    if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+        return TreeEnsemblePredictor(
+            **_flatten_trees([estimator.tree_ for estimator in model.estimators_]),
+            n_features=n_features,
+            average=True,
+            feature_names=feature_names,
+        )
+
+    if isinstance(model, GradientBoostingRegressor):
+        if model.estimators_.shape[1] != 1:
+            raise UnsupportedModelError("Only single-output gradient boosting is supported")
+        if model.init_ == "zero":
+            baseline = 0.0
+        else:
+            baseline = float(np.asarray(model.init_.predict(np.zeros((1, n_features)))).reshape(-1)[0])
+        return TreeEnsemblePredictor(
+            **_flatten_trees([estimator.tree_ for estimator in model.estimators_[:, 0]]),
+            n_features=n_features,
+            scale=model.learning_rate,
+            baseline=baseline,
+            feature_names=feature_names,
+        )
+
+    coef = getattr(model, "coef_", None)
+    intercept = getattr(model, "intercept_", None)
+    if coef is not None and intercept is not None and hasattr(model, "_decision_function"):
+        coef = np.asarray(coef)
+        if coef.ndim > 1 and coef.shape[0] != 1:
+            raise UnsupportedModelError("Only single-output linear models are supported")
+        return LinearPredictor(coef, np.asarray(intercept).reshape(-1)[0], feature_names)
+
+    raise UnsupportedModelError(f"Cannot compile model of type {type(model).__name__}")
+
+
+def synthetic_vectors(n_features: int, n: int = 512, seed: int = 0) -> np.ndarray:
+    """Random feature vectors in a plausible range for probing a model"""
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 50_000, size=(n, n_features))
+
+
+def check_equivalence(reference, predictor, X: np.ndarray) -> float:
+    """
+    Compare a compiled predictor against the sklearn model it came from.
+
+    Args:
+        reference: The fitted sklearn model
+        predictor: The compiled predictor
+        X: Feature vectors to compare on
+
+    Returns:
+        float: The largest absolute difference between the two (0.0 when identical)
+    """
+    import warnings
+
+    X = np.asarray(X, dtype=np.float64)
+    with warnings.catch_warnings():
+        # The model was fitted with feature names; plain arrays are expected here
+        warnings.simplefilter("ignore", UserWarning)
+        expected = np.asarray(reference.predict(X), dtype=np.float64).reshape(-1)
+    actual = predictor.predict(X)
+    if expected.shape != actual.shape:
+        return float("inf")
+    return float(np.max(np.abs(expected - actual))) if expected.size else 0.0
+
+
+def benchmark(predict_fn, X: np.ndarray, repeat: int = 200) -> dict:
+    """
+    Time single-row and whole-batch predictions.
+
+    Returns:
+        dict: Median single-row latency and batch latency in microseconds
+    """
+    import warnings
+
+    X = np.asarray(X, dtype=np.float64)
+    single, batch = [], []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        for i in range(repeat):
+            row = X[i % X.shape[0]:i % X.shape[0] + 1]
+            start = time.perf_counter()
+            predict_fn(row)
+            single.append(time.perf_counter() - start)
+        for _ in range(max(repeat // 10, 1)):
+            start = time.perf_counter()
+            predict_fn(X)
+            batch.append(time.perf_counter() - start)
+
+    return {
+        "single_row_us": float(np.median(single) * 1e6),
+        "batch_us": float(np.median(batch) * 1e6),
+        "batch_rows": int(X.shape[0]),
+    }
+
+
+def fast_artifact_path(model_path: str) -> str:
+    """Where the exported fast predictor for a given model file lives"""
+    return os.path.splitext(model_path)[0] + ".fast.joblib"
+
+
+def build_fast_predictor(reference, artifact_path: Optional[str] = None, mmap_mode: Optional[str] = None):
+    """
+    Get the NumPy fast path for the online model, or None to stay on sklearn.
+
+    Prefers a previously exported artifact and falls back to compiling the
+    reference model directly. Whichever is used must reproduce the reference
+    exactly on a probe set; a stale artifact is therefore never served.
+    """
+    import joblib
+
+    candidates = []
+    if artifact_path and os.path.exists(artifact_path):
+        candidates.append(("artifact", lambda: joblib.load(artifact_path, mmap_mode=mmap_mode)))
+    candidates.append(("compiled", lambda: compile_predictor(reference)))
+
+    for source, build in candidates:
+        try:
+            predictor = build()
+        except Exception as e:
+            logger.warning(f"NumPy fast path ({source}) unavailable: {str(e)}")
+            continue
+
+        probe = synthetic_vectors(predictor.n_features, n=64)
+        max_diff = check_equivalence(reference, predictor, probe)
+        if max_diff == 0.0:
+            return predictor
+        logger.warning(f"NumPy fast path ({source}) differs from sklearn by {max_diff}")
+
+    logger.warning("Using sklearn for online validation")
+    return None
@@ -0,0 +1,217 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+from app.ml.predictor import build_fast_predictor, fast_artifact_path
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Directory that holds model artifacts; swaps may only point inside it
+ML_MODEL_DIR = os.getenv("ML_MODEL_DIR", os.getcwd())
+
+# Model used when no version has been promoted through the pointer file
+ML_MODEL_PATH = os.getenv("ML_MODEL_PATH", os.path.join(ML_MODEL_DIR, "the_model.joblib"))
+
+# File naming the active model; every worker follows it, so one write swaps them all
+ML_MODEL_POINTER_PATH = os.getenv("ML_MODEL_POINTER_PATH", os.path.join(ML_MODEL_DIR, "current_model"))
+
+# How often (seconds) workers check for a new or replaced model; 0 disables polling
+ML_MODEL_RELOAD_INTERVAL = float(os.getenv("ML_MODEL_RELOAD_INTERVAL", "30"))
+
+
+class ModelValidationError(Exception):
+    """Raised when a model artifact does not fit the application's feature layout"""
+    pass
+
+
+class ModelVersion:
+    """A loaded model together with its fast path and file identity"""
+
+    def __init__(self, path: str, model, fast_predictor, mtime: float):
+        self.path = path
+        self.model = model
+        self.fast_predictor = fast_predictor
+        self.mtime = mtime
+        self.loaded_at = datetime.now()
+
+    @property
+    def version(self) -> str:
+        return f"{os.path.basename(self.path)}@{int(self.mtime)}"
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Score a feature matrix, preferring the NumPy fast path"""
+        if self.fast_predictor is not None:
+            try:
+                return self.fast_predictor.predict(X)
+            except Exception as e:
+                logger.error(f"Fast predictor failed, falling back to sklearn: {str(e)}")
+        return self.model.predict(X)
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "path": self.path,
+            "model_type": type(self.model).__name__,
+            "fast_path": self.fast_predictor.kind if self.fast_predictor is not None else None,
+            "loaded_at": self.loaded_at.isoformat(),
+        }
+
+
+class ModelRegistry:
+    """
+    Lazily loads the validation model and swaps versions while serving.
+
+    Nothing is read from disk until the first prediction. Artifacts are loaded
+    with `mmap_mode="r"`, so the numpy arrays inside them are backed by the
+    page cache and shared between worker processes instead of copied into
+    each one. A new version is fully loaded and checked against the expected
+    feature layout before it replaces the current one in a single reference
+    assignment; in-flight predictions keep using the version they started with.
+    """
+
+    def __init__(
+        self,
+        expected_features: List[str],
+        default_path: str = ML_MODEL_PATH,
+        pointer_path: str = ML_MODEL_POINTER_PATH,
+        model_dir: str = ML_MODEL_DIR,
+        reload_interval: float = ML_MODEL_RELOAD_INTERVAL,
+    ):
+        self.expected_features = list(expected_features)
+        self.default_path = default_path
+        self.pointer_path = pointer_path
+        self.model_dir = os.path.realpath(model_dir)
+        self.reload_interval = reload_interval
+
+        self._current: Optional[ModelVersion] = None
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+
+    def resolve_path(self, name: str) -> str:
+        """
+        Turn a model file name into a path inside the model directory.
+
+        Raises:
+            ModelValidationError: If the name escapes the model directory or does not exist
+        """
+        path = os.path.realpath(os.path.join(self.model_dir, name))
+        if os.path.commonpath([path, self.model_dir]) != self.model_dir:
+            raise ModelValidationError(f"Model {name} is outside the model directory")
+        if not os.path.isfile(path):
+            raise ModelValidationError(f"Model file {name} not found")
+        return path
+
+    def active_path(self) -> str:
+        """The model path named by the pointer file, or the default model"""
+        try:
+            with open(self.pointer_path) as pointer:
+                name = pointer.read().strip()
+            if name:
+                return self.resolve_path(name)
+        except FileNotFoundError:
+            pass
+        except ModelValidationError as e:
+            logger.error(f"Ignoring model pointer {self.pointer_path}: {str(e)}")
+        return self.default_path
+
+    def validate(self, model) -> None:
+        """
+        Check that a model expects exactly the features `extract_features` builds.
+
+        Raises:
+            ModelValidationError: If the declared feature names or count differ
+        """
+        names = getattr(model, "feature_names_in_", None)
+        if names is not None:
+            names = [str(name) for name in names]
+            if names != self.expected_features:
+                missing = [n for n in self.expected_features if n not in names]
+                extra = [n for n in names if n not in self.expected_features]
+                raise ModelValidationError(
+                    f"Model features do not match extract_features "
+                    f"(missing: {missing}, unexpected: {extra}, order differs: {not missing and not extra})"
+                )
+        elif getattr(model, "n_features_in_", len(self.expected_features)) != len(self.expected_features):
+            raise ModelValidationError(
+                f"Model expects {model.n_features_in_} features, extract_features builds {len(self.expected_features)}"
+            )
+
+    def load(self, path: str) -> ModelVersion:
+        """Load and validate a model artifact without activating it"""
+        import joblib
+
+        started = time.perf_counter()
+        mtime = os.path.getmtime(path)
+        model = joblib.load(path, mmap_mode="r")
+        self.validate(model)
+        fast_predictor = build_fast_predictor(model, fast_artifact_path(path), mmap_mode="r")
+
+        version = ModelVersion(path, model, fast_predictor, mtime)
+        logger.info(f"Loaded model {version.version} in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return version
+
+    def get(self) -> ModelVersion:
+        """Return the active model version, loading or reloading it if needed"""
+        current = self._current
+        if current is not None and (self.reload_interval <= 0 or time.monotonic() < self._next_check):
+            return current
+
+        with self._lock:
+            current = self._current
+            if current is None:
+                self._current = self.load(self.active_path())
+            elif self.reload_interval > 0 and time.monotonic() >= self._next_check:
+                self._reload_if_changed(current)
+            self._next_check = time.monotonic() + self.reload_interval
+            return self._current
+
+    def _reload_if_changed(self, current: ModelVersion) -> None:
+        # Called with the lock held; a failed reload keeps the current version
+        try:
+            path = self.active_path()
+            if path == current.path and os.path.getmtime(path) == current.mtime:
+                return
+            self._current = self.load(path)
+            logger.info(f"Hot-reloaded model {current.version} -> {self._current.version}")
+        except Exception as e:
+            logger.error(f"Model reload failed, keeping {current.version}: {str(e)}")
+
+    def swap(self, name: Optional[str] = None) -> ModelVersion:
+        """
+        Activate a model version for every worker.
+
+        The new version is loaded and validated first; only then is the
+        pointer file replaced (atomically, via rename) and the local
+        reference switched. Other workers follow on their next poll.
+
+        Args:
+            name: Model file name inside the model directory; None reloads the active one
+        """
+        path = self.resolve_path(name) if name else self.active_path()
+        version = self.load(path)
+
+        with self._lock:
+            if name:
+                tmp_path = f"{self.pointer_path}.tmp"
+                with open(tmp_path, "w") as pointer:
+                    pointer.write(os.path.relpath(path, self.model_dir))
+                os.replace(tmp_path, self.pointer_path)
+            self._current = version
+            self._next_check = time.monotonic() + self.reload_interval
+
+        logger.info(f"Activated model {version.version}")
+        return version
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.get().predict(X)
+
+    @property
+    def loaded(self) -> bool:
+        return self._current is not None
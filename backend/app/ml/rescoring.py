@@ -0,0 +1,261 @@
+"""
+Re-score stored sales entries with a (new) model.
+
+Usage:
+    python -m app.ml.rescoring                          # active model, every entry
+    python -m app.ml.rescoring --model v2.joblib        # candidate model in ML_MODEL_DIR
+    python -m app.ml.rescoring --pending-only           # entries validated by the fallback rules
+
+daily_entries is read through a server-side cursor in fixed-size chunks of
+raw column values. Each chunk becomes a float feature matrix without
+building ORM objects, and chunks are scored in a process pool. Only a
+bounded number of chunks is ever in flight, so memory use does not grow
+with the table. Entries the model would reject under THRESHOLD are written
+to rescoring_results.
+"""
+import os
+import sys
+import uuid
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, insert, update
+from sqlalchemy.orm import Session
+
+from app.database.database import engine
+from app.models.models import (
+    SalesEntry,
+    RescoringRun,
+    RescoringResult,
+    FEATURE_NAMES,
+    THRESHOLD,
+    model_registry,
+)
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows per chunk streamed from the database
+RESCORE_CHUNK_SIZE = int(os.getenv("RESCORE_CHUNK_SIZE", "5000"))
+
+# Scoring processes
+RESCORE_WORKERS = int(os.getenv("RESCORE_WORKERS", str(max((os.cpu_count() or 2) - 1, 1))))
+
+# Model loaded once per scoring process by _init_worker
+_worker_model = None
+
+
+def iter_feature_chunks(
+    chunk_size: int = RESCORE_CHUNK_SIZE,
+    pending_only: bool = False,
+    include_pending: bool = True,
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Stream daily_entries as (ids, net_sales, features) column chunks.
+
+    Args:
+        chunk_size: Rows fetched from the server-side cursor at a time
+        pending_only: Only stream entries flagged with needs_rescore
+        include_pending: Whether entries flagged with needs_rescore are streamed at all
+
+    Yields:
+        Tuple of id array, net_sales array and an (n, 27) float feature matrix
+    """
+    table = SalesEntry.__table__
+    columns = [table.c.id, table.c.net_sales] + [table.c[name] for name in FEATURE_NAMES]
+    query = select(*columns).order_by(table.c.id)
+    if pending_only:
+        query = query.where(table.c.needs_rescore.is_(True))
+    elif not include_pending:
+        query = query.where(table.c.needs_rescore.is_(False))
+
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for rows in result.partitions(chunk_size):
+            block = np.array(rows, dtype=np.float64)
+            yield block[:, 0].astype(np.int64), block[:, 1], block[:, 2:]
+
+
+def _init_worker(model_path: str):
+    global _worker_model
+    _worker_model = model_registry.load(model_path)
+
+
+def _score_chunk(ids: np.ndarray, net_sales: np.ndarray, features: np.ndarray, threshold: float):
+    """Score one chunk in a worker process and return which rows fail"""
+    predicted = np.asarray(_worker_model.predict(features), dtype=np.float64).reshape(-1)
+    difference = np.abs(net_sales - predicted)
+    flagged = difference > threshold
+    return ids, flagged, net_sales[flagged], predicted[flagged], difference[flagged]
+
+
+def _write_chunk(run_id: str, ids, flagged, net_sales, predicted, difference, clear_passed: bool) -> None:
+    with engine.begin() as connection:
+        if flagged.any():
+            connection.execute(
+                insert(RescoringResult.__table__),
+                [
+                    {
+                        "run_id": run_id,
+                        "entry_id": int(entry_id),
+                        "net_sales": float(actual),
+                        "predicted_net_sales": float(prediction),
+                        "difference": float(diff),
+                    }
+                    for entry_id, actual, prediction, diff in zip(ids[flagged], net_sales, predicted, difference)
+                ],
+            )
+        if clear_passed and (~flagged).any():
+            # Entries the model now accepts no longer need a re-score
+            connection.execute(
+                update(SalesEntry.__table__)
+                .where(SalesEntry.__table__.c.id.in_([int(i) for i in ids[~flagged]]))
+                .values(needs_rescore=False)
+            )
+        connection.execute(
+            update(RescoringRun.__table__)
+            .where(RescoringRun.__table__.c.id == run_id)
+            .values(
+                rows_scored=RescoringRun.__table__.c.rows_scored + int(ids.shape[0]),
+                rows_flagged=RescoringRun.__table__.c.rows_flagged + int(flagged.sum()),
+            )
+        )
+
+
+def create_run(model_path: str, pending_only: bool = False) -> str:
+    """Record a new rescoring run and return its id"""
+    run_id = uuid.uuid4().hex
+    version = model_registry.load(model_path).version
+    with engine.begin() as connection:
+        connection.execute(
+            insert(RescoringRun.__table__).values(
+                id=run_id, model_version=version, status="running",
+                pending_only=pending_only, rows_scored=0, rows_flagged=0,
+            )
+        )
+    return run_id
+
+
+def run_rescoring(
+    run_id: str,
+    model_path: str,
+    pending_only: bool = False,
+    chunk_size: int = RESCORE_CHUNK_SIZE,
+    workers: int = RESCORE_WORKERS,
+    threshold: float = THRESHOLD,
+) -> None:
+    """
+    Score every (or every pending) entry with the model at `model_path`.
+
+    At most `2 * workers` chunks are queued or being scored at once; the
+    reader waits for a chunk to finish before fetching the next one.
+    """
+    # Passing entries are only cleared when judged by the model that serves requests
+    clear_passed = pending_only and os.path.realpath(model_path) == os.path.realpath(model_registry.active_path())
+    max_in_flight = max(workers, 1) * 2
+
+    def drain(done):
+        for future in done:
+            _write_chunk(run_id, *future.result(), clear_passed=clear_passed)
+
+    status, error = "completed", None
+    try:
+        # Spawned, not forked: the caller may be a multi-threaded server holding DB connections
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_path,),
+        ) as pool:
+            in_flight = set()
+            for ids, net_sales, features in iter_feature_chunks(chunk_size, pending_only):
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    drain(done)
+                in_flight.add(pool.submit(_score_chunk, ids, net_sales, features, threshold))
+            drain(wait(in_flight).done)
+    except Exception as e:
+        logger.error(f"Rescoring run {run_id} failed: {str(e)}")
+        status, error = "failed", str(e)
+
+    with engine.begin() as connection:
+        connection.execute(
+            update(RescoringRun.__table__)
+            .where(RescoringRun.__table__.c.id == run_id)
+            .values(status=status, error=error, finished_at=datetime.now())
+        )
+    logger.info(f"Rescoring run {run_id} {status}")
+
+
+def get_run(db: Session, run_id: str, limit: int = 1000) -> Optional[dict]:
+    """
+    Fetch a rescoring run with the entries it flagged, worst first.
+
+    Args:
+        db: Database session
+        run_id: The run to look up
+        limit: Maximum number of flagged entries to return
+
+    Returns:
+        Optional[dict]: The run and its flagged entries, or None if not found
+    """
+    run = db.query(RescoringRun).filter(RescoringRun.id == run_id).first()
+    if not run:
+        return None
+
+    flagged = db.query(
+        RescoringResult.entry_id,
+        SalesEntry.branch,
+        SalesEntry.date,
+        RescoringResult.net_sales,
+        RescoringResult.predicted_net_sales,
+        RescoringResult.difference,
+    ).join(
+        SalesEntry, SalesEntry.id == RescoringResult.entry_id
+    ).filter(
+        RescoringResult.run_id == run_id
+    ).order_by(RescoringResult.difference.desc()).limit(limit).all()
+
+    return {
+        "id": run.id,
+        "model_version": run.model_version,
+        "status": run.status,
+        "pending_only": run.pending_only,
+        "rows_scored": run.rows_scored,
+        "rows_flagged": run.rows_flagged,
+        "error": run.error,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "flagged": [row._asdict() for row in flagged],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Model file inside ML_MODEL_DIR (default: the active model)")
+    parser.add_argument("--pending-only", action="store_true", help="Only entries flagged needs_rescore")
+    parser.add_argument("--chunk-size", type=int, default=RESCORE_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=RESCORE_WORKERS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    model_path = model_registry.resolve_path(args.model) if args.model else model_registry.active_path()
+    run_id = create_run(model_path, args.pending_only)
+    run_rescoring(run_id, model_path, args.pending_only, args.chunk_size, args.workers)
+
+    with engine.connect() as connection:
+        run = connection.execute(
+            select(RescoringRun.__table__).where(RescoringRun.__table__.c.id == run_id)
+        ).one()
+    print(f"run {run.id}: {run.status}, {run.rows_flagged} of {run.rows_scored} entries flagged")
+    return 0 if run.status == "completed" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+import os
+import queue
+import random
+import threading
+import time
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.ml.registry import ModelRegistry, ModelVersion, ML_MODEL_DIR, ML_MODEL_RELOAD_INTERVAL
+from app.monitoring.metrics import (
+    ML_SHADOW_EVENTS,
+    ML_SHADOW_QUEUE_DEPTH,
+    ML_SHADOW_DELTA,
+    ML_SHADOW_SECONDS,
+    ML_SHADOW_DECISIONS,
+)
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# File naming the shadow model; no file (or an empty one) turns shadowing off
+ML_SHADOW_POINTER_PATH = os.getenv("ML_SHADOW_POINTER_PATH", os.path.join(ML_MODEL_DIR, "shadow_model"))
+
+# Fraction of validated entries also scored by the shadow model
+ML_SHADOW_SAMPLE_RATE = float(os.getenv("ML_SHADOW_SAMPLE_RATE", "1.0"))
+
+# Entries waiting for the shadow model; new ones are dropped when it is full
+ML_SHADOW_QUEUE_SIZE = int(os.getenv("ML_SHADOW_QUEUE_SIZE", "1000"))
+
+# Maximum number of rows scored by a single shadow predict() call
+ML_SHADOW_BATCH_SIZE = int(os.getenv("ML_SHADOW_BATCH_SIZE", "64"))
+
+
+class ShadowEvaluator:
+    """
+    Scores live feature vectors with a candidate model off the request path.
+
+    `submit` only samples and does a non-blocking put onto a bounded queue,
+    so a slow, failing or missing shadow model never delays the request that
+    produced the features; when the queue is full the row is dropped. A
+    daemon thread drains the queue in batches, scores them with the shadow
+    model and records how far its predictions are from the primary model's
+    and whether the two would reach a different decision under the
+    validation threshold.
+    """
+
+    def __init__(
+        self,
+        expected_features: List[str],
+        threshold: float,
+        pointer_path: str = ML_SHADOW_POINTER_PATH,
+        sample_rate: float = ML_SHADOW_SAMPLE_RATE,
+        queue_size: int = ML_SHADOW_QUEUE_SIZE,
+        batch_size: int = ML_SHADOW_BATCH_SIZE,
+        reload_interval: float = ML_MODEL_RELOAD_INTERVAL,
+    ):
+        # The registry is only used to resolve, validate, load and promote
+        # shadow artifacts; the worker thread decides which one is current
+        self.registry = ModelRegistry(expected_features, default_path="", pointer_path=pointer_path)
+        self.threshold = threshold
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.batch_size = max(batch_size, 1)
+        self.reload_interval = reload_interval if reload_interval > 0 else 30.0
+
+        self._queue: "queue.Queue[Tuple[np.ndarray, float, float]]" = queue.Queue(maxsize=max(queue_size, 1))
+        self._version: Optional[ModelVersion] = None
+        # Until the worker has looked for a shadow model, accept samples
+        self._enabled = True
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> dict:
+        return {"scored": 0, "dropped": 0, "errors": 0, "disagreements": 0, "delta_sum": 0.0, "delta_max": 0.0}
+
+    def _ensure_worker(self):
+        # Start the worker lazily so forked processes get their own thread
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="ml-shadow", daemon=True)
+                self._worker.start()
+
+    def submit(self, features: np.ndarray, primary_prediction: float, actual: float) -> bool:
+        """
+        Offer one validated entry to the shadow model. Never blocks or raises.
+
+        Args:
+            features: The feature row the primary model scored
+            primary_prediction: The primary model's prediction for it
+            actual: The net sales value the user entered
+
+        Returns:
+            bool: Whether the row was queued for shadow scoring
+        """
+        try:
+            if not self._enabled or self.sample_rate <= 0.0:
+                return False
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return False
+
+            self._ensure_worker()
+            row = np.asarray(features, dtype=float).reshape(-1)
+            self._queue.put_nowait((row, float(primary_prediction), float(actual)))
+            ML_SHADOW_EVENTS.labels(outcome="queued").inc()
+            return True
+        except queue.Full:
+            ML_SHADOW_EVENTS.labels(outcome="dropped").inc()
+            with self._stats_lock:
+                self._stats["dropped"] += 1
+            return False
+        except Exception as e:
+            logger.error(f"Could not queue entry for shadow scoring: {str(e)}")
+            return False
+        finally:
+            ML_SHADOW_QUEUE_DEPTH.set(self._queue.qsize())
+
+    def _refresh_model(self) -> None:
+        # Follow the pointer file; a broken artifact keeps the current shadow
+        try:
+            path = self.registry.active_path()
+            if not path:
+                if self._version is not None:
+                    logger.info(f"Shadow model {self._version.version} disabled")
+                self._version = None
+            elif (
+                self._version is None
+                or path != self._version.path
+                or os.path.getmtime(path) != self._version.mtime
+            ):
+                self._version = self.registry.load(path)
+                logger.info(f"Shadowing with model {self._version.version}")
+                self.reset_stats()
+        except Exception as e:
+            logger.error(f"Shadow model reload failed: {str(e)}")
+        self._enabled = self._version is not None
+
+    def _collect(self, timeout: float) -> List[Tuple[np.ndarray, float, float]]:
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        next_check = 0.0
+        while True:
+            if time.monotonic() >= next_check:
+                self._refresh_model()
+                next_check = time.monotonic() + self.reload_interval
+
+            batch = self._collect(timeout=max(next_check - time.monotonic(), 0.0))
+            ML_SHADOW_QUEUE_DEPTH.set(self._queue.qsize())
+            if batch:
+                self._score(batch)
+
+    def _score(self, batch: List[Tuple[np.ndarray, float, float]]) -> None:
+        version = self._version
+        if version is None:
+            ML_SHADOW_EVENTS.labels(outcome="skipped").inc(len(batch))
+            return
+
+        matrix = np.vstack([row for row, _, _ in batch])
+        primary = np.array([p for _, p, _ in batch], dtype=float)
+        actual = np.array([a for _, _, a in batch], dtype=float)
+
+        started = time.perf_counter()
+        try:
+            shadow = np.asarray(version.predict(matrix), dtype=float).reshape(-1)
+            if shadow.shape[0] != len(batch):
+                raise ValueError(f"Shadow model returned {shadow.shape[0]} predictions for {len(batch)} rows")
+        except Exception as e:
+            logger.error(f"Shadow prediction failed for {len(batch)} rows: {str(e)}")
+            ML_SHADOW_EVENTS.labels(outcome="error").inc(len(batch))
+            with self._stats_lock:
+                self._stats["errors"] += len(batch)
+            return
+        ML_SHADOW_SECONDS.observe(time.perf_counter() - started)
+
+        delta = np.abs(shadow - primary)
+        primary_rejects = np.abs(actual - primary) > self.threshold
+        shadow_rejects = np.abs(actual - shadow) > self.threshold
+
+        for d in delta:
+            ML_SHADOW_DELTA.observe(d)
+        for p, s in zip(primary_rejects, shadow_rejects):
+            ML_SHADOW_DECISIONS.labels(
+                primary="reject" if p else "accept",
+                shadow="reject" if s else "accept",
+            ).inc()
+        ML_SHADOW_EVENTS.labels(outcome="scored").inc(len(batch))
+
+        with self._stats_lock:
+            self._stats["scored"] += len(batch)
+            self._stats["disagreements"] += int(np.count_nonzero(primary_rejects != shadow_rejects))
+            self._stats["delta_sum"] += float(delta.sum())
+            self._stats["delta_max"] = max(self._stats["delta_max"], float(delta.max()))
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self._stats = self._empty_stats()
+
+    def set_model(self, name: Optional[str]) -> Optional[ModelVersion]:
+        """
+        Start shadowing a model for every worker, or stop when name is None.
+
+        The model is loaded and validated here first; workers pick up the
+        pointer change on their next reload check.
+        """
+        if name is None:
+            try:
+                os.remove(self.registry.pointer_path)
+            except FileNotFoundError:
+                pass
+            version = None
+        else:
+            version = self.registry.swap(name)
+
+        # Apply the change in this worker right away
+        self._version = version
+        self._enabled = version is not None
+        self.reset_stats()
+        if version is not None:
+            logger.info(f"Shadowing with model {version.version}")
+        return version
+
+    def describe(self) -> dict:
+        """This worker's shadow model and the comparison since it was loaded"""
+        version = self._version
+        with self._stats_lock:
+            stats = dict(self._stats)
+        scored = stats["scored"]
+        return {
+            "model": version.describe() if version is not None else None,
+            "sample_rate": self.sample_rate,
+            "threshold": self.threshold,
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "scored": scored,
+            "dropped": stats["dropped"],
+            "errors": stats["errors"],
+            "disagreements": stats["disagreements"],
+            "disagreement_rate": stats["disagreements"] / scored if scored else None,
+            "mean_abs_delta": stats["delta_sum"] / scored if scored else None,
+            "max_abs_delta": stats["delta_max"] if scored else None,
+        }
@@ -0,0 +1,237 @@
+"""
+Retrain the net-sales model from the entries stored in the database.
+
+Usage:
+    python -m app.ml.train                              # writes net_sales_<timestamp>.joblib
+    python -m app.ml.train --exclude-pending            # skip entries validated by the fallback rules
+    python -m app.ml.train --holdout 20 --output v2.joblib
+
+daily_entries is streamed in fixed-size chunks (see app/ml/rescoring.py) and
+folded into running, mean-centred sufficient statistics for ordinary least
+squares: feature means, the feature scatter matrix and the feature/target
+cross products. Memory use depends only on the number of features, not on
+the number of entries. The result is the minimum-norm least-squares fit
+that LinearRegression would produce on the same rows. It is written as a
+LinearRegression artifact with the extract_features feature names, together
+with a JSON training report, and can be activated with
+POST /api/ml/model/swap.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from app.ml.registry import ML_MODEL_DIR
+from app.ml.rescoring import iter_feature_chunks, RESCORE_CHUNK_SIZE
+from app.models.models import FEATURE_NAMES, THRESHOLD, model_registry
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class RegressionStats:
+    """
+    Mean-centred sufficient statistics for least squares, merged chunk by chunk.
+
+    Chunks are combined with the pairwise update of Chan et al., which keeps
+    the scatter matrices centred and avoids the cancellation that raw X'X
+    sums suffer at meter-reading magnitudes.
+    """
+
+    def __init__(self, n_features: int):
+        self.n = 0
+        self.mean_x = np.zeros(n_features)
+        self.mean_y = 0.0
+        self.sxx = np.zeros((n_features, n_features))
+        self.sxy = np.zeros(n_features)
+        self.syy = 0.0
+
+    def update(self, X: np.ndarray, y: np.ndarray) -> None:
+        m = X.shape[0]
+        if m == 0:
+            return
+        chunk_mean_x = X.mean(axis=0)
+        chunk_mean_y = float(y.mean())
+        Xc = X - chunk_mean_x
+        yc = y - chunk_mean_y
+
+        n = self.n + m
+        dx = chunk_mean_x - self.mean_x
+        dy = chunk_mean_y - self.mean_y
+        weight = self.n * m / n
+
+        self.sxx += Xc.T @ Xc + weight * np.outer(dx, dx)
+        self.sxy += Xc.T @ yc + weight * dx * dy
+        self.syy += float(yc @ yc) + weight * dy * dy
+        self.mean_x += dx * (m / n)
+        self.mean_y += dy * (m / n)
+        self.n = n
+
+    def solve(self):
+        """Return (coef, intercept) of the minimum-norm least-squares fit"""
+        # Standardise so the solver's rank cut-off is not dominated by scale
+        scale = np.sqrt(np.diag(self.sxx))
+        scale[scale == 0] = 1.0
+        sxx = self.sxx / np.outer(scale, scale)
+        sxy = self.sxy / scale
+        coef = np.linalg.pinv(sxx, hermitian=True) @ sxy / scale
+        intercept = self.mean_y - float(self.mean_x @ coef)
+        return coef, intercept
+
+    def sse(self, coef: np.ndarray, intercept: float) -> float:
+        """Sum of squared residuals of a linear model over the accumulated rows"""
+        bias = self.mean_y - intercept - float(self.mean_x @ coef)
+        sse = self.syy - 2 * float(coef @ self.sxy) + float(coef @ self.sxx @ coef) + self.n * bias * bias
+        return max(sse, 0.0)
+
+    def metrics(self, coef: np.ndarray, intercept: float) -> dict:
+        if self.n == 0:
+            return {"rows": 0, "r2": None, "rmse": None}
+        sse = self.sse(coef, intercept)
+        return {
+            "rows": self.n,
+            "r2": 1 - sse / self.syy if self.syy > 0 else None,
+            "rmse": float(np.sqrt(sse / self.n)),
+        }
+
+
+class ResidualStats:
+    """Error summary of an existing model scored chunk by chunk"""
+
+    def __init__(self):
+        self.n = 0
+        self.sse = 0.0
+        self.abs_sum = 0.0
+        self.within_threshold = 0
+
+    def update(self, y: np.ndarray, predicted: np.ndarray) -> None:
+        residual = y - predicted
+        self.n += y.shape[0]
+        self.sse += float(residual @ residual)
+        self.abs_sum += float(np.abs(residual).sum())
+        self.within_threshold += int(np.count_nonzero(np.abs(residual) <= THRESHOLD))
+
+    def metrics(self, syy: float) -> dict:
+        if self.n == 0:
+            return {"rows": 0, "r2": None, "rmse": None, "mae": None, "within_threshold": None}
+        return {
+            "rows": self.n,
+            "r2": 1 - self.sse / syy if syy > 0 else None,
+            "rmse": float(np.sqrt(self.sse / self.n)),
+            "mae": self.abs_sum / self.n,
+            "within_threshold": self.within_threshold / self.n,
+        }
+
+
+def build_model(coef: np.ndarray, intercept: float):
+    """Wrap fitted coefficients in a LinearRegression the registry can load"""
+    from sklearn.linear_model import LinearRegression
+
+    model = LinearRegression()
+    model.coef_ = np.asarray(coef, dtype=np.float64)
+    model.intercept_ = float(intercept)
+    model.n_features_in_ = len(FEATURE_NAMES)
+    model.feature_names_in_ = np.asarray(FEATURE_NAMES, dtype=object)
+    return model
+
+
+def train(
+    chunk_size: int = RESCORE_CHUNK_SIZE,
+    holdout_percent: int = 10,
+    include_pending: bool = True,
+    baseline=None,
+) -> dict:
+    """
+    Fit the model in one streaming pass over daily_entries.
+
+    Entries whose id falls in the holdout bucket (id % 100 < holdout_percent)
+    are kept out of the fit and used to evaluate both the new model and, if
+    given, the baseline model.
+
+    Returns:
+        dict: The fitted model under "model" and the training report under "report"
+    """
+    train_stats = RegressionStats(len(FEATURE_NAMES))
+    holdout_stats = RegressionStats(len(FEATURE_NAMES))
+    baseline_stats = ResidualStats()
+
+    for ids, net_sales, features in iter_feature_chunks(chunk_size, include_pending=include_pending):
+        holdout = (ids % 100) < holdout_percent
+        train_stats.update(features[~holdout], net_sales[~holdout])
+        if holdout.any():
+            holdout_stats.update(features[holdout], net_sales[holdout])
+            if baseline is not None:
+                baseline_stats.update(net_sales[holdout], np.asarray(baseline.predict(features[holdout])).reshape(-1))
+
+    if train_stats.n <= len(FEATURE_NAMES):
+        raise ValueError(f"Not enough entries to train on ({train_stats.n} rows, {len(FEATURE_NAMES)} features)")
+
+    coef, intercept = train_stats.solve()
+    holdout_metrics = holdout_stats.metrics(coef, intercept)
+    report = {
+        "trained_at": datetime.now().isoformat(),
+        "estimator": "LinearRegression",
+        "method": "streamed least squares (centred sufficient statistics)",
+        "features": FEATURE_NAMES,
+        "chunk_size": chunk_size,
+        "holdout_percent": holdout_percent,
+        "include_pending": include_pending,
+        "threshold": THRESHOLD,
+        "train": train_stats.metrics(coef, intercept),
+        "holdout": holdout_metrics,
+        "intercept": intercept,
+        "coefficients": dict(zip(FEATURE_NAMES, coef.tolist())),
+    }
+    if baseline is not None:
+        report["baseline"] = {"version": getattr(baseline, "version", None), **baseline_stats.metrics(holdout_stats.syy)}
+    return {"model": build_model(coef, intercept), "report": report}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Model file to write (default: net_sales_<timestamp>.joblib in ML_MODEL_DIR)")
+    parser.add_argument("--chunk-size", type=int, default=RESCORE_CHUNK_SIZE)
+    parser.add_argument("--holdout", type=int, default=10, metavar="PERCENT", help="Entries kept out of the fit for evaluation")
+    parser.add_argument("--exclude-pending", action="store_true", help="Skip entries validated by the fallback rules")
+    parser.add_argument("--no-baseline", action="store_true", help="Do not score the active model on the holdout entries")
+    args = parser.parse_args(argv)
+
+    if not 0 <= args.holdout < 100:
+        parser.error("--holdout must be between 0 and 99")
+
+    import joblib
+
+    logging.basicConfig(level=logging.INFO)
+    baseline: Optional[object] = None
+    if not args.no_baseline:
+        try:
+            baseline = model_registry.load(model_registry.active_path())
+        except Exception as e:
+            logger.warning(f"Active model unavailable, skipping baseline comparison: {str(e)}")
+
+    try:
+        result = train(args.chunk_size, args.holdout, not args.exclude_pending, baseline)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+
+    output = args.output or os.path.join(ML_MODEL_DIR, f"net_sales_{datetime.now():%Y%m%d%H%M%S}.joblib")
+    # Stored uncompressed so the registry can memory-map it
+    joblib.dump(result["model"], output)
+    result["report"]["artifact"] = os.path.basename(output)
+    with open(os.path.splitext(output)[0] + ".report.json", "w") as report_file:
+        json.dump(result["report"], report_file, indent=2)
+
+    print(json.dumps({k: result["report"][k] for k in ("artifact", "train", "holdout", "baseline") if k in result["report"]}, indent=2))
+    print(f"Wrote {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,25 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Float, DateTime, event
+from sqlalchemy import Column, ForeignKey, Integer, String, Float, Numeric, DateTime, Boolean, event, false, select, delete, inspect, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database.database import Base
-import joblib  
 from datetime import datetime
+from decimal import Decimal
+from concurrent.futures import TimeoutError as PredictionTimeout
+import os
+import time
+import logging
 import numpy as np
+from app.ml.batching import MicroBatcher
+from app.ml.breaker import CircuitBreaker
+from app.ml.registry import ModelRegistry
+from app.ml.shadow import ShadowEvaluator
+from app.monitoring.metrics import ML_VALIDATION_FAILURES, ML_VALIDATION_FALLBACKS, ML_VALIDATION_SECONDS
+from app.monitoring.tracing import traced
+
 
+# Configure logging
+logger = logging.getLogger(__name__)
 
 
 class User(Base):
@@ -88,29 +102,134 @@ class SalesEntry(Base):
     expenditure = Column(Float, default=0.0, nullable=False)
     comment = Column(String, nullable=True)
     net_sales = Column(Float, default=0.0, nullable=False)
+    # Set when the entry was validated by the rule-based fallback instead of the model
+    needs_rescore = Column(Boolean, default=False, server_default=false(), nullable=False)
     user_id = Column(Integer, ForeignKey("workers.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     user = relationship("User", back_populates="entries")
 
+class RescoringRun(Base):
+    __tablename__ = "rescoring_runs"
 
-import os
-full_path = os.path.join(os.getcwd(), "the_model.joblib")
-#print(os.path.exists(full_path))
-
+    id = Column(String, primary_key=True)
+    model_version = Column(String, nullable=False)
+    status = Column(String, default="running", nullable=False)
+    pending_only = Column(Boolean, default=False, nullable=False)
+    rows_scored = Column(Integer, default=0, nullable=False)
+    rows_flagged = Column(Integer, default=0, nullable=False)
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
 
-    # Load your pre-trained ML model
-# Adjust the path to where your model is stored
-ml_model = joblib.load(full_path)
+class RescoringResult(Base):
+    __tablename__ = "rescoring_results"
 
-print(ml_model.feature_names_in_)
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(String, ForeignKey("rescoring_runs.id", ondelete="CASCADE"), nullable=False, index=True)
+    entry_id = Column(Integer, ForeignKey("daily_entries.id", ondelete="CASCADE"), nullable=False)
+    net_sales = Column(Float, nullable=False)
+    predicted_net_sales = Column(Float, nullable=False)
+    difference = Column(Float, nullable=False)
+
+class BranchState(Base):
+    """Readings of each branch's newest entry, carried forward into the next one"""
+    __tablename__ = "branch_state"
+
+    branch = Column(String, primary_key=True)
+    entry_id = Column(Integer, ForeignKey("daily_entries.id", ondelete="SET NULL"), nullable=True)
+    entry_created_at = Column(DateTime(timezone=True), nullable=True)
+    closing_meter_reading_ago = Column(Float, default=0.0, nullable=False)
+    closing_meter_reading_pms = Column(Float, default=0.0, nullable=False)
+    closing_tank_reading_ago = Column(Float, default=0.0, nullable=False)
+    closing_tank_reading_pms = Column(Float, default=0.0, nullable=False)
+    unit_price_ago = Column(Float, default=0.0, nullable=False)
+    unit_price_pms = Column(Float, default=0.0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class StockRollup(Base):
+    """Entry totals per branch and calendar month, kept current as entries change"""
+    __tablename__ = "stock_rollup"
+
+    branch = Column(String, primary_key=True)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    entries = Column(Integer, default=0, nullable=False)
+    received_ago = Column(Numeric, default=0, nullable=False)
+    received_pms = Column(Numeric, default=0, nullable=False)
+    total_received = Column(Numeric, default=0, nullable=False)
+    sales_ago = Column(Numeric, default=0, nullable=False)
+    sales_pms = Column(Numeric, default=0, nullable=False)
+    total_sales = Column(Numeric, default=0, nullable=False)
+    variation_ago = Column(Numeric, default=0, nullable=False)
+    variation_pms = Column(Numeric, default=0, nullable=False)
+    total_variation = Column(Numeric, default=0, nullable=False)
+    sales_in_cedis_ago = Column(Numeric, default=0, nullable=False)
+    sales_in_cedis_pms = Column(Numeric, default=0, nullable=False)
+    total_sales_in_cedis = Column(Numeric, default=0, nullable=False)
+    variation_in_cedis_ago = Column(Numeric, default=0, nullable=False)
+    variation_in_cedis_pms = Column(Numeric, default=0, nullable=False)
+    total_variation_in_cedis = Column(Numeric, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+# Features the model was trained on, in the order extract_features builds them
+FEATURE_NAMES = [
+    "opening_meter_reading_ago",
+    "opening_meter_reading_pms",
+    "closing_meter_reading_ago",
+    "closing_meter_reading_pms",
+    "opening_tank_reading_ago",
+    "opening_tank_reading_pms",
+    "closing_tank_reading_ago",
+    "closing_tank_reading_pms",
+    "pump_test_ago",
+    "pump_test_pms",
+    "received_ago",
+    "received_pms",
+    "sales_ago",
+    "sales_pms",
+    "actuals_ago",
+    "actuals_pms",
+    "variation_ago",
+    "variation_pms",
+    "unit_price_ago",
+    "unit_price_pms",
+    "actuals_in_cedis_ago",
+    "actuals_in_cedis_pms",
+    "collections_cash",
+    "collections_cheque",
+    "credit_ago",
+    "credit_pms",
+    "expenditure",
+]
+
+# The pre-trained ML model is loaded on first use and can be swapped while
+# running; see app/ml/registry.py for the artifact locations
+model_registry = ModelRegistry(FEATURE_NAMES)
+
+# Concurrent validations are scored together in one vectorized predict() call
+ml_batcher = MicroBatcher(model_registry.predict)
+
+# Per-entry time allowed for the ML prediction before falling back to rules (milliseconds)
+ML_VALIDATION_BUDGET_MS = float(os.getenv("ML_VALIDATION_BUDGET_MS", "250"))
+
+# Stops calling the model after repeated timeouts or errors
+ml_breaker = CircuitBreaker("net_sales_model")
+
+# Largest acceptable meter-vs-tank variation per product (litres) when the model is unavailable
+FALLBACK_VARIATION_TOLERANCE = float(os.getenv("FALLBACK_VARIATION_TOLERANCE", "50"))
 
 
 # Define the threshold for acceptable difference between predicted and actual net sales
 # Adjust this value based on your needs
 THRESHOLD = 30.00  # 1 cedi difference
 
+# Candidate model scored on a sample of validated entries, off the request path
+shadow_evaluator = ShadowEvaluator(FEATURE_NAMES, THRESHOLD)
+
 class ValidationError(Exception):
     """Custom exception for validation errors"""
     pass
@@ -119,46 +238,67 @@ class ValidationError(Exception):
 def extract_features(sales_entry):
     """
     Extract features from a SalesEntry object for ML prediction.
-    Modify this to match the features your model was trained on.
+    Columns follow FEATURE_NAMES; the model registry rejects models whose
+    declared feature names differ.
     """
-    features = [
-        sales_entry.opening_meter_reading_ago,
-        sales_entry.opening_meter_reading_pms,
-        sales_entry.closing_meter_reading_ago,
-        sales_entry.closing_meter_reading_pms,
-        sales_entry.opening_tank_reading_ago,
-        sales_entry.opening_tank_reading_pms,
-        sales_entry.closing_tank_reading_ago,
-        sales_entry.closing_tank_reading_pms,
-        sales_entry.pump_test_ago,
-        sales_entry.pump_test_pms,
-        sales_entry.received_ago,
-        sales_entry.received_pms,
-        sales_entry.sales_ago,
-        sales_entry.sales_pms,
-        sales_entry.actuals_ago,
-        sales_entry.actuals_pms,
-        sales_entry.variation_ago,
-        sales_entry.variation_pms,
-        sales_entry.unit_price_ago,
-        sales_entry.unit_price_pms,
-        sales_entry.actuals_in_cedis_ago,
-        sales_entry.actuals_in_cedis_pms,
-        sales_entry.collections_cash,
-        sales_entry.collections_cheque,
-        sales_entry.credit_ago,
-        sales_entry.credit_pms,
-        sales_entry.expenditure
-        # Add any other features your model uses
-    ]
+    features = [getattr(sales_entry, name) for name in FEATURE_NAMES]
     
     return np.array([features])  # Return as 2D array for sklearn models
 
 
+def _validation_snapshot(target):
+    # Every column value validation reads or sets
+    return tuple(getattr(target, attr.key) for attr in inspect(target).mapper.column_attrs)
+
+
+@traced("orm.prevalidate_sales_entry")
+def prevalidate_sales_entry(target):
+    """
+    Calculate totals and validate an entry ahead of its flush.
+
+    Validation waits on the model. An AsyncSession flushes on the event
+    loop, so the async CRUD functions call this on the blocking pool first;
+    the flush then skips the model for the entry unless it changed since.
+    """
+    validate_and_calculate_totals(None, None, target)
+    inspect(target).info["prevalidated"] = _validation_snapshot(target)
+
+
 @event.listens_for(SalesEntry, 'before_insert')
 @event.listens_for(SalesEntry, 'before_update')
+@traced("orm.validate_and_calculate_totals")
 def validate_and_calculate_totals(mapper, connection, target):
 
+    prevalidated = inspect(target).info.pop("prevalidated", None)
+    if prevalidated is not None and prevalidated == _validation_snapshot(target):
+        return
+
+    # Calculate totals first
+    calculate_totals(target)
+
+    check_tank_readings(target)
+
+    # User-provided net sales value
+    user_net_sales = target.net_sales
+    
+    # ML model prediction for net sales
+    try:
+        features = extract_features(target)
+        predicted_net_sales = predict_within_budget(features)
+    except (ValueError, TypeError) as e:
+        # Handle cases where features are invalid for prediction
+        raise ValidationError(f"Could not validate sales entry: {str(e)}")
+
+    if predicted_net_sales is not None:
+        # Compare a candidate model against this decision without waiting for it
+        shadow_evaluator.submit(features, predicted_net_sales, user_net_sales)
+
+    check_net_sales(target, predicted_net_sales)
+
+
+def check_tank_readings(target):
+    """Closing tank readings cannot exceed the opening ones"""
+
    # First, check if we need to fill in opening readings from previous entry
     # If all opening readings are zero, it's likely a new entry that needs data from previous entry
     opening_readings_empty = (
@@ -170,9 +310,6 @@ def validate_and_calculate_totals(mapper, connection, target):
     
     # If opening readings are empty, we should NOT validate the closing vs opening
     # as those will be filled in later
-    
-    # Calculate totals first
-    calculate_totals(target)
 
     # Skip validation for tank readings if opening readings are empty
     if not opening_readings_empty:
@@ -182,34 +319,129 @@ def validate_and_calculate_totals(mapper, connection, target):
         
         if target.opening_tank_reading_pms > 0 and target.closing_tank_reading_pms > target.opening_tank_reading_pms:
             raise ValidationError("Closing tank reading PMS cannot be greater than opening tank reading PMS")
-    
+
+
+def check_net_sales(target, predicted_net_sales):
+    """
+    Accept the user's net sales if it is within THRESHOLD of the prediction.
+    Without a prediction the rule-based checks apply and the entry is flagged.
+    """
     # User-provided net sales value
     user_net_sales = target.net_sales
-    
-    # ML model prediction for net sales
+
+    if predicted_net_sales is None:
+        # The model is slow or failing: apply the deterministic checks now
+        # and flag the entry so it is scored once the model is back
+        validate_with_rules(target)
+        target.needs_rescore = True
+        return
+
+    # Calculate the percentage difference
+    difference_percentage = abs(user_net_sales - predicted_net_sales) 
+
+    # If the difference exceeds the threshold, raise an exception
+    if difference_percentage > THRESHOLD:
+        raise ValidationError(
+                f"Net sales value ({user_net_sales}) differs significantly from prediction "
+                f"({predicted_net_sales}). Please verify your entries."
+            )
+
+    # If validation passes, update net_sales with the user-provided value
+    # You could also choose to use the predicted value or keep the original calculation
+    target.net_sales = user_net_sales
+    target.needs_rescore = False
+
+
+@traced("ml.predict")
+def predict_within_budget(features):
+    """
+    Predict net sales for one entry, or return None if the model cannot answer in time.
+
+    Gives up after ML_VALIDATION_BUDGET_MS, and skips the model entirely while
+    the circuit breaker is open. Timeouts and model errors count towards
+    opening the breaker. The budget is not applied while the model is still
+    being loaded for the first time.
+    """
+    # Reject malformed features before touching the breaker
+    row = np.asarray(features, dtype=float)
+
+    if not ml_breaker.allow_request():
+        ML_VALIDATION_FALLBACKS.labels(reason="breaker_open").inc()
+        return None
+
+    timeout = ML_VALIDATION_BUDGET_MS / 1000.0 if model_registry.loaded else None
+    started = time.perf_counter()
+    future = ml_batcher.submit(row)
     try:
-        features = extract_features(target)
-        predicted_net_sales = ml_model.predict(features)[0]
-        
-        # Calculate the percentage difference
-        
-        difference_percentage = abs(user_net_sales - predicted_net_sales) 
-            
-            # If the difference exceeds the threshold, raise an exception
-        if difference_percentage > THRESHOLD:
-            raise ValidationError(
-                    f"Net sales value ({user_net_sales}) differs significantly from prediction "
-                    f"({predicted_net_sales}). Please verify your entries."
-                )
-                
-        # If validation passes, update net_sales with the user-provided value
-        # You could also choose to use the predicted value or keep the original calculation
-        target.net_sales = user_net_sales
-        
-    except (ValueError, TypeError) as e:
-        # Handle cases where features are invalid for prediction
-        raise ValidationError(f"Could not validate sales entry: {str(e)}")
+        predicted_net_sales = future.result(timeout=timeout)
+    except PredictionTimeout:
+        future.cancel()
+        reason = "timeout"
+    except Exception as e:
+        logger.error(f"ML prediction failed: {str(e)}")
+        reason = "error"
+    else:
+        ml_breaker.record_success()
+        ML_VALIDATION_SECONDS.observe(time.perf_counter() - started)
+        return predicted_net_sales
+
+    ml_breaker.record_failure()
+    ML_VALIDATION_FAILURES.labels(reason=reason).inc()
+    ML_VALIDATION_FALLBACKS.labels(reason=reason).inc()
+    return None
+
+
+def predict_batch(features):
+    """
+    Predict net sales for many entries in one call, or return None if the model is unavailable.
+
+    Used for bulk work that is already off the request path, so no latency
+    budget applies; the circuit breaker is still honoured and updated.
+    """
+    matrix = np.asarray(features, dtype=float)
+
+    if not ml_breaker.allow_request():
+        ML_VALIDATION_FALLBACKS.labels(reason="breaker_open").inc(matrix.shape[0])
+        return None
+
+    try:
+        predictions = np.asarray(model_registry.predict(matrix), dtype=float).reshape(-1)
+    except Exception as e:
+        logger.error(f"ML prediction failed: {str(e)}")
+        ml_breaker.record_failure()
+        ML_VALIDATION_FAILURES.labels(reason="error").inc()
+        ML_VALIDATION_FALLBACKS.labels(reason="error").inc(matrix.shape[0])
+        return None
+
+    ml_breaker.record_success()
+    return predictions
+
+
+def validate_with_rules(target):
+    """
+    Deterministic checks used in place of the ML model.
+    Expects calculate_totals to have run; tank readings are checked by the caller.
+    """
+    if target.opening_meter_reading_ago > 0 and target.closing_meter_reading_ago < target.opening_meter_reading_ago:
+        raise ValidationError("Closing meter reading AGO cannot be less than opening meter reading AGO")
+
+    if target.opening_meter_reading_pms > 0 and target.closing_meter_reading_pms < target.opening_meter_reading_pms:
+        raise ValidationError("Closing meter reading PMS cannot be less than opening meter reading PMS")
+
+    if abs(target.variation_ago) > FALLBACK_VARIATION_TOLERANCE:
+        raise ValidationError(
+            f"AGO variation ({target.variation_ago}) exceeds {FALLBACK_VARIATION_TOLERANCE} litres. "
+            f"Please verify your entries."
+        )
+
+    if abs(target.variation_pms) > FALLBACK_VARIATION_TOLERANCE:
+        raise ValidationError(
+            f"PMS variation ({target.variation_pms}) exceeds {FALLBACK_VARIATION_TOLERANCE} litres. "
+            f"Please verify your entries."
+        )
+
 
+@traced("calculate_totals")
 def calculate_totals(target):
     #Calculate total pump test
     target.total_pump_test = target.pump_test_ago + target.pump_test_pms
@@ -261,4 +493,211 @@ def calculate_totals(target):
     target.total_collections = target.collections_cash + target.collections_cheque
     
     # Calculate net sales (assuming this is total sales minus expenditure)
-    #target.net_sales = target.total_sales_in_cedis - target.expenditure
\ No newline at end of file
+    #target.net_sales = target.total_sales_in_cedis - target.expenditure
+
+
+# Columns of an entry that branch_state carries forward
+BRANCH_STATE_FIELDS = [
+    "closing_meter_reading_ago",
+    "closing_meter_reading_pms",
+    "closing_tank_reading_ago",
+    "closing_tank_reading_pms",
+    "unit_price_ago",
+    "unit_price_pms",
+]
+
+
+def record_branch_state(connection, branch, entry_id, created_at, values):
+    """
+    Make an entry the branch's newest one unless a newer entry is already recorded.
+
+    Args:
+        connection: Connection of the transaction writing the entry
+        branch: The entry's branch
+        entry_id: The entry's id
+        created_at: The entry's created_at (None means the current transaction time)
+        values: Mapping holding the BRANCH_STATE_FIELDS of the entry
+    """
+    table = BranchState.__table__
+    stmt = pg_insert(table).values(
+        branch=branch,
+        entry_id=entry_id,
+        entry_created_at=created_at if created_at is not None else func.now(),
+        **{field: values[field] for field in BRANCH_STATE_FIELDS},
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.branch],
+        set_={
+            "entry_id": stmt.excluded.entry_id,
+            "entry_created_at": stmt.excluded.entry_created_at,
+            "updated_at": func.now(),
+            **{field: stmt.excluded[field] for field in BRANCH_STATE_FIELDS},
+        },
+        where=or_(
+            table.c.entry_created_at.is_(None),
+            table.c.entry_created_at <= stmt.excluded.entry_created_at,
+        ),
+    )
+    connection.execute(stmt)
+
+
+def rebuild_branch_state(connection, branch):
+    """Recompute a branch's state from its entries (after its newest entry changed or went away)"""
+    entries = SalesEntry.__table__
+    latest = connection.execute(
+        select(entries.c.id, entries.c.created_at, *[entries.c[field] for field in BRANCH_STATE_FIELDS])
+        .where(entries.c.branch == branch)
+        .order_by(entries.c.created_at.desc().nulls_last(), entries.c.id.desc())
+        .limit(1)
+    ).first()
+
+    if latest is None:
+        connection.execute(delete(BranchState.__table__).where(BranchState.__table__.c.branch == branch))
+        return
+
+    connection.execute(delete(BranchState.__table__).where(BranchState.__table__.c.branch == branch))
+    record_branch_state(connection, branch, latest.id, latest.created_at, latest._mapping)
+
+
+def _state_entry_id(connection, branch):
+    table = BranchState.__table__
+    return connection.execute(select(table.c.entry_id).where(table.c.branch == branch)).scalar()
+
+
+@event.listens_for(SalesEntry, 'after_insert')
+def track_branch_state_on_insert(mapper, connection, target):
+    # created_at may be left to the server default, which is the transaction time
+    state = inspect(target)
+    record_branch_state(
+        connection, target.branch, target.id, state.dict.get("created_at"),
+        {field: getattr(target, field) for field in BRANCH_STATE_FIELDS},
+    )
+
+
+@event.listens_for(SalesEntry, 'after_update')
+def track_branch_state_on_update(mapper, connection, target):
+    state = inspect(target)
+    old_branches = [branch for branch in state.attrs.branch.history.deleted or () if branch != target.branch]
+    for branch in old_branches:
+        if _state_entry_id(connection, branch) == target.id:
+            rebuild_branch_state(connection, branch)
+
+    if _state_entry_id(connection, target.branch) == target.id:
+        # Its readings or created_at changed; another entry may now be the newest
+        rebuild_branch_state(connection, target.branch)
+    else:
+        record_branch_state(
+            connection, target.branch, target.id, state.dict.get("created_at"),
+            {field: getattr(target, field) for field in BRANCH_STATE_FIELDS},
+        )
+
+
+@event.listens_for(SalesEntry, 'after_delete')
+def track_branch_state_on_delete(mapper, connection, target):
+    # The entry_id foreign key has already been nulled by ON DELETE SET NULL
+    if _state_entry_id(connection, target.branch) in (target.id, None):
+        rebuild_branch_state(connection, target.branch)
+
+
+# SalesEntry columns summed into stock_rollup
+STOCK_ROLLUP_FIELDS = [
+    "received_ago",
+    "received_pms",
+    "total_received",
+    "sales_ago",
+    "sales_pms",
+    "total_sales",
+    "variation_ago",
+    "variation_pms",
+    "total_variation",
+    "sales_in_cedis_ago",
+    "sales_in_cedis_pms",
+    "total_sales_in_cedis",
+    "variation_in_cedis_ago",
+    "variation_in_cedis_pms",
+    "total_variation_in_cedis",
+]
+
+
+def _rollup_amount(value):
+    # The shortest repr of the float, as PostgreSQL prints float8, so that
+    # removing an entry subtracts exactly what adding it (or a rebuild) added
+    return Decimal(repr(float(value or 0.0)))
+
+
+def add_stock_rollup_delta(deltas, branch, entry_date, values, sign=1):
+    """
+    Add one entry's contribution (sign=-1 to remove it) to `deltas`, keyed by (branch, year, month).
+
+    Args:
+        deltas: dict collecting the changes of one flush or import
+        branch: The entry's branch
+        entry_date: The entry's date
+        values: Mapping holding the STOCK_ROLLUP_FIELDS of the entry
+        sign: 1 to add the entry, -1 to remove it
+    """
+    key = (branch, entry_date.year, entry_date.month)
+    delta = deltas.setdefault(key, dict.fromkeys(["entries", *STOCK_ROLLUP_FIELDS], 0))
+    delta["entries"] += sign
+    for field in STOCK_ROLLUP_FIELDS:
+        delta[field] += sign * _rollup_amount(values[field])
+
+
+def apply_stock_rollup(connection, deltas):
+    """
+    Add collected deltas to stock_rollup in the caller's transaction.
+
+    The additive upsert lets concurrent transactions update the same month
+    without losing each other's changes. Months whose entries all went away
+    keep a row with entries = 0, which readers skip.
+    """
+    table = StockRollup.__table__
+    for (branch, year, month), delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        stmt = pg_insert(table).values(branch=branch, year=year, month=month, **delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.branch, table.c.year, table.c.month],
+            set_={
+                "updated_at": func.now(),
+                **{field: table.c[field] + stmt.excluded[field] for field in delta},
+            },
+        )
+        connection.execute(stmt)
+
+
+def _flushed_rollup_values(target):
+    # Values as last written: history still holds the replaced value of changed attributes
+    state = inspect(target)
+    values = {}
+    for field in ("branch", "date", *STOCK_ROLLUP_FIELDS):
+        history = state.attrs[field].history
+        values[field] = history.deleted[0] if history.deleted else getattr(target, field)
+    return values
+
+
+@event.listens_for(SalesEntry, 'after_insert')
+def track_stock_rollup_on_insert(mapper, connection, target):
+    deltas = {}
+    add_stock_rollup_delta(deltas, target.branch, target.date, {field: getattr(target, field) for field in STOCK_ROLLUP_FIELDS})
+    apply_stock_rollup(connection, deltas)
+
+
+@event.listens_for(SalesEntry, 'after_update')
+def track_stock_rollup_on_update(mapper, connection, target):
+    old = _flushed_rollup_values(target)
+    new = {field: getattr(target, field) for field in old}
+    if old == new:
+        return
+    deltas = {}
+    add_stock_rollup_delta(deltas, old["branch"], old["date"], old, sign=-1)
+    add_stock_rollup_delta(deltas, new["branch"], new["date"], new)
+    apply_stock_rollup(connection, deltas)
+
+
+@event.listens_for(SalesEntry, 'after_delete')
+def track_stock_rollup_on_delete(mapper, connection, target):
+    old = _flushed_rollup_values(target)
+    deltas = {}
+    add_stock_rollup_delta(deltas, old["branch"], old["date"], old, sign=-1)
+    apply_stock_rollup(connection, deltas)
@@ -0,0 +1,357 @@
+"""
+Memory of a worker process: gauges sampled in the background, and
+tracemalloc snapshots to find which code allocates what.
+
+tracemalloc only sees allocations made while it traces, and tracing
+slows allocation down, so it is off by default. Start it per worker
+through /api/memory/tracing, or in every worker from interpreter start
+(which includes the model and the imports) with PYTHONTRACEMALLOC=<frames>.
+"""
+import os
+import sys
+import json
+import time
+import ctypes
+import logging
+import resource
+import threading
+import tracemalloc
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import uuid4
+
+from app.monitoring.metrics import (
+    WORKER_RESIDENT_MEMORY_BYTES,
+    WORKER_PEAK_RESIDENT_MEMORY_BYTES,
+    WORKER_HEAP_BYTES,
+    WORKER_PYTHON_ALLOCATED_BLOCKS,
+    WORKER_TRACEMALLOC_BYTES,
+)
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds between two samples of the memory gauges
+MEMORY_SAMPLE_INTERVAL = float(os.getenv("MEMORY_SAMPLE_INTERVAL", "15"))
+
+# Where tracemalloc snapshots are written; shared by the workers, so any of
+# them can compare two snapshots of the same worker
+MEMORY_SNAPSHOT_DIR = os.getenv("MEMORY_SNAPSHOT_DIR", os.path.join(os.getcwd(), "memory_snapshots"))
+
+# Snapshots kept on disk (by all workers); the oldest are deleted past this
+MEMORY_MAX_SNAPSHOTS = int(os.getenv("MEMORY_MAX_SNAPSHOTS", "50"))
+
+# Seconds between the snapshots each tracing worker takes on its own; 0 for none
+MEMORY_SNAPSHOT_INTERVAL = float(os.getenv("MEMORY_SNAPSHOT_INTERVAL", "0"))
+
+# Frames stored per allocation when tracing is started without a count
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+
+# How statistics can be grouped, as tracemalloc names them
+GROUP_BY = ("lineno", "filename", "traceback")
+
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_size_t) for name in (
+        "arena", "ordblks", "smblks", "hblks", "hblkhd", "usmblks", "fsmblks", "uordblks", "fordblks", "keepcost",
+    )]
+
+
+def _load_mallinfo2():
+    try:
+        mallinfo2 = ctypes.CDLL("libc.so.6").mallinfo2
+    except (OSError, AttributeError):
+        # Not glibc, or older than 2.33
+        return None
+    mallinfo2.restype = _MallInfo2
+    return mallinfo2
+
+
+_mallinfo2 = _load_mallinfo2()
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Current resident set size of this process (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def peak_resident_memory_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def heap_bytes() -> Optional[Tuple[int, int]]:
+    """Bytes of the malloc heap in use and free, if glibc can tell"""
+    if _mallinfo2 is None:
+        return None
+    info = _mallinfo2()
+    return info.uordblks + info.hblkhd, info.fordblks
+
+
+def tracing_status() -> dict:
+    """What this worker is using and whether tracemalloc traces it"""
+    current, peak = tracemalloc.get_traced_memory()
+    heap = heap_bytes()
+    return {
+        "pid": os.getpid(),
+        "resident_bytes": resident_memory_bytes(),
+        "peak_resident_bytes": peak_resident_memory_bytes(),
+        "heap_in_use_bytes": heap[0] if heap else None,
+        "heap_free_bytes": heap[1] if heap else None,
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else 0,
+        "traced_bytes": current,
+        "peak_traced_bytes": peak,
+        "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+    }
+
+
+def start_tracing(frames: int = TRACEMALLOC_FRAMES) -> None:
+    """Start tracemalloc in this worker; allocations made before are not seen"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        logger.info(f"Started tracemalloc with {frames} frames in worker {os.getpid()}")
+
+
+def stop_tracing() -> None:
+    """Stop tracemalloc in this worker and free its traces"""
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        logger.info(f"Stopped tracemalloc in worker {os.getpid()}")
+
+
+def _site(stat, group_by: str) -> dict:
+    frames = [f"{frame.filename}:{frame.lineno}" for frame in reversed(stat.traceback)]
+    site = {"site": frames[0] if frames else "<unknown>", "size_bytes": stat.size, "count": stat.count}
+    if hasattr(stat, "size_diff"):
+        site["size_diff_bytes"] = stat.size_diff
+        site["count_diff"] = stat.count_diff
+    if group_by == "traceback":
+        site["traceback"] = frames
+    return site
+
+
+class SnapshotStore:
+    """tracemalloc snapshots on disk: the snapshot and a JSON description each"""
+
+    def __init__(self, directory: str = MEMORY_SNAPSHOT_DIR, max_snapshots: int = MEMORY_MAX_SNAPSHOTS):
+        self.directory = directory
+        self.max_snapshots = max(max_snapshots, 2)
+
+    def _path(self, snapshot_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, snapshot_id + suffix)
+
+    def take(self, label: Optional[str] = None) -> dict:
+        """
+        Snapshot what this worker's traced memory was allocated by.
+
+        Raises:
+            ValueError: If tracemalloc is not tracing in this worker
+        """
+        if not tracemalloc.is_tracing():
+            raise ValueError(
+                f"tracemalloc is not tracing in worker {os.getpid()}; "
+                "start it with POST /api/memory/tracing or PYTHONTRACEMALLOC"
+            )
+        started = time.perf_counter()
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        snapshot_id = uuid4().hex
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot.dump(self._path(snapshot_id, ".snapshot"))
+        current, peak = tracemalloc.get_traced_memory()
+        info = {
+            "id": snapshot_id,
+            "label": label,
+            "pid": os.getpid(),
+            "created_at": datetime.now().isoformat(),
+            "frames": snapshot.traceback_limit,
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+            "resident_bytes": resident_memory_bytes(),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        with open(self._path(snapshot_id, ".json"), "w") as f:
+            json.dump(info, f)
+        self._prune()
+        return info
+
+    def _prune(self) -> None:
+        snapshots = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in snapshots[:-self.max_snapshots]:
+            snapshot_id = entry.name[:-len(".json")]
+            for suffix in (".json", ".snapshot"):
+                try:
+                    os.remove(self._path(snapshot_id, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[dict]:
+        """Descriptions of the stored snapshots, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        snapshots = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    with open(entry.path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(snapshots, key=lambda s: s.get("created_at", ""), reverse=True)
+
+    def info(self, snapshot_id: str) -> dict:
+        """
+        Raises:
+            KeyError: If no snapshot with this id exists
+        """
+        # Ids are generated hex strings; anything else is not a file of ours
+        if len(snapshot_id) != 32 or not all(c in "0123456789abcdef" for c in snapshot_id):
+            raise KeyError(snapshot_id)
+        try:
+            with open(self._path(snapshot_id, ".json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(snapshot_id)
+
+    def _load(self, snapshot_id: str) -> tracemalloc.Snapshot:
+        self.info(snapshot_id)
+        try:
+            return tracemalloc.Snapshot.load(self._path(snapshot_id, ".snapshot"))
+        except FileNotFoundError:
+            raise KeyError(snapshot_id)
+
+    def top(self, snapshot_id: str, group_by: str = "lineno", limit: int = 25) -> dict:
+        """
+        The snapshot's largest allocation sites.
+
+        Raises:
+            KeyError: If no snapshot with this id exists
+            ValueError: If `group_by` is not one of GROUP_BY
+        """
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+        stats = self._load(snapshot_id).statistics(group_by)
+        return {
+            **self.info(snapshot_id),
+            "group_by": group_by,
+            "total_bytes": sum(stat.size for stat in stats),
+            "sites": [_site(stat, group_by) for stat in stats[:limit]],
+        }
+
+    def diff(self, snapshot_id: str, base_id: str, group_by: str = "lineno", limit: int = 25) -> dict:
+        """
+        The allocation sites that grew (or shrank) most from `base_id` to
+        `snapshot_id`; both must come from the same worker.
+
+        Raises:
+            KeyError: If either snapshot does not exist
+            ValueError: If `group_by` is not one of GROUP_BY, or the
+                snapshots come from different workers
+        """
+        if group_by not in GROUP_BY:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+        info, base_info = self.info(snapshot_id), self.info(base_id)
+        if info["pid"] != base_info["pid"]:
+            raise ValueError(
+                f"Snapshots come from different workers ({base_info['pid']} and {info['pid']}); "
+                "take both in the same worker"
+            )
+        stats = self._load(snapshot_id).compare_to(self._load(base_id), group_by)
+        return {
+            "id": snapshot_id,
+            "base_id": base_id,
+            "pid": info["pid"],
+            "group_by": group_by,
+            "size_diff_bytes": sum(stat.size_diff for stat in stats),
+            "sites": [_site(stat, group_by) for stat in stats[:limit]],
+        }
+
+
+snapshot_store = SnapshotStore()
+
+
+class MemorySampler:
+    """
+    Sets the worker memory gauges every `interval` seconds from a daemon
+    thread, so they keep moving while the event loop is busy or stuck.
+    While tracemalloc traces, it also takes a snapshot every
+    `snapshot_interval` seconds (if set): a series per worker to diff when
+    memory grows under sustained load.
+    """
+
+    def __init__(
+        self,
+        interval: float = MEMORY_SAMPLE_INTERVAL,
+        snapshot_interval: float = MEMORY_SNAPSHOT_INTERVAL,
+        store: Optional[SnapshotStore] = None,
+    ):
+        self.interval = max(interval, 1.0)
+        self.snapshot_interval = snapshot_interval
+        self.store = store or snapshot_store
+        self._stopped = threading.Event()
+        self._worker = None
+
+    def sample(self) -> None:
+        rss = resident_memory_bytes()
+        if rss is not None:
+            WORKER_RESIDENT_MEMORY_BYTES.set(rss)
+        WORKER_PEAK_RESIDENT_MEMORY_BYTES.set(peak_resident_memory_bytes())
+        heap = heap_bytes()
+        if heap is not None:
+            WORKER_HEAP_BYTES.labels(state="in_use").set(heap[0])
+            WORKER_HEAP_BYTES.labels(state="free").set(heap[1])
+        WORKER_PYTHON_ALLOCATED_BLOCKS.set(sys.getallocatedblocks())
+        current, peak = tracemalloc.get_traced_memory()
+        WORKER_TRACEMALLOC_BYTES.labels(kind="current").set(current)
+        WORKER_TRACEMALLOC_BYTES.labels(kind="peak").set(peak)
+
+    def start(self) -> None:
+        # Called from the lifespan handler, so each worker samples itself
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stopped.clear()
+        self._worker = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run(self):
+        last_snapshot = time.monotonic()
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"Memory sampling failed: {str(e)}")
+            if (
+                self.snapshot_interval > 0
+                and tracemalloc.is_tracing()
+                and time.monotonic() - last_snapshot >= self.snapshot_interval
+            ):
+                last_snapshot = time.monotonic()
+                try:
+                    self.store.take("periodic")
+                except Exception as e:
+                    logger.warning(f"Periodic memory snapshot failed: {str(e)}")
+            if self._stopped.wait(self.interval):
+                return
+
+
+memory_sampler = MemorySampler()
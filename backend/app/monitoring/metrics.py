@@ -0,0 +1,263 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# With several worker processes (PROMETHEUS_MULTIPROC_DIR set), each gauge's
+# multiprocess_mode says how the workers' values are combined when scraped
+
+# Blocking work (ORM queries, ML validation) offloaded from the event loop
+BLOCKING_POOL_WORKERS = Gauge(
+    "blocking_pool_workers",
+    "Configured number of worker threads in the blocking-work pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+BLOCKING_POOL_QUEUE_DEPTH = Gauge(
+    "blocking_pool_queue_depth",
+    "Calls submitted to the blocking-work pool that are waiting for a thread",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+BLOCKING_POOL_ACTIVE = Gauge(
+    "blocking_pool_active",
+    "Calls currently executing in the blocking-work pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+BLOCKING_POOL_WAIT_SECONDS = Histogram(
+    "blocking_pool_wait_seconds",
+    "Time a call waited in the queue before a pool thread picked it up",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+BLOCKING_POOL_CALLS = Counter(
+    "blocking_pool_calls_total",
+    "Calls completed by the blocking-work pool",
+    ["pool", "outcome"],
+)
+
+# ML validation circuit breaker and rule-based fallback
+ML_BREAKER_STATE = Gauge(
+    "ml_validation_breaker_state",
+    "Circuit breaker state for ML validation (0 closed, 1 half-open, 2 open)",
+    ["breaker"],
+    multiprocess_mode="liveall",
+)
+ML_BREAKER_TRANSITIONS = Counter(
+    "ml_validation_breaker_transitions_total",
+    "Circuit breaker state changes",
+    ["breaker", "state"],
+)
+ML_VALIDATION_FAILURES = Counter(
+    "ml_validation_failures_total",
+    "ML predictions that timed out or raised",
+    ["reason"],
+)
+ML_VALIDATION_FALLBACKS = Counter(
+    "ml_validation_fallbacks_total",
+    "Entries validated with the rule-based checks instead of the model",
+    ["reason"],
+)
+ML_VALIDATION_SECONDS = Histogram(
+    "ml_validation_seconds",
+    "Time spent waiting for an ML net-sales prediction",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+# Shadow model scored next to the primary model, off the request path
+ML_SHADOW_EVENTS = Counter(
+    "ml_shadow_events_total",
+    "Validated entries offered to the shadow model, by what happened to them",
+    ["outcome"],
+)
+ML_SHADOW_QUEUE_DEPTH = Gauge(
+    "ml_shadow_queue_depth",
+    "Entries waiting to be scored by the shadow model",
+    multiprocess_mode="livesum",
+)
+ML_SHADOW_DELTA = Histogram(
+    "ml_shadow_prediction_delta",
+    "Absolute difference between shadow and primary net-sales predictions",
+    buckets=(0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 100.0, 500.0),
+)
+ML_SHADOW_SECONDS = Histogram(
+    "ml_shadow_predict_seconds",
+    "Time taken by one batched shadow-model predict() call",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+ML_SHADOW_DECISIONS = Counter(
+    "ml_shadow_decisions_total",
+    "Accept/reject decisions of the primary and shadow models under THRESHOLD",
+    ["primary", "shadow"],
+)
+
+# Read-through result cache of summary and list endpoints
+RESULT_CACHE_REQUESTS = Counter(
+    "result_cache_requests_total",
+    "Result cache lookups by endpoint and whether they were served from the cache",
+    ["namespace", "outcome"],
+)
+RESULT_CACHE_EVICTIONS = Counter(
+    "result_cache_evictions_total",
+    "Cached results dropped by the in-process backend, by reason",
+    ["backend", "reason"],
+)
+RESULT_CACHE_INVALIDATIONS = Counter(
+    "result_cache_invalidations_total",
+    "Cache tags invalidated by committed writes, by kind of tag",
+    ["tag"],
+)
+RESULT_CACHE_ERRORS = Counter(
+    "result_cache_errors_total",
+    "Result cache backend failures (requests fall through to the database)",
+    ["backend", "operation"],
+)
+
+# Coalescing of identical concurrent reads
+SINGLEFLIGHT_REQUESTS = Counter(
+    "singleflight_requests_total",
+    "Calls that started a computation (leader) or joined a running one (follower)",
+    ["group", "role"],
+)
+SINGLEFLIGHT_IN_FLIGHT = Gauge(
+    "singleflight_in_flight",
+    "Distinct computations currently running",
+    ["group"],
+    multiprocess_mode="livesum",
+)
+
+# Routing of read-only endpoints between the primary and the read replica
+REPLICA_READS = Counter(
+    "replica_reads_total",
+    "Reads of replica-eligible endpoints, by the database that served them and why",
+    ["target", "reason"],
+)
+REPLICA_LAG_SECONDS = Gauge(
+    "replica_lag_seconds",
+    "Replay lag of the read replica at the last check",
+    multiprocess_mode="livemax",
+)
+
+# HTTP requests, labelled by route template rather than raw path so that
+# path parameters (branches, ids) do not multiply the series
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests completed",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_DURATION_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+HTTP_REQUEST_SIZE_BYTES = Histogram(
+    "http_request_size_bytes",
+    "Request body size, from Content-Length",
+    ["method", "route"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+HTTP_RESPONSE_SIZE_BYTES = Histogram(
+    "http_response_size_bytes",
+    "Response body size as sent",
+    ["method", "route"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+
+# SQL statements, by normalized statement (see app/monitoring/sql.py)
+SQL_STATEMENT_SECONDS = Histogram(
+    "sql_statement_duration_seconds",
+    "Time from sending a statement to the driver returning its result",
+    ["fingerprint", "operation", "table"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+SQL_STATEMENT_ROWS = Histogram(
+    "sql_statement_rows",
+    "Rows returned or affected by a statement, where the driver reports it",
+    ["fingerprint", "operation", "table"],
+    buckets=(0, 1, 10, 100, 1_000, 10_000, 100_000),
+)
+SQL_STATEMENT_INFO = Gauge(
+    "sql_statement_info",
+    "Normalized text of each statement fingerprint (always 1)",
+    ["fingerprint", "statement"],
+    multiprocess_mode="livemax",
+)
+SQL_STATEMENTS_PER_REQUEST = Histogram(
+    "sql_statements_per_request",
+    "Statements executed while handling one HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+SQL_REPEATED_STATEMENTS = Counter(
+    "sql_repeated_statements_total",
+    "Requests that sent more statements against one table than SQL_REPEATED_STATEMENT_THRESHOLD (likely N+1)",
+    ["route", "table"],
+)
+
+# Connection pools of the SQLAlchemy engines
+SQL_POOL_CHECKOUT_SECONDS = Histogram(
+    "sql_pool_checkout_seconds",
+    "Time to get a connection from the pool, including waiting for one to be returned or opened",
+    ["pool"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+SQL_POOL_CHECKED_OUT = Gauge(
+    "sql_pool_checked_out",
+    "Connections currently checked out of the pool",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+SQL_POOL_CAPACITY = Gauge(
+    "sql_pool_capacity",
+    "Most connections the pool will hand out (pool size plus overflow)",
+    ["pool"],
+    multiprocess_mode="livesum",
+)
+
+# Request tracing (see app/monitoring/tracing.py)
+TRACES = Counter(
+    "traces_total",
+    "Finished request traces, by tail-sampling decision",
+    ["decision"],
+)
+TRACE_EXPORTS = Counter(
+    "trace_exports_total",
+    "Traces handed to the exporter, by outcome (dropped when the export queue is full)",
+    ["exporter", "outcome"],
+)
+
+# Memory of each worker, sampled by a background thread (see
+# app/monitoring/memory.py); process_* metrics are not exported when
+# several workers share PROMETHEUS_MULTIPROC_DIR
+WORKER_RESIDENT_MEMORY_BYTES = Gauge(
+    "worker_resident_memory_bytes",
+    "Resident set size of the worker process",
+    multiprocess_mode="liveall",
+)
+WORKER_PEAK_RESIDENT_MEMORY_BYTES = Gauge(
+    "worker_peak_resident_memory_bytes",
+    "Largest resident set size the worker process has had",
+    multiprocess_mode="liveall",
+)
+WORKER_HEAP_BYTES = Gauge(
+    "worker_heap_bytes",
+    "malloc heap of the worker process (glibc only), in use or free but not returned to the OS",
+    ["state"],
+    multiprocess_mode="liveall",
+)
+WORKER_PYTHON_ALLOCATED_BLOCKS = Gauge(
+    "worker_python_allocated_blocks",
+    "Memory blocks currently allocated by the Python allocator",
+    multiprocess_mode="liveall",
+)
+WORKER_TRACEMALLOC_BYTES = Gauge(
+    "worker_tracemalloc_bytes",
+    "Memory traced by tracemalloc (current and peak); 0 when not tracing",
+    ["kind"],
+    multiprocess_mode="liveall",
+)
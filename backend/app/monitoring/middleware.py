@@ -0,0 +1,90 @@
+import time
+
+from app.monitoring.metrics import (
+    HTTP_REQUESTS,
+    HTTP_REQUEST_DURATION_SECONDS,
+    HTTP_REQUESTS_IN_PROGRESS,
+    HTTP_REQUEST_SIZE_BYTES,
+    HTTP_RESPONSE_SIZE_BYTES,
+)
+
+
+# Label for requests that matched no route (404s, scanners), so unknown
+# paths never become series of their own
+UNMATCHED_ROUTE = "unmatched"
+
+# Methods kept as label values; anything else is counted as "other"
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+def route_template(scope) -> str:
+    """The path template of the route that handled the request, e.g. /api/entries/{branch}"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class PrometheusMiddleware:
+    """
+    Records latency, status, size and concurrency of every HTTP request.
+
+    A plain ASGI middleware rather than a BaseHTTPMiddleware: it adds no
+    task or body buffering per request, and streamed responses are timed
+    until their last chunk is sent. The route is known only once routing
+    has run, so it is read from the scope when the request completes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        # labels() takes a lock and builds a key on every call; the label
+        # sets are few, so their children are looked up once
+        self._children = {}
+        self._in_progress = {}
+
+    def _route_children(self, method: str, route: str, status: int):
+        key = (method, route, status)
+        children = self._children.get(key)
+        if children is None:
+            children = self._children[key] = (
+                HTTP_REQUEST_DURATION_SECONDS.labels(method=method, route=route),
+                HTTP_REQUESTS.labels(method=method, route=route, status=str(status)),
+                HTTP_RESPONSE_SIZE_BYTES.labels(method=method, route=route),
+                HTTP_REQUEST_SIZE_BYTES.labels(method=method, route=route),
+            )
+        return children
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in HTTP_METHODS else "other"
+        started = time.perf_counter()
+        status = 500
+        response_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, response_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = self._in_progress.get(method)
+        if in_progress is None:
+            in_progress = self._in_progress[method] = HTTP_REQUESTS_IN_PROGRESS.labels(method=method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            duration, requests, response_sizes, request_sizes = self._route_children(
+                method, route_template(scope), status
+            )
+            duration.observe(time.perf_counter() - started)
+            requests.inc()
+            response_sizes.observe(response_size)
+            for name, value in scope["headers"]:
+                if name == b"content-length" and value.isdigit():
+                    request_sizes.observe(int(value))
+                    break
@@ -0,0 +1,274 @@
+import io
+import os
+import re
+import sys
+import json
+import time
+import types
+import pstats
+import asyncio
+import cProfile
+import logging
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from functools import partial
+from typing import Awaitable, Callable, Coroutine, List, Optional
+from urllib.parse import parse_qs
+from uuid import uuid4
+
+from app.monitoring.middleware import route_template
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where profiles of individual requests are written; shared by the workers
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.getcwd(), "profiles"))
+
+# Profiles kept on disk; the oldest are deleted past this
+PROFILE_MAX_ARTIFACTS = int(os.getenv("PROFILE_MAX_ARTIFACTS", "50"))
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+# Before 3.12 cProfile sees only the thread it was enabled on. From 3.12
+# it sees every thread, and only one profiler may run in the process.
+PER_THREAD_PROFILER = sys.version_info < (3, 12)
+
+
+class RequestProfile:
+    """
+    cProfile data of one request.
+
+    Where cProfile is per thread, profiling the event loop thread for the
+    whole request would also capture every other request on the loop. So
+    the request's coroutine (and tasks it starts through `profiled`) is
+    profiled only while one of its steps runs, each blocking call it makes
+    on the pool is profiled on its thread, and the parts are merged when
+    saved. Where cProfile covers the process, one profiler runs from start
+    to stop and includes whatever else the worker did meanwhile.
+    """
+
+    def __init__(self, profile_id: str):
+        self.profile_id = profile_id
+        self.loop_profiler = cProfile.Profile()
+        self._thread_profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if not PER_THREAD_PROFILER:
+            self.loop_profiler.enable()
+
+    def stop(self) -> None:
+        if not PER_THREAD_PROFILER:
+            self.loop_profiler.disable()
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run a blocking call of the request (on a pool thread) under the profile"""
+        if not PER_THREAD_PROFILER:
+            return fn(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(fn, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._thread_profilers.append(profiler)
+
+    def stats(self) -> pstats.Stats:
+        with self._lock:
+            profilers = [self.loop_profiler, *self._thread_profilers]
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        return stats
+
+
+# Profile of the request being handled, if it asked for one
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+# One profiled request per worker at a time; see PER_THREAD_PROFILER
+_profiling = threading.Lock()
+
+
+@types.coroutine
+def _step_profiled(coro, profiler: cProfile.Profile):
+    # Drive the coroutine by hand, with the profiler on only while it runs
+    send_value, error = None, None
+    while True:
+        profiler.enable()
+        try:
+            if error is not None:
+                yielded = coro.throw(error)
+            else:
+                yielded = coro.send(send_value)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            profiler.disable()
+        try:
+            send_value, error = (yield yielded), None
+        except BaseException as e:
+            send_value, error = None, e
+
+
+async def _profiled(coro, profiler: cProfile.Profile):
+    return await _step_profiled(coro, profiler)
+
+
+def profiled(coro: Coroutine) -> Coroutine:
+    """`coro`, profiled as part of the current request's profile if there is one"""
+    profile = current_profile.get()
+    if profile is None or not PER_THREAD_PROFILER:
+        return coro
+    return _profiled(coro, profile.loop_profiler)
+
+
+class ProfileStore:
+    """Request profiles on disk: a pstats file and a JSON description each"""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_artifacts: int = PROFILE_MAX_ARTIFACTS):
+        self.directory = directory
+        self.max_artifacts = max(max_artifacts, 1)
+
+    def path(self, profile_id: str, suffix: str = ".pstats") -> str:
+        """
+        Raises:
+            KeyError: If no profile with this id exists
+        """
+        if not _PROFILE_ID.match(profile_id):
+            raise KeyError(profile_id)
+        path = os.path.join(self.directory, profile_id + suffix)
+        if not os.path.isfile(path):
+            raise KeyError(profile_id)
+        return path
+
+    def save(self, profile: RequestProfile, info: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        stats = profile.stats()
+        stats.dump_stats(os.path.join(self.directory, profile.profile_id + ".pstats"))
+        info = {**info, "id": profile.profile_id, "total_seconds": round(stats.total_tt, 6)}
+        with open(os.path.join(self.directory, profile.profile_id + ".json"), "w") as f:
+            json.dump(info, f)
+        self._prune()
+
+    def _prune(self) -> None:
+        profiles = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in profiles[:-self.max_artifacts]:
+            profile_id = entry.name[:-len(".json")]
+            for suffix in (".json", ".pstats"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> List[dict]:
+        """Descriptions of the stored profiles, newest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    with open(entry.path) as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return sorted(profiles, key=lambda p: p.get("created_at", ""), reverse=True)
+
+    def report(self, profile_id: str, sort: str = "cumulative", limit: int = 50) -> str:
+        """
+        The profile's top `limit` functions as pstats prints them.
+
+        Raises:
+            KeyError: If no profile with this id exists
+            ValueError: If `sort` is not a pstats sort key
+        """
+        out = io.StringIO()
+        stats = pstats.Stats(self.path(profile_id), stream=out)
+        if sort not in stats.sort_arg_dict_default:
+            raise ValueError(f"Unknown sort key {sort}; use one of {', '.join(sorted(stats.sort_arg_dict_default))}")
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+profile_store = ProfileStore()
+
+
+def _profile_token(scope) -> Optional[str]:
+    """The bearer token of a request that asked to be profiled"""
+    flag, token = None, None
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            flag = value
+        elif name == b"authorization" and value[:7].lower() == b"bearer ":
+            token = value[7:].decode("latin-1")
+    if flag is None and b"profile=" in scope["query_string"]:
+        flag = parse_qs(scope["query_string"]).get(b"profile", [b""])[-1]
+    if token is None or flag in (None, b"", b"0", b"false"):
+        return None
+    return token
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request that carries `X-Profile: 1` (or `?profile=1`) when
+    its bearer token belongs to an admin; anyone else's flag is ignored.
+    The profile's id is returned in an X-Profile-Id header and the profile
+    can be fetched from /api/profiles. Requests without the flag only pay
+    for a scan of their headers.
+    """
+
+    def __init__(self, app, authorize: Callable[[str], Awaitable[bool]], store: ProfileStore = profile_store):
+        self.app = app
+        self.authorize = authorize
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _profile_token(scope)
+        if token is None or not await self.authorize(token):
+            await self.app(scope, receive, send)
+            return
+        if not _profiling.acquire(blocking=False):
+            logger.warning(f"Not profiling {scope['method']} {scope['path']}: another request is being profiled")
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(uuid4().hex)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.profile_id.encode())]}
+            await send(message)
+
+        started = time.perf_counter()
+        context_token = current_profile.set(profile)
+        try:
+            profile.start()
+            await profiled(self.app(scope, receive, send_wrapper))
+        finally:
+            profile.stop()
+            current_profile.reset(context_token)
+            _profiling.release()
+            info = {
+                "method": scope["method"],
+                "route": route_template(scope),
+                "path": scope["path"],
+                "status": status,
+                "wall_seconds": round(time.perf_counter() - started, 6),
+                "created_at": datetime.now().isoformat(),
+            }
+            try:
+                await asyncio.to_thread(partial(self.store.save, profile, info))
+                logger.info(f"Profiled {info['method']} {info['path']} as {profile.profile_id}")
+            except Exception as e:
+                logger.error(f"Could not save profile {profile.profile_id}: {str(e)}")
@@ -0,0 +1,227 @@
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from app.monitoring.metrics import (
+    SQL_STATEMENT_SECONDS,
+    SQL_STATEMENT_ROWS,
+    SQL_STATEMENT_INFO,
+    SQL_STATEMENTS_PER_REQUEST,
+    SQL_REPEATED_STATEMENTS,
+    SQL_POOL_CHECKOUT_SECONDS,
+    SQL_POOL_CHECKED_OUT,
+    SQL_POOL_CAPACITY,
+)
+from app.monitoring.middleware import route_template
+from app.monitoring.tracing import span
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Statements one request may send against the same table before it is
+# logged as a likely N+1 (a query per row of an earlier result)
+SQL_REPEATED_STATEMENT_THRESHOLD = int(os.getenv("SQL_REPEATED_STATEMENT_THRESHOLD", "10"))
+
+# Distinct fingerprints given their own series; later ones share "other"
+SQL_MAX_FINGERPRINTS = int(os.getenv("SQL_MAX_FINGERPRINTS", "500"))
+
+# Longest statement text exported on sql_statement_info
+SQL_INFO_STATEMENT_LENGTH = 300
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\$\d+|%\(\w+\)s|%s|(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*")
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+"?(\w+)"?(?:\."?(\w+)"?)?', re.IGNORECASE)
+
+
+def normalize(statement: str) -> str:
+    """
+    The statement with its literals and bind parameters replaced by ?, so
+    executions that differ only in values (or IN-list lengths) compare equal
+    """
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _LITERALS.sub("?", statement)
+    return _LISTS.sub("(...)", statement)
+
+
+def describe(statement: str) -> Tuple[str, str, str]:
+    """Fingerprint, operation and main table of a statement"""
+    normalized = normalize(statement)
+    fingerprint = hashlib.sha1(normalized.encode()).hexdigest()[:12]
+    operation = normalized.split(" ", 1)[0].upper() or "OTHER"
+    match = _TABLE.search(normalized)
+    table = (match.group(2) or match.group(1)) if match else "none"
+    return fingerprint, operation, table.lower()
+
+
+class StatementLabels:
+    """
+    Caches the labels of each statement string.
+
+    SQLAlchemy reuses the compiled string of a cached statement, so after
+    the first execution a statement costs one dict lookup, not a normalize.
+    """
+
+    def __init__(self, max_fingerprints: int = SQL_MAX_FINGERPRINTS):
+        self.max_fingerprints = max_fingerprints
+        self._by_statement = {}
+        self._fingerprints = set()
+
+    def get(self, statement: str) -> Tuple[str, str, str]:
+        labels = self._by_statement.get(statement)
+        if labels is not None:
+            return labels
+
+        fingerprint, operation, table = describe(statement)
+        if fingerprint not in self._fingerprints:
+            if len(self._fingerprints) >= self.max_fingerprints:
+                fingerprint = "other"
+            else:
+                self._fingerprints.add(fingerprint)
+                SQL_STATEMENT_INFO.labels(
+                    fingerprint=fingerprint,
+                    statement=normalize(statement)[:SQL_INFO_STATEMENT_LENGTH],
+                ).set(1)
+        labels = (fingerprint, operation, table)
+        # Statements with inlined values never repeat; stop remembering them
+        if len(self._by_statement) < self.max_fingerprints * 4:
+            self._by_statement[statement] = labels
+        return labels
+
+
+statement_labels = StatementLabels()
+
+
+class RequestStatements:
+    """Statements sent while handling one request, counted per table"""
+
+    def __init__(self):
+        self.total = 0
+        self.tables = Counter()
+
+    def record(self, table: str) -> None:
+        self.total += 1
+        self.tables[table] += 1
+
+
+# Statements of the request being handled; pool threads and coalesced
+# computations inherit it with the rest of the context
+current_statements: ContextVar[Optional[RequestStatements]] = ContextVar("current_statements", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._statement_span = span("db.query", **{"db.system": "postgresql"})
+        context._statement_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_statement_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+
+    fingerprint, operation, table = statement_labels.get(statement)
+    SQL_STATEMENT_SECONDS.labels(fingerprint=fingerprint, operation=operation, table=table).observe(elapsed)
+    # -1 when the driver cannot tell, e.g. for server-side cursors
+    rows = getattr(cursor, "rowcount", -1)
+    if rows is not None and rows >= 0:
+        SQL_STATEMENT_ROWS.labels(fingerprint=fingerprint, operation=operation, table=table).observe(rows)
+
+    statements = current_statements.get()
+    if statements is not None:
+        statements.record(table)
+
+    statement_span = context._statement_span
+    statement_span.set_attribute("db.operation", operation)
+    statement_span.set_attribute("db.sql.table", table)
+    statement_span.set_attribute("db.statement.fingerprint", fingerprint)
+    statement_span.set_attribute("db.statement.rows", rows)
+    statement_span.end()
+
+
+def _handle_error(exception_context):
+    statement_span = getattr(exception_context.execution_context, "_statement_span", None)
+    if statement_span is not None:
+        statement_span.record_error(exception_context.original_exception)
+        statement_span.end()
+
+
+class _TimedCheckout:
+    """Records how long each checkout took, labelled with the pool's logging name"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            SQL_POOL_CHECKOUT_SECONDS.labels(pool=self.logging_name or "default").observe(
+                time.perf_counter() - started
+            )
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_engine(engine, name: str, capacity: int) -> None:
+    """
+    Export statement and pool metrics for a (synchronous) engine; pass
+    `async_engine.sync_engine` for an async one. Checkout times are only
+    recorded when the engine was created with a Timed* pool class and
+    `pool_logging_name=name`.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+    pool = engine.pool
+    checked_out = SQL_POOL_CHECKED_OUT.labels(pool=name)
+    SQL_POOL_CAPACITY.labels(pool=name).set(capacity)
+    event.listen(pool, "checkout", lambda dbapi_connection, record, proxy: checked_out.inc())
+    event.listen(pool, "checkin", lambda dbapi_connection, record: checked_out.dec())
+
+
+class SQLStatementsMiddleware:
+    """
+    Counts the statements each HTTP request sends, and logs requests that
+    send more than SQL_REPEATED_STATEMENT_THRESHOLD against one table.
+    """
+
+    def __init__(self, app, threshold: int = SQL_REPEATED_STATEMENT_THRESHOLD):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        statements = RequestStatements()
+        token = current_statements.set(statements)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_statements.reset(token)
+            route = route_template(scope)
+            SQL_STATEMENTS_PER_REQUEST.labels(route=route).observe(statements.total)
+            for table, count in statements.tables.items():
+                if table != "none" and count > self.threshold:
+                    SQL_REPEATED_STATEMENTS.labels(route=route, table=table).inc()
+                    logger.warning(
+                        f"{scope['method']} {route} sent {count} statements against {table} "
+                        f"({statements.total} in total); likely an N+1 query"
+                    )
@@ -0,0 +1,441 @@
+import os
+import re
+import json
+import time
+import queue
+import random
+import inspect
+import logging
+import threading
+import functools
+import urllib.request
+from collections import deque
+from contextvars import ContextVar
+from typing import List, Optional
+
+from app.monitoring.metrics import TRACES, TRACE_EXPORTS
+from app.monitoring.middleware import route_template
+
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Where finished traces go: none (tracing off), jsonl, memory or otlp
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+
+# File the jsonl exporter appends one span per line to
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH", "traces.jsonl")
+
+# OTLP/HTTP traces endpoint of a collector, e.g. http://otel-collector:4318/v1/traces
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+
+# service.name reported to the collector
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "justbros-backend")
+
+# Requests at least this slow (milliseconds) are always kept
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "500"))
+
+# Fraction of the other (fast, successful) requests kept
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+
+# Kept traces waiting for the exporter; new ones are dropped when it is full
+TRACE_EXPORT_QUEUE_SIZE = int(os.getenv("TRACE_EXPORT_QUEUE_SIZE", "1000"))
+
+# version-trace_id-parent_id-flags, see https://www.w3.org/TR/trace-context/
+_TRACEPARENT = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+class Trace:
+    """The spans of one request, collected until its root span ends"""
+
+    def __init__(self, trace_id: Optional[str] = None, remote_parent_id: Optional[str] = None, upstream_sampled: bool = False):
+        self.trace_id = trace_id or _new_id(128)
+        self.remote_parent_id = remote_parent_id
+        self.upstream_sampled = upstream_sampled
+        self.spans: List["Span"] = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add(self, span: "Span") -> None:
+        # Spans still running when the request ended (abandoned pool work,
+        # a leftover task) are not part of the decision and are dropped
+        with self._lock:
+            if not self.finished:
+                self.spans.append(span)
+
+    def finish(self) -> List["Span"]:
+        with self._lock:
+            self.finished = True
+            return self.spans
+
+
+class Span:
+    """
+    A timed operation within a trace. Used as a context manager it becomes
+    the parent of spans started inside it, including on pool threads.
+    """
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns", "error", "_token")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: dict):
+        self.trace = trace
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._token = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.trace.add(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-01"
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.record_error(exc)
+        _current_span.reset(self._token)
+        self.end()
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span outside a traced request"""
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+# Innermost open span of the request being handled
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def span(name: str, **attributes):
+    """
+    A child of the current span, started now. Use it as a context manager
+    to time a block, or call end() on it when it cannot enclose the work
+    (it then never becomes a parent). Outside a traced request it does
+    nothing, so instrumented code costs next to nothing while tracing is off.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator running a function, sync or async, in a span named after it"""
+    def decorate(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def current_traceparent() -> Optional[str]:
+    """traceparent header for an outgoing call made within the current span"""
+    current = _current_span.get()
+    return current.traceparent if current is not None else None
+
+
+def parse_traceparent(header: Optional[str]):
+    """
+    Returns:
+        Tuple of trace id, parent span id and sampled flag, or None if the header is absent or invalid
+    """
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if not match:
+        return None
+    version, trace_id, parent_id, flags = match.groups()
+    if version == "ff" or trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+class TailSampler:
+    """
+    Decides whether to keep a trace once it is complete: always when the
+    request failed, was slow or the caller sampled it, otherwise for a
+    random `sample_rate` of requests.
+    """
+
+    def __init__(self, slow_ms: float = TRACE_SLOW_MS, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.slow_ms = slow_ms
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+
+    def decide(self, trace: Trace, root: Span) -> str:
+        if root.error is not None:
+            return "kept_error"
+        if root.duration_ms >= self.slow_ms:
+            return "kept_slow"
+        if trace.upstream_sampled:
+            return "kept_upstream"
+        if random.random() < self.sample_rate:
+            return "kept_random"
+        return "dropped"
+
+
+class InMemoryExporter:
+    """Keeps the last `max_traces` traces, for tests and local inspection"""
+
+    name = "memory"
+
+    def __init__(self, max_traces: int = 100):
+        self._traces = deque(maxlen=max_traces)
+
+    def export(self, spans: List[dict]) -> None:
+        self._traces.append(spans)
+
+    def traces(self) -> List[List[dict]]:
+        return list(self._traces)
+
+
+class JsonLinesExporter:
+    """Appends one JSON object per span to a file"""
+
+    name = "jsonl"
+
+    def __init__(self, path: str = TRACE_JSONL_PATH):
+        self.path = path
+
+    def export(self, spans: List[dict]) -> None:
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(s, default=str) + "\n" for s in spans))
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpExporter:
+    """Posts traces to an OpenTelemetry collector as OTLP/HTTP JSON"""
+
+    name = "otlp"
+
+    def __init__(self, endpoint: str = TRACE_OTLP_ENDPOINT, service_name: str = TRACE_SERVICE_NAME, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def _span(self, s: dict) -> dict:
+        span = {
+            "traceId": s["trace_id"],
+            "spanId": s["span_id"],
+            "name": s["name"],
+            # SERVER for the request's root span, INTERNAL otherwise
+            "kind": 2 if s["attributes"].get("http.route") else 1,
+            "startTimeUnixNano": str(s["start_ns"]),
+            "endTimeUnixNano": str(s["end_ns"]),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s["attributes"].items()],
+            "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+        }
+        if s["parent_id"]:
+            span["parentSpanId"] = s["parent_id"]
+        return span
+
+    def export(self, spans: List[dict]) -> None:
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{"scope": {"name": "app"}, "spans": [self._span(s) for s in spans]}],
+            }]
+        }
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+EXPORTERS = {"memory": InMemoryExporter, "jsonl": JsonLinesExporter, "otlp": OtlpHttpExporter}
+
+
+class Tracer:
+    """
+    Collects the spans of each request and exports the traces the tail
+    sampler keeps.
+
+    Exporting happens on a daemon thread fed through a bounded queue, like
+    the shadow evaluator: a slow file system or collector never delays a
+    response, and traces are dropped when the queue is full.
+    """
+
+    def __init__(self, exporter=None, sampler: Optional[TailSampler] = None, queue_size: int = TRACE_EXPORT_QUEUE_SIZE):
+        self.exporter = exporter
+        self.sampler = sampler or TailSampler()
+        self._queue: "queue.Queue[List[dict]]" = queue.Queue(maxsize=max(queue_size, 1))
+        self._worker = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, **attributes) -> Span:
+        """The root span of a new trace, continuing the caller's trace if it sent a traceparent"""
+        parsed = parse_traceparent(traceparent)
+        trace = Trace(*parsed) if parsed else Trace()
+        return Span(trace, name, trace.remote_parent_id, attributes)
+
+    def finish_trace(self, root: Span) -> None:
+        """Apply the sampling decision to a trace whose root span has ended"""
+        spans = root.trace.finish()
+        decision = self.sampler.decide(root.trace, root)
+        TRACES.labels(decision=decision).inc()
+        if decision == "dropped":
+            return
+        try:
+            self._ensure_worker()
+            self._queue.put_nowait([s.to_dict() for s in spans])
+        except queue.Full:
+            TRACE_EXPORTS.labels(exporter=self.exporter.name, outcome="dropped").inc()
+
+    def _ensure_worker(self):
+        # Started lazily so forked worker processes get their own thread
+        if self._worker is None or not self._worker.is_alive():
+            with self._lock:
+                if self._worker is None or not self._worker.is_alive():
+                    self._worker = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        while True:
+            spans = self._queue.get()
+            try:
+                self.exporter.export(spans)
+                TRACE_EXPORTS.labels(exporter=self.exporter.name, outcome="ok").inc()
+            except Exception as e:
+                TRACE_EXPORTS.labels(exporter=self.exporter.name, outcome="error").inc()
+                logger.warning(f"Trace export to {self.exporter.name} failed: {str(e)}")
+
+
+def _create_exporter(name: str):
+    if name in ("", "none"):
+        return None
+    if name not in EXPORTERS:
+        logger.error(f"Unknown TRACE_EXPORTER {name!r}; tracing is off")
+        return None
+    return EXPORTERS[name]()
+
+
+tracer = Tracer(_create_exporter(TRACE_EXPORTER))
+
+
+class TracingMiddleware:
+    """
+    Runs each HTTP request in a root span and hands the finished trace to
+    the tracer. A valid W3C traceparent header continues the caller's
+    trace; the response carries a traceresponse header naming the root
+    span, so a slow response can be looked up by its trace id.
+    """
+
+    def __init__(self, app, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        root = self.tracer.start_trace(
+            f"{scope['method']} request", traceparent, **{"http.request.method": scope["method"], "url.path": scope["path"]}
+        )
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"traceresponse", root.traceparent.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            with root:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            root.name = f"{scope['method']} {route}"
+            root.set_attribute("http.route", route)
+            root.set_attribute("http.response.status_code", status)
+            if status >= 500 and root.error is None:
+                root.error = f"HTTP {status}"
+            self.tracer.finish_trace(root)
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from typing import Any, AsyncIterator, Iterator, List, Literal, Optional
+import os
+import json
+import asyncio
+from functools import partial
 import logging
-from datetime import datetime
+from datetime import date, datetime
 from app.models.models import SalesEntry as EntryModel
 from app.models.models import User as UserModel
 from app.models.models import Trucks as TruckModel
@@ -17,15 +23,19 @@ from app.schema.schemas import (
     StockSummary,
     Trucks,
     TrucksCreate,
-    TrucksResponse
+    TrucksResponse,
+    BulkImportResponse
     
 )
-from app.database.database import get_db
+from app.database.database import get_db, get_sync_db
+from app.database.replica import replica_router
 from app.crud.entries import (
     create_sales_entry as create_entry_crud,
     create_trucks_entry as create_truck_entry_crud,
     get_sales_entries as get_entries_crud,
     get_sales_entry_by_branch as get_entry_crud,
+    parse_fields,
+    iter_sales_entries_by_branch as iter_entries_crud,
     update_sales_entry as update_entry_crud,
     delete_sales_entry as delete_entry_crud,
     get_stock_summary as get_stock_crud,
@@ -33,14 +43,140 @@ from app.crud.entries import (
     update_trucks_entry as update_truck_entry_crud,
     delete_trucks_entry as delete_truck_entry_crud
 )
+from app.crud.bulk_import import import_sales_entries as import_entries_crud, iter_upload_lines
 from app.authentication.auth import (
     get_current_user
 )
+from app.core.executor import run_blocking
+from app.core.singleflight import SingleFlight
+from app.monitoring.tracing import traced
+from app.cache.result_cache import result_cache, branch_tag, year_tag, ALL_ENTRIES_TAG, TRUCKS_TAG
 
 # Configure logging
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Largest bulk-import upload accepted, in bytes
+BULK_IMPORT_MAX_BYTES = int(os.getenv("BULK_IMPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Upload content types understood by the bulk import
+BULK_IMPORT_FORMATS = {
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+
+# Response content types of the streaming modes of GET /{branch}
+ENTRIES_STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+}
+
+def _project_entries(rows: list, fields: List[str]) -> list:
+    # Only the selected fields, encoded as SalesEntryResponse would encode them
+    # (including its rounding of floats to two decimal places)
+    return jsonable_encoder([
+        {name: round(value, 2) if isinstance(value, float) else value
+         for name, value in ((name, getattr(row, name)) for name in fields)}
+        for row in rows
+    ])
+
+def _serialize_chunk(chunk: list, fields: Optional[List[str]] = None) -> List[str]:
+    if fields:
+        return [json.dumps(entry) for entry in _project_entries(chunk, fields)]
+    return [SalesEntryResponse.model_validate(entry, from_attributes=True).model_dump_json() for entry in chunk]
+
+def _encode_entries(rows: list, fields: Optional[List[str]] = None) -> list:
+    if fields:
+        return _project_entries(rows, fields)
+    return [SalesEntryResponse.model_validate(entry, from_attributes=True).model_dump(mode="json") for entry in rows]
+
+def _entry_list_tags(branch: Optional[str], year: Optional[int]) -> List[str]:
+    # The narrowest cache tag that every entry the list can contain is written under
+    if branch:
+        return [branch_tag(branch)]
+    if year:
+        return [year_tag(year)]
+    return [ALL_ENTRIES_TAG]
+
+# Results computed below are shared by coalesced callers, so each opens its
+# own session, on the database _read_through picked, rather than borrowing
+# one request's; encoding runs on the pool
+
+@traced()
+async def _entries_page(sessions: async_sessionmaker, fields: Optional[List[str]], **params) -> dict:
+    async with sessions() as db:
+        entries, next_cursor = await get_entries_crud(db, fields=fields, **params)
+    return {"entries": await run_blocking(_encode_entries, entries, fields), "next_cursor": next_cursor}
+
+def _encode_trucks(rows: list) -> list:
+    return [TrucksResponse.model_validate(entry, from_attributes=True).model_dump(mode="json") for entry in rows]
+
+@traced()
+async def _trucks_page(sessions: async_sessionmaker, **params) -> dict:
+    async with sessions() as db:
+        entries, next_cursor = await get_trucks_entries_crud(db, **params)
+    return {"entries": await run_blocking(_encode_trucks, entries), "next_cursor": next_cursor}
+
+@traced()
+async def _stock_summary(sessions: async_sessionmaker, year: int) -> list:
+    async with sessions() as db:
+        return jsonable_encoder(await get_stock_crud(db, year))
+
+@traced()
+async def _branch_entries(sessions: async_sessionmaker, branch: str, fields: Optional[List[str]]) -> list:
+    async with sessions() as db:
+        entries = await get_entry_crud(branch, db, fields)
+    return await run_blocking(_encode_entries, entries, fields)
+
+# Dashboards opening at once send bursts of identical reads
+entries_flight = SingleFlight("entries")
+
+@traced()
+async def _read_through(namespace: str, params: dict, scope: str, tags: List[str], compute, user_id: int) -> Any:
+    """
+    Serve a read from the result cache, running `compute(sessions)` on a miss.
+
+    Identical concurrent calls share one cache lookup and at most one
+    computation. A read that starts after a write committed by this worker
+    never joins a computation that started before it. Misses are computed
+    on the read replica when replica_router allows it for `user_id`.
+    """
+    replica = await replica_router.use_replica(user_id)
+    key = (namespace, json.dumps(params, sort_keys=True, default=str), scope, replica, result_cache.generation)
+    # A replica may not have replayed a write this worker just committed:
+    # what it returns then is served, but not cached under the new tag
+    # versions where it would outlive the lag
+    store = not (replica and replica_router.wrote_recently())
+    return await entries_flight.do(
+        key,
+        partial(
+            result_cache.get_or_compute, namespace, params, scope, tags,
+            partial(compute, replica_router.sessions(replica)), store=store
+        )
+    )
+
+async def _stream_entries(chunks: AsyncIterator[list], first: list, fmt: str, fields: Optional[List[str]]) -> AsyncIterator[str]:
+    try:
+        if fmt == "json":
+            yield "["
+        chunk, sent = first, False
+        while chunk is not None:
+            rows = await run_blocking(_serialize_chunk, chunk, fields)
+            if fmt == "ndjson":
+                yield "".join(f"{row}\n" for row in rows)
+            else:
+                yield ("," if sent else "") + ",".join(rows)
+                sent = True
+            chunk = await anext(chunks, None)
+        if fmt == "json":
+            yield "]"
+    finally:
+        # Also reached on client disconnect, when this task is being
+        # cancelled; closing the generator closes its cursor and session
+        await asyncio.shield(chunks.aclose())
+
 router = APIRouter(
     prefix="/api/entries",
     tags=["Entries"],
@@ -74,7 +210,7 @@ async def info():
 )
 async def create_entry(
     entry_data: SalesEntryCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user)
 ):
     """
@@ -95,7 +231,7 @@ async def create_entry(
             )
 
         # Create entry
-        new_entry = create_entry_crud(entry_data, db, current_user)
+        new_entry = await create_entry_crud(entry_data, db, current_user)
         logger.info(f"Created new sales entry for branch: {entry_data.branch}")
         return new_entry
 
@@ -116,7 +252,7 @@ async def create_entry(
 )
 async def create_truck_entry(
     entry_data: TrucksCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user)
 ):
     """
@@ -141,7 +277,7 @@ async def create_truck_entry(
             )
 
         # Create entry
-        new_entry = create_truck_entry_crud(entry_data, db, current_user)
+        new_entry = await create_truck_entry_crud(entry_data, db, current_user)
         logger.info(f"Created new truck entry for branch: {entry_data.branch}")
         return new_entry
 
@@ -152,6 +288,74 @@ async def create_truck_entry(
             detail="An error occurred while creating the sales entry"
         )
 
+def _read_body(request: Request, loop: asyncio.AbstractEventLoop) -> Iterator[bytes]:
+    # The request body, chunk by chunk, for a worker thread to read from
+    stream = request.stream()
+
+    async def next_chunk():
+        return await stream.__anext__()
+
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(next_chunk(), loop).result()
+        except StopAsyncIteration:
+            return
+
+@router.post(
+    "/bulk-import",
+    response_model=BulkImportResponse,
+    summary="Import many sales entries",
+    description="Validate and load NDJSON or CSV sales entries in one transaction",
+    response_description="Per-row import results"
+)
+async def bulk_import_entries(
+    request: Request,
+    all_or_nothing: bool = Query(False, description="Import nothing if any row is rejected"),
+    # COPY goes through psycopg2, on a synchronous session
+    db: Session = Depends(get_sync_db),
+    current_user: UserModel = Depends(get_current_user)
+):
+    """
+    Import sales entries sent as NDJSON (one `SalesEntryCreate` object per line)
+    or CSV (a header row of `SalesEntryCreate` field names):
+    - **Content-Type**: `application/x-ndjson` or `text/csv`; a JSON array
+      (`application/json`) is refused with 415
+    - **all_or_nothing**: Reject the whole upload if any row fails
+
+    Opening readings and unit prices left at zero are chained from the previous
+    entry of the branch, totals are calculated and every row is validated by the
+    model as with `/new`. Valid rows are written in a single transaction.
+
+    Returns:
+        BulkImportResponse: Created entry ids and the errors of rejected rows
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    fmt = BULK_IMPORT_FORMATS.get(content_type)
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Content-Type must be one of: {list(BULK_IMPORT_FORMATS)}"
+        )
+
+    # Parsed line by line on the worker thread as the upload arrives,
+    # rather than buffered whole
+    lines = iter_upload_lines(_read_body(request, asyncio.get_running_loop()), BULK_IMPORT_MAX_BYTES)
+
+    try:
+        result = await run_blocking(import_entries_crud, lines, fmt, db, current_user, all_or_nothing)
+        logger.info(
+            f"Bulk import by {current_user.email}: {result['imported']} imported, {result['failed']} rejected"
+        )
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error importing sales entries: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while importing the sales entries"
+        )
+
 @router.get(
     "/all",
     response_model=List[SalesEntryResponse],
@@ -160,30 +364,72 @@ async def create_truck_entry(
     response_description="List of sales entries"
 )
 async def get_entries(
-    db: Session = Depends(get_db),
+    response: Response,
     skip: int = Query(0, ge=0, le=1000, description="Number of items to skip"),
     limit: int = Query(100, ge=1, le=1000, description="Number of items to return"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    year: Optional[int] = Query(None, ge=1900, le=9999, description="Filter by year"),
+    month: Optional[int] = Query(None, ge=1, le=12, description="Filter by month (requires year)"),
+    day: Optional[int] = Query(None, ge=1, le=31, description="Filter by day (requires month)"),
+    branch: Optional[Branch] = Query(None, description="Filter by branch name"),
+    start_date: Optional[date] = Query(None, description="Filter entries from this date"),
+    end_date: Optional[date] = Query(None, description="Filter entries up to this date"),
+    user_id: Optional[int] = Query(None, description="Filter by the user who recorded the entry"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (default: all)"),
     current_user: UserModel = Depends(get_current_user)
 ):
     """
-    Get a list of sales entries with optional filters:
-    - **skip**: Number of items to skip (default: 0, max: 1000)
+    Get a list of sales entries ordered by date with optional filters:
+    - **skip**: Number of items to skip (default: 0, max: 1000); not with **cursor**
     - **limit**: Number of items to return (default: 100, max: 1000)
+    - **cursor**: Continue from a previous page; when more entries follow,
+      the response carries the cursor for the next page in `X-Next-Cursor`
+    - **year**, **month**, **day**: Filter by calendar date
     - **branch**: Filter by branch name
     - **start_date**: Filter entries from this date
     - **end_date**: Filter entries up to this date
+    - **user_id**: Filter by the user who recorded the entry
+    - **fields**: Only read and return these fields, e.g. `date,branch,sales_ago`
 
     Returns:
         List[SalesEntryResponse]: List of sales entries
     """
     try:
-        entries = get_entries_crud(
-            db,
+        selected = parse_fields(fields)
+        params = dict(
             skip=skip,
-            limit=limit
+            limit=limit,
+            cursor=cursor,
+            year=year,
+            month=month,
+            day=day,
+            branch=branch.value if branch else None,
+            start_date=start_date,
+            end_date=end_date,
+            user_id=user_id
+        )
+        page = await _read_through(
+            "entries.all",
+            {**params, "fields": selected},
+            current_user.role,
+            _entry_list_tags(params["branch"], year),
+            partial(_entries_page, fields=selected, **params),
+            current_user.id
         )
+        entries, next_cursor = page["entries"], page["next_cursor"]
+        if selected:
+            # Returned directly: response_model would require every field
+            response = JSONResponse(content=entries)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         logger.info(f"Retrieved {len(entries)} entries with skip={skip} and limit={limit}")
-        return entries
+        return response if selected else entries
+
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
     except Exception as e:
         logger.error(f"Error retrieving entries: {str(e)}")
@@ -200,31 +446,46 @@ async def get_entries(
     response_description="List of trucks entries"
 )
 async def get_entries(
-    db: Session = Depends(get_db),
+    response: Response,
     skip: int = Query(0, ge=0, le=1000, description="Number of items to skip"),
     limit: int = Query(100, ge=1, le=1000, description="Number of items to return"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    year: Optional[int] = Query(None, ge=1900, le=9999, description="Filter by year"),
     current_user: UserModel = Depends(get_current_user)
 ):
     """
-    Get a list of trucks entries with optional filters:
-    - **skip**: Number of items to skip (default: 0, max: 1000)
+    Get a list of trucks entries ordered by date with optional filters:
+    - **skip**: Number of items to skip (default: 0, max: 1000); not with **cursor**
     - **limit**: Number of items to return (default: 100, max: 1000)
-    - **branch**: Filter by branch name
-    - **start_date**: Filter entries from this date
-    - **end_date**: Filter entries up to this date
+    - **cursor**: Continue from a previous page; when more entries follow,
+      the response carries the cursor for the next page in `X-Next-Cursor`
+    - **year**: Filter by year
 
     Returns:
         List[TrucksResponse]: List of trucks entries
     """
     try:
-        entries = get_trucks_entries_crud(
-            db,
-            skip=skip,
-            limit=limit
+        params = dict(skip=skip, limit=limit, cursor=cursor, year=year)
+        page = await _read_through(
+            "entries.all_trucks",
+            params,
+            current_user.role,
+            [TRUCKS_TAG],
+            partial(_trucks_page, **params),
+            current_user.id
         )
+        entries, next_cursor = page["entries"], page["next_cursor"]
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
         logger.info(f"Retrieved {len(entries)} entries with skip={skip} and limit={limit}")
         return entries
 
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
     except Exception as e:
         logger.error(f"Error retrieving entries: {str(e)}")
         raise HTTPException(
@@ -242,7 +503,6 @@ async def get_entries(
 )
 async def get_stock_summary(
     year: Optional[int] = None,
-    db: Session = Depends(get_db),
     current_user: UserModel = Depends(get_current_user)
 ):
     """
@@ -254,8 +514,16 @@ async def get_stock_summary(
         List[StockSummary]: List of stock summary
     """
     try:
-        # Call function with positional arguments matching the function definition
-        entries = get_stock_crud(db, year)
+        # Resolved here so the cached summary is tagged with the year it covers
+        summary_year = year if year is not None else datetime.now().year
+        entries = await _read_through(
+            "entries.stock_summary",
+            {"year": summary_year},
+            current_user.role,
+            [year_tag(summary_year)],
+            partial(_stock_summary, year=summary_year),
+            current_user.id
+        )
         
         # Explicitly transform each entry to match the StockSummary schema
         # Handle both dictionary-like and object-like entries
@@ -322,25 +590,63 @@ async def get_stock_summary(
 )
 async def get_entry(
     branch: str,
-    db: Session = Depends(get_db),
+    stream: Optional[Literal["ndjson", "json"]] = Query(None, description="Stream the entries as NDJSON or as a chunked JSON array"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return (default: all)"),
     current_user: UserModel = Depends(get_current_user)
 ):
     """
     Get a specific sales entry by their ID:
     - **branch**: Branch of the sales entry to retrieve
+    - **stream**: `ndjson` for one entry per line or `json` for a chunked array, ordered by date
+    - **fields**: Only read and return these fields, e.g. `date,branch,sales_ago`
+
+    Streamed responses are read through a server-side cursor and sent as they
+    are serialized, so memory use does not grow with the branch's history.
 
     Returns:
         SalesEntryResponse: Sales entry information
     """
     try:
-        entry = get_entry_crud(branch, db)
+        selected = parse_fields(fields)
+        if stream:
+            replica = await replica_router.use_replica(current_user.id)
+            chunks = iter_entries_crud(branch, fields=selected, sessions=replica_router.sessions(replica))
+            first = await anext(chunks, None)
+            if first is None:
+                await chunks.aclose()
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Sales entry for branch {branch} not found"
+                )
+            return StreamingResponse(
+                _stream_entries(chunks, first, stream, selected),
+                media_type=ENTRIES_STREAM_MEDIA_TYPES[stream]
+            )
+
+        entry = await _read_through(
+            "entries.branch",
+            {"branch": branch, "fields": selected},
+            current_user.role,
+            [branch_tag(branch)],
+            partial(_branch_entries, branch=branch, fields=selected),
+            current_user.id
+        )
         if not entry:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Sales entry for branch {branch} not found"
             )
+        if selected:
+            return JSONResponse(content=entry)
         return entry
 
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error retrieving entry {branch}: {str(e)}")
         raise HTTPException(
@@ -358,7 +664,7 @@ async def get_entry(
 async def update_entry(
     entry_id: int,
     entry_data: SalesEntryUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user)
 ):
     """
@@ -377,7 +683,7 @@ async def update_entry(
             )
 
         # Update entry
-        updated_entry = update_entry_crud(entry_id, entry_data, db, current_user)
+        updated_entry = await update_entry_crud(entry_id, entry_data, db, current_user)
         logger.info(f"Updated sales entry: {entry_id}")
         return updated_entry
 
@@ -397,7 +703,7 @@ async def update_entry(
 )
 async def delete_entry(
     entry_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: UserModel = Depends(get_current_user)
 ):
     """
@@ -409,7 +715,7 @@ async def delete_entry(
     """
     try:
         # Delete entry
-        delete_entry_crud(entry_id, db, current_user)
+        await delete_entry_crud(entry_id, db, current_user)
         logger.info(f"Deleted sales entry: {entry_id}")
         return None
 
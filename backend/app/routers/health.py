@@ -0,0 +1,28 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from app.core.startup import database_ready
+from app.models.models import model_registry
+
+
+router = APIRouter(tags=["Monitoring"])
+
+
+@router.get("/health", include_in_schema=False)
+def health():
+    """Liveness: the process is up and serving; touches nothing else"""
+    return {"status": "ok"}
+
+
+@router.get("/ready", include_in_schema=False)
+async def ready():
+    """Readiness: the database answers and the validation model is loaded"""
+    checks = {
+        "database": await database_ready(),
+        "model": model_registry.loaded,
+    }
+    ok = all(checks.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ok else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ok else "not ready", "checks": checks},
+    )
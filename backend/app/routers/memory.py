@@ -0,0 +1,212 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+import logging
+
+from app.models.models import User as UserModel
+from app.authentication.auth import get_current_admin
+from app.core.executor import run_blocking
+from app.monitoring.memory import (
+    GROUP_BY,
+    TRACEMALLOC_FRAMES,
+    snapshot_store,
+    start_tracing,
+    stop_tracing,
+    tracing_status,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+router = APIRouter(
+    prefix="/api/memory",
+    tags=["Monitoring"],
+    responses={
+        404: {"description": "Not found"},
+        400: {"description": "Bad Request"},
+        403: {"description": "Forbidden"}
+    }
+)
+
+GROUP_BY_DESCRIPTION = f"Group allocations by {', '.join(GROUP_BY)}"
+
+
+def _not_found(snapshot_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Memory snapshot {snapshot_id} not found"
+    )
+
+
+@router.get(
+    "",
+    summary="Memory of the answering worker",
+    description="Resident, heap and tracemalloc memory of the worker that handles the request",
+    response_description="Worker memory and tracing status"
+)
+async def get_memory(current_user: UserModel = Depends(get_current_admin)):
+    """
+    Show how much memory this worker uses and whether tracemalloc traces it.
+
+    Returns:
+        dict: pid, resident and heap bytes, and tracemalloc status
+    """
+    return tracing_status()
+
+
+@router.post(
+    "/tracing",
+    summary="Start tracing allocations",
+    description="Start tracemalloc in the answering worker; only allocations made from now on are traced",
+    response_description="Worker memory and tracing status"
+)
+async def start_memory_tracing(
+    frames: int = Query(TRACEMALLOC_FRAMES, ge=1, le=100, description="Frames stored per allocation"),
+    current_user: UserModel = Depends(get_current_admin)
+):
+    """
+    Start tracemalloc in this worker.
+
+    Args:
+        frames: Frames stored per allocation; more show more of the call
+            path and cost more memory and time per allocation
+
+    Returns:
+        dict: Worker memory and tracing status
+    """
+    start_tracing(frames)
+    return tracing_status()
+
+
+@router.delete(
+    "/tracing",
+    summary="Stop tracing allocations",
+    description="Stop tracemalloc in the answering worker and free its traces",
+    response_description="Worker memory and tracing status"
+)
+async def stop_memory_tracing(current_user: UserModel = Depends(get_current_admin)):
+    """
+    Stop tracemalloc in this worker. Stored snapshots are kept.
+
+    Returns:
+        dict: Worker memory and tracing status
+    """
+    stop_tracing()
+    return tracing_status()
+
+
+@router.post(
+    "/snapshots",
+    status_code=status.HTTP_201_CREATED,
+    summary="Take a memory snapshot",
+    description="Snapshot the traced allocations of the answering worker",
+    response_description="The snapshot's description"
+)
+async def take_memory_snapshot(
+    label: Optional[str] = Query(None, max_length=100, description="Free text to recognise the snapshot by"),
+    current_user: UserModel = Depends(get_current_admin)
+):
+    """
+    Take a tracemalloc snapshot in this worker. With many traced
+    allocations this takes seconds, during which the worker is slow.
+
+    Args:
+        label: Optional note, e.g. "before load test"
+
+    Returns:
+        dict: Id, worker pid and traced memory of the snapshot
+    """
+    try:
+        return await run_blocking(snapshot_store.take, label)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.get(
+    "/snapshots",
+    summary="List memory snapshots",
+    description="Snapshots taken by all workers, newest first",
+    response_description="Stored snapshots"
+)
+async def list_memory_snapshots(current_user: UserModel = Depends(get_current_admin)):
+    """
+    List the stored tracemalloc snapshots.
+
+    Returns:
+        list: Id, label, worker pid and traced memory of each snapshot
+    """
+    return await run_blocking(snapshot_store.list)
+
+
+@router.get(
+    "/snapshots/{snapshot_id}",
+    summary="Top allocation sites of a snapshot",
+    description="The code that allocated most of the memory traced when the snapshot was taken",
+    response_description="Largest allocation sites"
+)
+async def get_memory_snapshot(
+    snapshot_id: str,
+    group_by: str = Query("lineno", description=GROUP_BY_DESCRIPTION),
+    limit: int = Query(25, ge=1, le=500, description="Sites to show"),
+    current_user: UserModel = Depends(get_current_admin)
+):
+    """
+    Get the largest allocation sites of one snapshot.
+
+    Args:
+        snapshot_id: Id returned when the snapshot was taken
+        group_by: lineno, filename or traceback
+        limit: Number of sites to show
+
+    Returns:
+        dict: The snapshot's description and its largest sites
+    """
+    try:
+        return await run_blocking(snapshot_store.top, snapshot_id, group_by, limit)
+    except KeyError:
+        raise _not_found(snapshot_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.get(
+    "/snapshots/{snapshot_id}/diff",
+    summary="Compare two memory snapshots",
+    description="The allocation sites that grew or shrank most between two snapshots of the same worker",
+    response_description="Sites ordered by growth"
+)
+async def diff_memory_snapshots(
+    snapshot_id: str,
+    base: str = Query(..., description="Id of the earlier snapshot"),
+    group_by: str = Query("lineno", description=GROUP_BY_DESCRIPTION),
+    limit: int = Query(25, ge=1, le=500, description="Sites to show"),
+    current_user: UserModel = Depends(get_current_admin)
+):
+    """
+    Compare a snapshot with an earlier one of the same worker.
+
+    Args:
+        snapshot_id: Id of the later snapshot
+        base: Id of the earlier snapshot
+        group_by: lineno, filename or traceback
+        limit: Number of sites to show
+
+    Returns:
+        dict: Total growth and the sites that changed most
+    """
+    try:
+        return await run_blocking(snapshot_store.diff, snapshot_id, base, group_by, limit)
+    except KeyError as e:
+        raise _not_found(e.args[0])
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
@@ -0,0 +1,26 @@
+import os
+
+from fastapi import APIRouter, Response
+from prometheus_client import CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST, multiprocess
+
+
+router = APIRouter(tags=["Monitoring"])
+
+# Set when several worker processes serve the app (see gunicorn.conf.py):
+# each writes its samples there and a scrape, whichever worker answers it,
+# aggregates them all
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+
+def _registry() -> CollectorRegistry:
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Expose Prometheus metrics for scraping"""
+    return Response(content=generate_latest(_registry()), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,223 @@
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
+
+from app.models.models import User as UserModel
+from app.models.models import model_registry, shadow_evaluator
+from app.ml.registry import ModelValidationError
+from app.ml.rescoring import create_run, run_rescoring, get_run
+from app.database.database import get_db
+from app.schema.schemas import (
+    ModelInfo,
+    ModelSwapRequest,
+    RescoreRequest,
+    RescoringRunResponse,
+    ShadowModelRequest,
+    ShadowInfo,
+)
+from app.authentication.auth import get_current_admin
+from app.core.executor import run_blocking
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+router = APIRouter(
+    prefix="/api/ml",
+    tags=["ML"],
+    responses={
+        404: {"description": "Not found"},
+        400: {"description": "Bad Request"},
+        403: {"description": "Forbidden"}
+    }
+)
+
+
+@router.get(
+    "/model",
+    response_model=ModelInfo,
+    summary="Get the active validation model",
+    description="Show which model version is validating sales entries",
+    response_description="Active model information"
+)
+async def get_model(current_user: UserModel = Depends(get_current_admin)):
+    """
+    Get the model version this worker is using for net-sales validation.
+
+    Returns:
+        ModelInfo: Active model information
+    """
+    version = await run_blocking(model_registry.get)
+    return version.describe()
+
+
+@router.post(
+    "/model/swap",
+    response_model=ModelInfo,
+    summary="Swap the validation model",
+    description="Load, validate and activate a model version without restarting",
+    response_description="Newly active model information"
+)
+async def swap_model(
+    swap_request: ModelSwapRequest,
+    current_user: UserModel = Depends(get_current_admin)
+):
+    """
+    Activate a model version for all workers:
+    - **name**: Model file inside the model directory (omit to reload the active one)
+
+    The model is checked against the features `extract_features` builds before
+    it replaces the current version. Other workers pick it up on their next
+    reload check.
+
+    Returns:
+        ModelInfo: Newly active model information
+    """
+    try:
+        version = await run_blocking(model_registry.swap, swap_request.name)
+        logger.info(f"Model swapped to {version.version} by {current_user.email}")
+        return version.describe()
+    except ModelValidationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error swapping model: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while loading the model"
+        )
+
+
+@router.post(
+    "/rescore",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=RescoringRunResponse,
+    summary="Re-score stored entries",
+    description="Start a background job scoring daily entries with a model",
+    response_description="The started rescoring run"
+)
+async def start_rescoring(
+    rescore_request: RescoreRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_admin)
+):
+    """
+    Score existing entries and record the ones the model would reject:
+    - **name**: Model file inside the model directory (omit for the active model)
+    - **pending_only**: Only entries validated by the fallback rules
+
+    Poll `GET /api/ml/rescore/{run_id}` for progress and flagged entries.
+
+    Returns:
+        RescoringRunResponse: The started run
+    """
+    try:
+        model_path = (
+            model_registry.resolve_path(rescore_request.name)
+            if rescore_request.name else model_registry.active_path()
+        )
+        run_id = await run_blocking(create_run, model_path, rescore_request.pending_only)
+    except ModelValidationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    background_tasks.add_task(run_rescoring, run_id, model_path, rescore_request.pending_only)
+    logger.info(f"Rescoring run {run_id} started by {current_user.email}")
+    # get_run is shared with the CLI and takes a synchronous session
+    return await db.run_sync(get_run, run_id, 0)
+
+
+@router.get(
+    "/rescore/{run_id}",
+    response_model=RescoringRunResponse,
+    summary="Get a rescoring run",
+    description="Get the progress of a rescoring run and the entries it flagged",
+    response_description="Rescoring run with flagged entries"
+)
+async def get_rescoring(
+    run_id: str,
+    limit: int = Query(1000, ge=0, le=10000, description="Number of flagged entries to return"),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_admin)
+):
+    """
+    Get a rescoring run:
+    - **run_id**: ID returned when the run was started
+    - **limit**: Number of flagged entries to return, largest difference first
+
+    Returns:
+        RescoringRunResponse: The run and its flagged entries
+    """
+    run = await db.run_sync(get_run, run_id, limit)
+    if not run:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Rescoring run {run_id} not found"
+        )
+    return run
+
+
+@router.get(
+    "/shadow",
+    response_model=ShadowInfo,
+    summary="Get the shadow model comparison",
+    description="Show the shadow model and how its predictions compare with the active model",
+    response_description="Shadow model comparison for this worker"
+)
+async def get_shadow(current_user: UserModel = Depends(get_current_admin)):
+    """
+    Get this worker's shadow model and its agreement with the active model
+    since it was loaded. Prometheus `ml_shadow_*` metrics cover all workers.
+
+    Returns:
+        ShadowInfo: Shadow model comparison
+    """
+    return shadow_evaluator.describe()
+
+
+@router.put(
+    "/shadow",
+    response_model=ShadowInfo,
+    summary="Set the shadow model",
+    description="Score a candidate model in shadow next to the active model",
+    response_description="Shadow model comparison for this worker"
+)
+async def set_shadow(
+    shadow_request: ShadowModelRequest,
+    current_user: UserModel = Depends(get_current_admin)
+):
+    """
+    Start shadowing a model for all workers:
+    - **name**: Model file inside the model directory
+
+    The shadow model never affects validation; it only records prediction
+    deltas, latency and decision disagreements.
+
+    Returns:
+        ShadowInfo: Shadow model comparison
+    """
+    try:
+        await run_blocking(shadow_evaluator.set_model, shadow_request.name)
+        logger.info(f"Shadow model set to {shadow_request.name} by {current_user.email}")
+        return shadow_evaluator.describe()
+    except ModelValidationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error loading shadow model: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while loading the model"
+        )
+
+
+@router.delete(
+    "/shadow",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Stop shadowing",
+    description="Stop scoring entries with the shadow model"
+)
+async def clear_shadow(current_user: UserModel = Depends(get_current_admin)):
+    """
+    Stop shadow scoring for all workers.
+    """
+    await run_blocking(shadow_evaluator.set_model, None)
+    logger.info(f"Shadow model cleared by {current_user.email}")
@@ -0,0 +1,103 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+import logging
+
+from app.models.models import User as UserModel
+from app.authentication.auth import get_current_admin
+from app.core.executor import run_blocking
+from app.monitoring.profiling import profile_store
+
+# Configure logging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+router = APIRouter(
+    prefix="/api/profiles",
+    tags=["Monitoring"],
+    responses={
+        404: {"description": "Not found"},
+        400: {"description": "Bad Request"},
+        403: {"description": "Forbidden"}
+    }
+)
+
+
+@router.get(
+    "",
+    summary="List request profiles",
+    description="Profiles recorded for requests sent with an X-Profile: 1 header (or ?profile=1) by an admin",
+    response_description="Stored profiles, newest first"
+)
+async def list_profiles(current_user: UserModel = Depends(get_current_admin)):
+    """
+    List the request profiles stored by this deployment.
+
+    Returns:
+        list: Id, request, status, wall time and profiled CPU time of each profile
+    """
+    return await run_blocking(profile_store.list)
+
+
+@router.get(
+    "/{profile_id}",
+    response_class=PlainTextResponse,
+    summary="Show a request profile",
+    description="The profile's most expensive functions, as printed by pstats",
+    response_description="pstats report"
+)
+async def get_profile_report(
+    profile_id: str,
+    sort: str = Query("cumulative", description="pstats sort key, e.g. cumulative, tottime, ncalls"),
+    limit: int = Query(50, ge=1, le=1000, description="Functions to show"),
+    current_user: UserModel = Depends(get_current_admin)
+):
+    """
+    Get the text report of one profile.
+
+    Args:
+        profile_id: Id from the X-Profile-Id response header
+        sort: pstats sort key
+        limit: Number of functions to show
+
+    Returns:
+        str: The pstats report
+    """
+    try:
+        return await run_blocking(profile_store.report, profile_id, sort, limit)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile {profile_id} not found"
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.get(
+    "/{profile_id}/pstats",
+    response_class=FileResponse,
+    summary="Download a request profile",
+    description="The raw pstats file, for snakeviz, gprof2dot (flame/call graphs) or pstats.Stats",
+    response_description="pstats file"
+)
+async def download_profile(profile_id: str, current_user: UserModel = Depends(get_current_admin)):
+    """
+    Download one profile as a pstats file.
+
+    Args:
+        profile_id: Id from the X-Profile-Id response header
+
+    Returns:
+        FileResponse: The pstats file
+    """
+    try:
+        path = profile_store.path(profile_id)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile {profile_id} not found"
+        )
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.pstats")
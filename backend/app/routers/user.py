@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import logging
 from app.models.models import User as UserModel
@@ -22,7 +23,8 @@ from app.crud.user import (
     get_current_active_user as get_current_active_user_crud
 )
 from app.authentication.auth import (
-    get_current_user
+    get_current_user,
+    get_read_db
 )
 
 # Configure logging with proper configuration
@@ -70,7 +72,7 @@ router = APIRouter(
 )
 async def create_user(
     user_data: UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create a new user with the following details:
@@ -97,7 +99,7 @@ async def create_user(
         validate_branch(user_data.branch)
 
         # Check if email already exists
-        existing_user = db.query(UserModel).filter(UserModel.email == user_data.email).first()
+        existing_user = await db.scalar(select(UserModel).where(UserModel.email == user_data.email))
         if existing_user:
             raise UserException(
                 detail="User with this email already exists",
@@ -105,7 +107,7 @@ async def create_user(
             )
 
         # Create user
-        new_user = create_user_crud(user_data, db)
+        new_user = await create_user_crud(user_data, db)
         logger.info(f"Created new user: {new_user.email}")
         return new_user
 
@@ -127,7 +129,7 @@ async def create_user(
     response_description="List of users"
 )
 async def get_users(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     skip: int = Query(0, ge=0, le=1000, description="Number of items to skip"),
     limit: int = Query(100, ge=1, le=1000, description="Number of items to return"),
     current_user: User = Depends(get_current_user)
@@ -141,7 +143,7 @@ async def get_users(
         List[ShowUser]: List of user information
     """
     try:
-        users = get_users_crud(db, skip=skip, limit=limit)
+        users = await get_users_crud(db, skip=skip, limit=limit)
         logger.info(f"Retrieved {len(users)} users with skip={skip} and limit={limit}")
         return users
     except Exception as e:
@@ -160,7 +162,7 @@ async def get_users(
 )
 async def get_user(
     fullname: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -171,7 +173,7 @@ async def get_user(
         ShowUser: User information
     """
     try:
-        user = get_user_crud(fullname, db)
+        user = await get_user_crud(fullname, db)
         if not user:
             raise UserException(
                 detail=f"User with name {fullname} not found",
@@ -198,7 +200,7 @@ async def get_user(
 async def update_user(
     fullname: str,
     user_data: UserCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -210,7 +212,7 @@ async def update_user(
     """
     try:
         # Get existing user
-        user = db.query(UserModel).filter(UserModel.fullname == fullname).first()
+        user = await db.scalar(select(UserModel).where(UserModel.fullname == fullname))
         if not user:
             raise UserException(
                 detail=f"User with name {fullname} not found",
@@ -225,7 +227,7 @@ async def update_user(
             )
 
         # Update user data
-        updated_user = update_user_crud(fullname, user_data, db)
+        updated_user = await update_user_crud(fullname, user_data, db)
         logger.info(f"Updated user: {fullname}")
         return updated_user
     except UserException as ue:
@@ -247,7 +249,7 @@ async def update_user(
 )
 async def delete_user(
     fullname: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
@@ -259,7 +261,7 @@ async def delete_user(
     """
     try:
         # Get existing user
-        user = db.query(UserModel).filter(UserModel.fullname == fullname).first()
+        user = await db.scalar(select(UserModel).where(UserModel.fullname == fullname))
         if not user:
             raise UserException(
                 detail=f"User with name {fullname} not found",
@@ -274,7 +276,7 @@ async def delete_user(
             )
 
         # Delete user
-        delete_user_crud(fullname, db)
+        await delete_user_crud(fullname, db)
         logger.info(f"Deleted user: {fullname}")
         return None
 
@@ -297,7 +299,7 @@ async def delete_user(
 )
 async def get_current_user(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Get the currently authenticated user's information.
@@ -307,7 +309,7 @@ async def get_current_user(
     """
     try:
         # Get user data from database
-        user_data = get_current_active_user_crud(current_user.fullname, db)
+        user_data = await get_current_active_user_crud(current_user.fullname, db)
         logger.info(f"Retrieved current user: {current_user.email}")
         return user_data
 
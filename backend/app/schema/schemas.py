@@ -148,7 +148,7 @@ class SalesEntryUpdate(SalesEntryCreate):
     pass
 
 class SalesEntryResponse(SalesEntryCreate):
-    pass
+    needs_rescore: bool = False
 
 
 
@@ -190,6 +190,22 @@ class StockSummary(BaseModel):
     total_pms: float
     year: Optional[int] = None
 
+class BulkImportCreated(BaseModel):
+    row: int
+    id: int
+    needs_rescore: bool = False
+
+class BulkImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+class BulkImportResponse(BaseModel):
+    received: int
+    imported: int
+    failed: int
+    created: List[BulkImportCreated] = []
+    errors: List[BulkImportError] = []
+
 class Trucks(BaseModel):
     id: int
     branch: str
@@ -208,3 +224,54 @@ class TrucksCreate(Trucks):
 
 class TrucksResponse(Trucks):
     pass
+
+class ModelInfo(BaseModel):
+    version: str
+    path: str
+    model_type: str
+    fast_path: Optional[str] = None
+    loaded_at: datetime
+
+class ModelSwapRequest(BaseModel):
+    name: Optional[str] = Field(default=None, description="Model file inside the model directory; omit to reload the active model")
+
+class RescoreRequest(BaseModel):
+    name: Optional[str] = Field(default=None, description="Model file inside the model directory; omit to use the active model")
+    pending_only: bool = Field(default=False, description="Only re-score entries validated by the fallback rules")
+
+class RescoredEntry(BaseModel):
+    entry_id: int
+    branch: str
+    date: datetime
+    net_sales: float
+    predicted_net_sales: float
+    difference: float
+
+class RescoringRunResponse(BaseModel):
+    id: str
+    model_version: str
+    status: str
+    pending_only: bool
+    rows_scored: int
+    rows_flagged: int
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    flagged: List[RescoredEntry] = []
+
+class ShadowModelRequest(BaseModel):
+    name: str = Field(..., description="Model file inside the model directory to score in shadow")
+
+class ShadowInfo(BaseModel):
+    model: Optional[ModelInfo] = None
+    sample_rate: float
+    threshold: float
+    queue_depth: int
+    queue_size: int
+    scored: int
+    dropped: int
+    errors: int
+    disagreements: int
+    disagreement_rate: Optional[float] = None
+    mean_abs_delta: Optional[float] = None
+    max_abs_delta: Optional[float] = None
@@ -0,0 +1,32 @@
+"""
+Gunicorn settings for running several uvicorn workers, as the image does:
+
+    PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus gunicorn app.main:app -c gunicorn.conf.py
+
+With more than one worker, PROMETHEUS_MULTIPROC_DIR must be set (to an
+empty, writable directory) so /metrics reports every worker, not just
+the one that answered the scrape.
+"""
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    # Samples left by a previous run would be added to this one's
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drops the live gauges of a worker that exited
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
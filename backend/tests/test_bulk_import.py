@@ -0,0 +1,108 @@
+import types
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.crud import bulk_import
+from app.crud.bulk_import import COPY_COLUMNS, ImportRow, iter_upload_lines, validate_rows
+from app.models import models
+
+
+def _row(row: int, day: int, **values) -> ImportRow:
+    entry = {column: 0.0 for column in COPY_COLUMNS}
+    entry.update(branch="Tepa", date=datetime(2024, 1, day), comment=None, **values)
+    return ImportRow(row, types.SimpleNamespace(**entry))
+
+
+def test_rows_after_a_rejected_one_chain_from_the_last_accepted(monkeypatch):
+    # Without the model, the rule-based checks decide
+    monkeypatch.setattr(models, "predict_batch", lambda features: None)
+
+    latest = {"Tepa": types.SimpleNamespace(
+        closing_meter_reading_ago=100.0, closing_meter_reading_pms=200.0,
+        closing_tank_reading_ago=1000.0, closing_tank_reading_pms=2000.0,
+        unit_price_ago=10.0, unit_price_pms=12.0,
+    )}
+    rows = [
+        _row(1, 1, closing_meter_reading_ago=110.0, closing_meter_reading_pms=210.0,
+             closing_tank_reading_ago=990.0, closing_tank_reading_pms=1990.0),
+        # Closing tank above opening: rejected, and its values must not be carried
+        _row(2, 2, opening_meter_reading_ago=500.0, closing_meter_reading_ago=510.0,
+             opening_meter_reading_pms=600.0, closing_meter_reading_pms=610.0,
+             opening_tank_reading_ago=5000.0, closing_tank_reading_ago=6000.0,
+             opening_tank_reading_pms=7000.0, closing_tank_reading_pms=6990.0,
+             unit_price_ago=99.0, unit_price_pms=99.0),
+        # Two records in a row with zero prices and opening readings
+        _row(3, 3, closing_meter_reading_ago=120.0, closing_meter_reading_pms=220.0,
+             closing_tank_reading_ago=980.0, closing_tank_reading_pms=1980.0),
+        _row(4, 4, closing_meter_reading_ago=130.0, closing_meter_reading_pms=230.0,
+             closing_tank_reading_ago=970.0, closing_tank_reading_pms=1970.0),
+    ]
+
+    accepted, errors = validate_rows(rows, latest)
+
+    assert [r.row for r in accepted] == [1, 3, 4]
+    assert [error["row"] for error in errors] == [2]
+    third, fourth = rows[2].entry, rows[3].entry
+    assert (third.unit_price_ago, third.unit_price_pms) == (10.0, 12.0)
+    assert (fourth.unit_price_ago, fourth.unit_price_pms) == (10.0, 12.0)
+    assert third.opening_meter_reading_ago == 110.0
+    assert third.opening_tank_reading_ago == 990.0
+    assert fourth.opening_meter_reading_ago == 120.0
+    assert fourth.opening_tank_reading_pms == 1980.0
+    assert fourth.sales_in_cedis_ago == (980.0 - 970.0) * 10.0
+
+
+def test_omitted_comment_is_copied_as_null(monkeypatch):
+    written = []
+
+    class Cursor:
+        def copy_expert(self, sql, buffer):
+            written.append((sql, buffer.read()))
+
+        def close(self):
+            pass
+
+    db = types.SimpleNamespace(connection=lambda: types.SimpleNamespace(
+        connection=types.SimpleNamespace(cursor=Cursor)
+    ))
+    entry = types.SimpleNamespace(**{column: None for column in COPY_COLUMNS})
+
+    bulk_import._copy_entries(db, [entry])
+
+    sql, data = written[0]
+    assert "FORCE_NOT_NULL" not in sql
+    # Every field, the comment included, is an empty unquoted field: NULL
+    assert data.strip() == "," * (len(COPY_COLUMNS) - 1)
+
+
+def test_upload_lines_survive_any_chunking():
+    upload = '\ufeff{"comment": "caf\u00e9"}\r\n{"comment": "a\u2028b"}\n{"x": 1}'.encode()
+    expected = ['{"comment": "caf\u00e9"}\r\n', '{"comment": "a\u2028b"}\n', '{"x": 1}']
+
+    for size in (1, 2, 7, len(upload)):
+        chunks = [upload[i:i + size] for i in range(0, len(upload), size)]
+        assert list(iter_upload_lines(chunks, max_bytes=len(upload))) == expected
+
+
+def test_upload_lines_stop_past_the_size_limit():
+    with pytest.raises(HTTPException) as e:
+        list(iter_upload_lines([b"{}\n"] * 10, max_bytes=20))
+    assert e.value.status_code == 413
+
+
+def test_copy_source_reads_in_pieces():
+    entries = [
+        types.SimpleNamespace(**{column: f"{column}-{i}" for column in COPY_COLUMNS})
+        for i in range(50)
+    ]
+    whole = bulk_import._CopySource(entries).read()
+
+    source, pieces = bulk_import._CopySource(entries), []
+    while piece := source.read(256):
+        pieces.append(piece)
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == whole
+    assert whole.count("\n") == 50
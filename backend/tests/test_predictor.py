@@ -0,0 +1,83 @@
+import warnings
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.tree import DecisionTreeRegressor
+
+from app.ml.predictor import benchmark, compile_predictor
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Feature vectors (extract_features order) and net sales of stored daily_entries
+RECORDED = BACKEND_DIR / "tests" / "fixtures" / "recorded_features.csv"
+
+
+@pytest.fixture(scope="module")
+def recorded():
+    data = np.loadtxt(RECORDED, delimiter=",", skiprows=1, ndmin=2)
+    return data[:, :-1], data[:, -1]
+
+
+@pytest.fixture(scope="module")
+def shipped_model():
+    with warnings.catch_warnings():
+        # Pickled by an older scikit-learn
+        warnings.simplefilter("ignore", UserWarning)
+        return joblib.load(BACKEND_DIR / "the_model.joblib")
+
+
+def _models(X, y):
+    return {
+        "linear": LinearRegression().fit(X, y),
+        "decision_tree": DecisionTreeRegressor(max_depth=8, random_state=0).fit(X, y),
+        "random_forest": RandomForestRegressor(n_estimators=20, max_depth=6, random_state=0).fit(X, y),
+        "gradient_boosting": GradientBoostingRegressor(n_estimators=30, max_depth=3, random_state=0).fit(X, y),
+    }
+
+
+def _sklearn_predict(model, X):
+    with warnings.catch_warnings():
+        # Fitted with feature names; plain arrays are passed here
+        warnings.simplefilter("ignore", UserWarning)
+        return model.predict(X)
+
+
+def test_compiled_shipped_model_matches_sklearn(recorded, shipped_model):
+    X, _ = recorded
+    predictor = compile_predictor(shipped_model)
+
+    assert predictor.kind == "linear"
+    np.testing.assert_allclose(predictor.predict(X), _sklearn_predict(shipped_model, X), rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize("name", ["linear", "decision_tree", "random_forest", "gradient_boosting"])
+def test_compiled_predictor_matches_sklearn(recorded, name):
+    X, y = recorded
+    model = _models(X, y)[name]
+    predictor = compile_predictor(model)
+
+    assert predictor.kind == ("linear" if name == "linear" else "tree_ensemble")
+    np.testing.assert_allclose(predictor.predict(X), model.predict(X), rtol=1e-9, atol=1e-6)
+    # Single rows, as online validation scores them
+    np.testing.assert_allclose(
+        [predictor.predict(X[i:i + 1])[0] for i in range(10)], model.predict(X[:10]), rtol=1e-9, atol=1e-6
+    )
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("name", ["linear", "random_forest"])
+def test_compiled_predictor_is_faster_per_row(recorded, name):
+    # Run with `pytest -m benchmark -s` to see the latencies
+    X, y = recorded
+    model = _models(X, y)[name]
+    predictor = compile_predictor(model)
+
+    sklearn_timings = benchmark(model.predict, X)
+    numpy_timings = benchmark(predictor.predict, X)
+    print(f"\n{name}: sklearn {sklearn_timings}\n{name}: numpy   {numpy_timings}")
+
+    assert numpy_timings["single_row_us"] < sklearn_timings["single_row_us"]